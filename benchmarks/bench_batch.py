@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+RiskBatch 与逐个构造 Risk 的耗时对比
+
+用法（在仓库根目录下）：python -m benchmarks.bench_batch [--periods 250] [--sizes 1000 10000 100000]
+
+逐个构造 Risk 的方式只对前 --sample 个组合实际计时，再按组合数线性外推。
+"""
+
+import argparse
+import time
+import warnings
+
+import numpy as np
+
+from rqrisk import Risk, RiskBatch
+
+
+def _time_batch(returns, benchmark):
+    start = time.perf_counter()
+    RiskBatch(returns, benchmark, 0.02).all()
+    return time.perf_counter() - start
+
+
+def _time_loop(returns, benchmark, sample):
+    rows = returns[:sample]
+    start = time.perf_counter()
+    for row in rows:
+        Risk(row, benchmark, 0.02).all()
+    return (time.perf_counter() - start) / len(rows) * len(returns)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--periods", type=int, default=250)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--sample", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    benchmark = rng.normal(0.0003, 0.012, args.periods)
+    benchmark[::20] = 0
+    warnings.simplefilter("ignore")
+    print("{:>10} {:>14} {:>14} {:>10}".format("strategies", "Risk loop (s)", "RiskBatch (s)", "speedup"))
+    for size in args.sizes:
+        returns = rng.normal(0.0005, 0.02, (size, args.periods))
+        batch = _time_batch(returns, benchmark)
+        loop = _time_loop(returns, benchmark, min(args.sample, size))
+        print("{:>10} {:>14.3f} {:>14.3f} {:>9.1f}x".format(size, loop, batch, loop / batch))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+import rqrisk 的耗时，以及首次用到 scipy 的指标时的额外耗时
+
+用法（在仓库根目录下）：python -m benchmarks.bench_import [--repeat 10]
+
+每次测量都启动新的解释器，结果取中位数。
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_SCENARIOS = [
+    ("import numpy", "import numpy"),
+    ("import rqrisk", "import rqrisk"),
+    ("import rqrisk + max_drawdown", "import rqrisk, numpy as np; r = rqrisk.Risk(np.zeros(10), np.zeros(10), 0)\n"
+                                     "r.max_drawdown"),
+    ("import rqrisk + alpha_t_value", "import rqrisk, numpy as np; r = rqrisk.Risk(np.zeros(10), np.zeros(10), 0)\n"
+                                      "r.alpha_t_value"),
+    ("import rqrisk + var", "import rqrisk, numpy as np; r = rqrisk.Risk(np.zeros(10), np.zeros(10), 0)\n"
+                            "r.var"),
+]
+
+_TIMER = """
+import time
+start = time.perf_counter()
+{}
+print(time.perf_counter() - start)
+"""
+
+
+def _measure(code, repeat):
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, "-c", _TIMER.format(code)], cwd=_ROOT)
+        timings.append(float(output.decode().strip().splitlines()[-1]))
+    return sorted(timings)[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    print("{:<32} {:>10}".format("scenario", "median (ms)"))
+    for name, code in _SCENARIOS:
+        print("{:<32} {:>10.1f}".format(name, _measure(code, args.repeat) * 1000))
+
+
+if __name__ == "__main__":
+    main()
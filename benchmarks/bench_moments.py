@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+calc_moments 与逐个指标各自遍历数据的旧方式的耗时对比，以及 RiskBatch 只计算基于矩的指标的耗时
+
+用法（在仓库根目录下）：python -m benchmarks.bench_moments [--shapes 2500 250000 1000x250 10000x250 100x2500]
+
+旧方式：均值、离差各一遍，volatility、benchmark_volatility、beta / correlation 的交叉项、downside_risk、
+excess_volatility（std）、win_rate、excess_win_rate 各自再遍历一次并分配临时数组。
+"""
+
+import argparse
+import time
+import warnings
+
+import numpy as np
+
+from rqrisk import RiskBatch
+from rqrisk.moments import calc_moments
+
+NAMES = [
+    "volatility", "benchmark_volatility", "beta", "correlation", "tracking_error", "excess_volatility",
+    "downside_risk", "sharpe", "win_rate", "excess_win_rate",
+]
+
+
+def _per_indicator(portfolio, benchmark):
+    portfolio_mean = portfolio.mean(axis=-1)
+    benchmark_mean = benchmark.mean(axis=-1)
+    portfolio_centered = portfolio - portfolio_mean[..., np.newaxis]
+    benchmark_centered = benchmark - benchmark_mean[..., np.newaxis]
+    return (
+        np.square(portfolio_centered).sum(axis=-1),
+        np.square(benchmark_centered).sum(axis=-1),
+        (portfolio_centered * benchmark_centered).sum(axis=-1),
+        (portfolio - benchmark).std(axis=-1, ddof=1),
+        np.square(np.minimum(portfolio_centered, 0.)).sum(axis=-1),
+        np.count_nonzero(portfolio > 0, axis=-1),
+        np.count_nonzero(portfolio > benchmark, axis=-1),
+    )
+
+
+def _timeit(func, min_repeat=5, min_time=0.2):
+    timings = []
+    while len(timings) < min_repeat or sum(timings) < min_time:
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def _shape(text):
+    return tuple(int(n) for n in text.split("x"))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shapes", type=_shape, nargs="+",
+                        default=[(2500,), (250000,), (1000, 250), (10000, 250), (100, 2500)])
+    args = parser.parse_args()
+
+    warnings.simplefilter("ignore")
+    rng = np.random.RandomState(0)
+    print("{:>12} {:>16} {:>16} {:>9} {:>20}".format(
+        "shape", "per-indicator (ms)", "calc_moments (ms)", "speedup", "RiskBatch.all (ms)"))
+    for shape in args.shapes:
+        returns = rng.normal(0.0005, 0.02, shape)
+        benchmark = rng.normal(0.0003, 0.012, shape[-1])
+        old = _timeit(lambda: _per_indicator(returns, benchmark))
+        new = _timeit(lambda: calc_moments(returns, benchmark))
+        batch = _timeit(lambda: RiskBatch(returns, benchmark, 0.02).all(NAMES))
+        print("{:>12} {:>18.3f} {:>17.3f} {:>8.2f}x {:>20.3f}".format(
+            "x".join(map(str, shape)), old * 1e3, new * 1e3, old / new, batch * 1e3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Risk.all() 的内存开销：不同类型的输入下，用 tracemalloc 统计构造与计算全部指标过程中的峰值内存、
+计算结束后仍被 Risk 实例持有的内存与内存块数
+
+用法（在仓库根目录下）：
+    python -m benchmarks.memory [--periods 2500 250000] [--output result.json]
+
+在不同版本的代码上分别运行即可比较输入转换前后的差异。
+"""
+
+import argparse
+import array
+import json
+import sys
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from rqrisk import Risk
+
+PERIODS = [2500, 250000]
+
+
+def _inputs(n):
+    rng = np.random.RandomState(n)
+    returns = rng.normal(0.0005, 0.02, n)
+    benchmark = rng.normal(0.0003, 0.012, n)
+    benchmark[::20] = 0
+    index = pd.date_range("2000-01-01", periods=n, freq="min")
+    return {
+        "ndarray": (returns, benchmark),
+        "float32": (returns.astype(np.float32), benchmark.astype(np.float32)),
+        "Series": (pd.Series(returns, index=index), pd.Series(benchmark, index=index)),
+        "list": (returns.tolist(), benchmark.tolist()),
+        "array.array": (array.array("d", returns), array.array("d", benchmark)),
+    }
+
+
+def measure(returns, benchmark):
+    """ 返回 (峰值字节数, 计算后持有的字节数, 计算后持有的内存块数)，不含输入本身 """
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        risk = Risk(returns, benchmark, 0.02)
+        risk.all()
+        _, peak = tracemalloc.get_traced_memory()
+        stats = tracemalloc.take_snapshot().statistics("filename")
+    finally:
+        tracemalloc.stop()
+    del risk
+    return peak, sum(s.size for s in stats), sum(s.count for s in stats)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--periods", type=int, nargs="+", default=PERIODS)
+    parser.add_argument("--output", default=None, help="结果 JSON 文件")
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+
+    results = {}
+    print("{:<30} {:>14} {:>14} {:>10}".format("input", "peak (KB)", "retained (KB)", "blocks"))
+    for n in args.periods:
+        for kind, (returns, benchmark) in _inputs(n).items():
+            key = "{}[T={}]".format(kind, n)
+            try:
+                # 预热，首次计算会导入 scipy / statsmodels
+                Risk(returns, benchmark, 0.02).all()
+            except Exception as e:  # 旧版本不支持的输入类型
+                results[key] = {"error": repr(e)}
+                print("{:<30} {}".format(key, repr(e)))
+                continue
+            peak, retained, blocks = measure(returns, benchmark)
+            results[key] = {"peak": peak, "retained": retained, "blocks": blocks}
+            print("{:<30} {:>14.1f} {:>14.1f} {:>10}".format(key, peak / 1024, retained / 1024, blocks))
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Risk 各指标、Risk.all()、Risk.__init__、param_var 以及 RiskBatch 的耗时基准
+
+用法（在仓库根目录下）：
+    python -m benchmarks.suite run [--output result.json] [--periods 250 2500 25000 250000] [--quick]
+    python -m benchmarks.suite compare base.json new.json [--threshold 0.1]
+
+run 以固定随机种子生成数据，单个指标的耗时在新构造的 Risk 上测量，包含其依赖的计算，即单独取该指标时的实际开销。
+每项至少重复 --min-repeat 次且累计不少于 --min-time 秒，记录最小值与中位数（秒）。
+compare 按最小值比较两次结果，变慢超过 threshold 且绝对差大于 --min-delta 秒的项记为退化，存在退化时返回码为 1。
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import warnings
+
+import numpy as np
+
+import rqrisk
+from rqrisk import Risk, RiskBatch
+from rqrisk.utils import indicator_names
+
+PERIODS = [250, 2500, 25000, 250000]
+# (组合数, 期数)
+BATCHES = [(1000, 250), (10000, 250), (100, 2500)]
+
+
+def _measure(func, setup, min_repeat, min_time):
+    """ 每次调用 setup() 得到参数（不计时），再对 func(arg) 计时 """
+    timings = []
+    total = 0.
+    while len(timings) < min_repeat or total < min_time:
+        arg = setup()
+        start = time.perf_counter()
+        func(arg)
+        elapsed = time.perf_counter() - start
+        timings.append(elapsed)
+        total += elapsed
+        if len(timings) >= 10000:
+            break
+    return {"min": min(timings), "median": float(np.median(timings)), "repeat": len(timings)}
+
+
+def _data(rng, shape):
+    benchmark = rng.normal(0.0003, 0.012, shape[-1])
+    benchmark[::20] = 0
+    return rng.normal(0.0005, 0.02, shape), benchmark
+
+
+def run(periods, batches, min_repeat, min_time):
+    results = {}
+    names = indicator_names(Risk)
+    for n in periods:
+        returns, benchmark = _data(np.random.RandomState(n), (n,))
+
+        def new_risk():
+            return Risk(returns, benchmark, 0.02)
+
+        # 预热，首次计算会加载 scipy
+        new_risk().all()
+        results["Risk.__init__[T={}]".format(n)] = _measure(lambda _: new_risk(), lambda: None, min_repeat, min_time)
+        results["Risk.all[T={}]".format(n)] = _measure(lambda r: r.all(), new_risk, min_repeat, min_time)
+        results["Risk.param_var[T={}]".format(n)] = _measure(
+            lambda r: r.param_var(0.01), new_risk, min_repeat, min_time)
+        for name in names:
+            results["Risk.{}[T={}]".format(name, n)] = _measure(
+                lambda r: getattr(r, name), new_risk, min_repeat, min_time)
+        print("T={} done".format(n), file=sys.stderr)
+
+    for size, n in batches:
+        returns, benchmark = _data(np.random.RandomState(size + n), (size, n))
+        results["RiskBatch.all[N={},T={}]".format(size, n)] = _measure(
+            lambda _: RiskBatch(returns, benchmark, 0.02).all(), lambda: None, min_repeat, min_time)
+        print("N={} T={} done".format(size, n), file=sys.stderr)
+    return results
+
+
+def compare(base, new, threshold, min_delta):
+    """ 返回 (名称, 基准耗时, 新耗时, 比值, 是否退化) 的列表，按比值从大到小排列 """
+    rows = []
+    for key in base["results"]:
+        if key not in new["results"]:
+            continue
+        old_time = base["results"][key]["min"]
+        new_time = new["results"][key]["min"]
+        ratio = new_time / old_time if old_time > 0 else np.inf
+        regressed = ratio > 1 + threshold and new_time - old_time > min_delta
+        rows.append((key, old_time, new_time, ratio, regressed))
+    rows.sort(key=lambda row: row[3], reverse=True)
+    return rows
+
+
+def _meta():
+    return {
+        "rqrisk": rqrisk.__version__,
+        "numpy": np.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command")
+    run_parser = sub.add_parser("run")
+    run_parser.add_argument("--output", default=None, help="结果 JSON 文件，不指定时输出到标准输出")
+    run_parser.add_argument("--periods", type=int, nargs="+", default=PERIODS)
+    run_parser.add_argument("--min-repeat", type=int, default=5)
+    run_parser.add_argument("--min-time", type=float, default=0.2)
+    run_parser.add_argument("--quick", action="store_true", help="只测 T=250 / 2500 与最小的批量场景，用于快速检查")
+    compare_parser = sub.add_parser("compare")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+    compare_parser.add_argument("--min-delta", type=float, default=5e-6)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        warnings.simplefilter("ignore")
+        periods, batches = args.periods, BATCHES
+        if args.quick:
+            periods, batches = [n for n in periods if n <= 2500], BATCHES[:1]
+        content = json.dumps({"meta": _meta(), "results": run(periods, batches, args.min_repeat, args.min_time)},
+                             indent=2)
+        if args.output is None:
+            print(content)
+        else:
+            with open(args.output, "w") as f:
+                f.write(content)
+    elif args.command == "compare":
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        rows = compare(base, new, args.threshold, args.min_delta)
+        print("{:<50} {:>12} {:>12} {:>8}".format("benchmark", "base (ms)", "new (ms)", "ratio"))
+        for key, old_time, new_time, ratio, regressed in rows:
+            print("{:<50} {:>12.4f} {:>12.4f} {:>7.2f}x{}".format(
+                key, old_time * 1e3, new_time * 1e3, ratio, "  REGRESSION" if regressed else ""))
+        regressions = sum(row[4] for row in rows)
+        print("{} benchmarks compared, {} regressions".format(len(rows), regressions))
+        sys.exit(1 if regressions else 0)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,67 @@
 from .risk import Risk
+from .batch import RiskBatch
+from .multi_benchmark import MultiBenchmarkRisk
+from .cross import CrossStatistics
+from .blend import BlendRisk
+from .ranking import top_k
+from .streaming import StreamingRisk
+from .rolling import RollingRisk
+from .profiling import IndicatorProfiler
+from .chunked import evaluate_chunked, open_returns
 from .utils import DAILY, WEEKLY, MONTHLY, YEARLY, NATURAL_DAILY
 
-try:
-    from importlib.metadata import version, PackageNotFoundError
-except ImportError:
-    # Python < 3.8
-    from importlib_metadata import version, PackageNotFoundError
 
-try:
-    __version__ = version("rqrisk")
-except PackageNotFoundError:
-    # 开发模式下，如果包未安装
-    __version__ = "0.0.0.dev0"
+# 依赖较重的入口在首次访问时才导入
+_LAZY_ATTRIBUTES = {
+    "evaluate_many": ".parallel",
+    "RiskCache": ".cache",
+    "AsyncRisk": ".aio",
+    "compute_async": ".aio",
+    "gather_many": ".aio",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        from importlib import import_module
+        value = getattr(import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+        globals()[name] = value
+        return value
+    # importlib.metadata 的导入与查询较慢，__version__ 在首次访问时才计算
+    if name != "__version__":
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+    except ImportError:
+        # Python < 3.8
+        from importlib_metadata import version, PackageNotFoundError
+
+    try:
+        value = version("rqrisk")
+    except PackageNotFoundError:
+        # 开发模式下，如果包未安装
+        value = "0.0.0.dev0"
+    globals()["__version__"] = value
+    return value
+
 
 __all__ = [
     "Risk",
+    "RiskBatch",
+    "MultiBenchmarkRisk",
+    "CrossStatistics",
+    "BlendRisk",
+    "top_k",
+    "StreamingRisk",
+    "RollingRisk",
+    "IndicatorProfiler",
+    "evaluate_many",
+    "evaluate_chunked",
+    "open_returns",
+    "RiskCache",
+    "AsyncRisk",
+    "compute_async",
+    "gather_many",
     "DAILY",
     "WEEKLY",
     "MONTHLY",
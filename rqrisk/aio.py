@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# 版权所有 2021 深圳米筐科技有限公司（下称“米筐科技”）
+#
+# 除非遵守当前许可，否则不得使用本软件。
+#
+#     * 非商业用途（非商业用途指个人出于非商业目的使用本软件，或者高校、研究所等非营利机构出于教育、科研等目的使用本软件）：
+#         遵守 Apache License 2.0（下称“Apache 2.0 许可”），
+#         您可以在以下位置获得 Apache 2.0 许可的副本：http://www.apache.org/licenses/LICENSE-2.0。
+#         除非法律有要求或以书面形式达成协议，否则本软件分发时需保持当前许可“原样”不变，且不得附加任何条件。
+#
+#     * 商业用途（商业用途指个人出于任何商业目的使用本软件，或者法人或其他组织出于任何目的使用本软件）：
+#         未经米筐科技授权，任何个人不得出于任何商业目的使用本软件（包括但不限于向第三方提供、销售、出租、出借、转让本软件、
+#         本软件的衍生产品、引用或借鉴了本软件功能或源代码的产品或服务），任何法人或其他组织不得出于任何目的使用本软件，
+#         否则米筐科技有权追究相应的知识产权侵权责任。
+#         在此前提下，对本软件的使用同样需要遵守 Apache 2.0 许可，Apache 2.0 许可与本许可冲突之处，以本许可为准。
+#         详细的授权流程，请联系 public@ricequant.com 获取。
+
+
+import asyncio
+import weakref
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from .cache import RiskCache
+from .risk import Risk
+from .utils import DAILY, evaluation_plan
+
+THREAD = "thread"
+PROCESS = "process"
+
+
+def _evaluate(daily_returns, benchmark_daily_returns, risk_free_rate, period, trading_days_a_year, names):
+    # 在 executor 中执行，进程池时需可被 pickle
+    return Risk(daily_returns, benchmark_daily_returns, risk_free_rate, period, trading_days_a_year).all(names)
+
+
+class AsyncRisk(object):
+    """
+    在 asyncio 中计算 Risk.all()，计算放到线程池或进程池中执行，不阻塞事件循环
+    同时进行的计算不超过 max_concurrency 个，其余的请求在事件循环中排队等待；
+    输入相同（按 RiskCache.key 的内容哈希，在线程池中计算）的并发请求只计算一次，共享同一个结果
+    请求被取消时，若没有其他请求在等待同一个结果，则取消对应的计算：尚在排队的不再执行，已交给 executor 的无法中断，
+    其结果被丢弃
+    :param executor: "thread"、"process" 或 concurrent.futures.Executor 实例；传入实例时由调用方负责关闭
+    :param max_concurrency: 同时进行的计算数上限
+    :param max_workers: executor 为 "thread" 或 "process" 时的工作线程或进程数，None 为 max_concurrency
+    """
+
+    def __init__(self, executor=THREAD, max_concurrency=4, max_workers=None):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency should be positive, got {}".format(max_concurrency))
+        if isinstance(executor, Executor):
+            self._executor, self._owns_executor = executor, False
+        elif executor in (THREAD, PROCESS):
+            pool = ThreadPoolExecutor if executor == THREAD else ProcessPoolExecutor
+            self._executor, self._owns_executor = pool(max_workers or max_concurrency), True
+        else:
+            raise ValueError("executor should be {!r}, {!r} or an Executor, got {!r}".format(THREAD, PROCESS, executor))
+        self.max_concurrency = max_concurrency
+        # 每个事件循环各自的 (信号量, {键: [计算任务, 等待数]})，asyncio 的对象不能跨事件循环使用
+        self._loops = weakref.WeakKeyDictionary()
+
+    def _state(self):
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            state = self._loops[loop] = (asyncio.Semaphore(self.max_concurrency), {})
+        return loop, state
+
+    async def compute(self, daily_returns, benchmark_daily_returns, risk_free_rate, period=DAILY,
+                      trading_days_a_year=None, names=None):
+        """ 参数同 Risk 与 Risk.all()，返回指标名称到指标值的字典；相同输入的并发请求得到同一个字典 """
+        if names is not None:
+            names = list(names)
+            evaluation_plan(Risk, names)
+        loop, (semaphore, in_flight) = self._state()
+        args = (daily_returns, benchmark_daily_returns, risk_free_rate, period, trading_days_a_year, names)
+        # 哈希全部输入的耗时与数据量成正比，放到事件循环默认的线程池中计算：不占用计算用的 executor（进程池时也无需传输数据），
+        # 也不会排在并发数已满的计算之后
+        key = await loop.run_in_executor(None, RiskCache.key, *args)
+        entry = in_flight.get(key)
+        if entry is None:
+            task = loop.create_task(self._run(semaphore, args))
+            entry = in_flight[key] = [task, 0]
+            task.add_done_callback(lambda _: in_flight.pop(key, None) if in_flight.get(key) is entry else None)
+        entry[1] += 1
+        try:
+            # shield 使单个请求的取消不影响共享的计算任务
+            return await asyncio.shield(entry[0])
+        except asyncio.CancelledError:
+            if not entry[0].done():
+                entry[1] -= 1
+                if entry[1] == 0:
+                    entry[0].cancel()
+                    in_flight.pop(key, None)
+            raise
+
+    async def _run(self, semaphore, args):
+        async with semaphore:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, _evaluate, *args)
+
+    async def gather(self, requests, return_exceptions=False):
+        """
+        并发计算多组输入，结果顺序与 requests 一致
+        :param requests: 每项为 compute 的位置参数元组或关键字参数字典
+        :param return_exceptions: 同 asyncio.gather
+        """
+        return await asyncio.gather(*(
+            self.compute(**request) if isinstance(request, dict) else self.compute(*request) for request in requests
+        ), return_exceptions=return_exceptions)
+
+    def close(self, wait=True):
+        """ 关闭自行创建的 executor """
+        if self._owns_executor:
+            self._executor.shutdown(wait=wait)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+_default = None
+
+
+def _default_evaluator():
+    global _default
+    if _default is None:
+        _default = AsyncRisk()
+    return _default
+
+
+async def compute_async(daily_returns, benchmark_daily_returns, risk_free_rate, period=DAILY,
+                        trading_days_a_year=None, names=None):
+    """ 用默认的 AsyncRisk（线程池，max_concurrency=4）计算，见 AsyncRisk.compute """
+    return await _default_evaluator().compute(
+        daily_returns, benchmark_daily_returns, risk_free_rate, period, trading_days_a_year, names)
+
+
+async def gather_many(requests, return_exceptions=False):
+    """ 用默认的 AsyncRisk 并发计算多组输入，见 AsyncRisk.gather """
+    return await _default_evaluator().gather(requests, return_exceptions)
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+# 版权所有 2021 深圳米筐科技有限公司（下称“米筐科技”）
+#
+# 除非遵守当前许可，否则不得使用本软件。
+#
+#     * 非商业用途（非商业用途指个人出于非商业目的使用本软件，或者高校、研究所等非营利机构出于教育、科研等目的使用本软件）：
+#         遵守 Apache License 2.0（下称“Apache 2.0 许可”），
+#         您可以在以下位置获得 Apache 2.0 许可的副本：http://www.apache.org/licenses/LICENSE-2.0。
+#         除非法律有要求或以书面形式达成协议，否则本软件分发时需保持当前许可“原样”不变，且不得附加任何条件。
+#
+#     * 商业用途（商业用途指个人出于任何商业目的使用本软件，或者法人或其他组织出于任何目的使用本软件）：
+#         未经米筐科技授权，任何个人不得出于任何商业目的使用本软件（包括但不限于向第三方提供、销售、出租、出借、转让本软件、
+#         本软件的衍生产品、引用或借鉴了本软件功能或源代码的产品或服务），任何法人或其他组织不得出于任何目的使用本软件，
+#         否则米筐科技有权追究相应的知识产权侵权责任。
+#         在此前提下，对本软件的使用同样需要遵守 Apache 2.0 许可，Apache 2.0 许可与本许可冲突之处，以本许可为准。
+#         详细的授权流程，请联系 public@ricequant.com 获取。
+
+
+from __future__ import division
+
+import numpy as np
+
+from .inputs import as_array
+from .utils import DAILY, WEEKLY, MONTHLY, NATURAL_DAILY
+
+DROP = "drop"
+ZERO = "zero"
+COMPOUND = "compound"
+FILL_POLICIES = (DROP, ZERO, COMPOUND)
+
+# 1970-01-01 为星期四，(天数 + 3) % 7 为星期几，周一为 0
+_EPOCH_WEEKDAY = 3
+
+
+def date_keys(dates):
+    """ 日期转为自 1970-01-01 起的天数（int64），可以是 datetime64 数组、pandas.DatetimeIndex 或日期字符串列表 """
+    return np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+
+
+def _sorted(keys, returns, name):
+    if len(keys) != returns.shape[-1]:
+        raise ValueError("{} should have one date per period, got {} dates and {} periods".format(
+            name, len(keys), returns.shape[-1]))
+    steps = np.diff(keys)
+    if np.all(steps > 0):
+        return keys, returns
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    if np.any(keys[1:] == keys[:-1]):
+        raise ValueError("{} has duplicated dates".format(name))
+    return keys, returns[..., order]
+
+
+def _compound(keys, returns, common):
+    # 两个共同日期之间（不含前一个，含后一个）的收益复利合并到后一个共同日期上，第一个共同日期之前的收益丢弃
+    positions = np.searchsorted(keys, common)
+    starts = np.concatenate((positions[:1], positions[:-1] + 1))
+    log_returns = np.log1p(returns[..., positions[0]:positions[-1] + 1])
+    return np.expm1(np.add.reduceat(log_returns, starts - positions[0], axis=-1))
+
+
+def align_returns(dates, returns, benchmark_dates, benchmark_returns, fill=DROP):
+    """
+    按日期对齐组合与基准的收益率，日期先转为 int64 的天数，排序后按有序归并求交集 / 并集
+    返回 (对齐后的日期 datetime64[D], 组合收益率, 基准收益率)
+    :param dates: 组合收益率对应的日期，多个组合（returns 为二维，最后一维为期）共用
+    :param benchmark_dates: 基准收益率对应的日期
+    :param fill: 日期不一致时的处理方式
+        "drop": 只保留两者共有的日期；
+        "zero": 保留两者全部日期，缺失的收益率记为 0；
+        "compound": 只保留共有的日期，每个共有日期的收益为自上一个共有日期之后（不含）到该日期的复利收益，
+            使组合与基准在每期覆盖相同的区间；第一个共有日期之前的收益丢弃
+    """
+    if fill not in FILL_POLICIES:
+        raise ValueError("fill cannot be {}, possible values: {}".format(fill, ", ".join(FILL_POLICIES)))
+    returns, benchmark_returns = as_array(returns), as_array(benchmark_returns)
+    keys, returns = _sorted(date_keys(dates), returns, "dates")
+    benchmark_keys, benchmark_returns = _sorted(date_keys(benchmark_dates), benchmark_returns, "benchmark_dates")
+
+    if fill == ZERO:
+        union = np.union1d(keys, benchmark_keys)
+        aligned = []
+        for k, values in ((keys, returns), (benchmark_keys, benchmark_returns)):
+            filled = np.zeros(values.shape[:-1] + union.shape)
+            filled[..., np.searchsorted(union, k)] = values
+            aligned.append(filled)
+        return union.astype("datetime64[D]"), aligned[0], aligned[1]
+
+    common = np.intersect1d(keys, benchmark_keys, assume_unique=True)
+    if fill == DROP or len(common) == 0:
+        portfolio = returns[..., np.searchsorted(keys, common)]
+        benchmark = benchmark_returns[..., np.searchsorted(benchmark_keys, common)]
+    else:
+        portfolio = _compound(keys, returns, common)
+        benchmark = _compound(benchmark_keys, benchmark_returns, common)
+    return common.astype("datetime64[D]"), portfolio, benchmark
+
+
+def infer_period(dates):
+    """
+    由日期间隔推断 (period, trading_days_a_year)
+    相邻日期间隔的中位数为 1 天时为日频：含较多周末的为 natural_daily，否则为 daily，
+    且覆盖一年以上时 trading_days_a_year 取每年的平均期数，不足一年时为 None（即 252）；
+    间隔约一周时为 weekly，约一个月时为 monthly，其它情况抛出 ValueError
+    """
+    keys = date_keys(dates)
+    if len(keys) < 2:
+        raise ValueError("at least 2 dates are required to infer period")
+    step = np.median(np.diff(keys))
+    if step <= 1.5:
+        weekend = np.count_nonzero((keys + _EPOCH_WEEKDAY) % 7 >= 5)
+        # 交易日历中偶有周末补班，按周末占比区分自然日与交易日
+        if weekend > len(keys) / 7 / 2:
+            return NATURAL_DAILY, None
+        span = keys[-1] - keys[0]
+        if span < 365:
+            return DAILY, None
+        return DAILY, int(round((len(keys) - 1) * 365.25 / span))
+    if 5 <= step <= 9:
+        return WEEKLY, None
+    if 26 <= step <= 35:
+        return MONTHLY, None
+    raise ValueError("cannot infer period from dates with median step of {} days".format(step))
+
+
+def from_dated(cls, dates, returns, benchmark_dates, benchmark_returns, risk_free_rate, fill=DROP, period=None,
+               trading_days_a_year=None, **options):
+    """
+    Risk.from_dated 与 RiskBatch.from_dated 的实现，构造的实例的 index 为对齐后的日期
+    :param options: 传给 cls 的其它参数，如 Risk 的 nan_policy
+    """
+    index, returns, benchmark_returns = align_returns(dates, returns, benchmark_dates, benchmark_returns, fill)
+    instance = cls(
+        returns, benchmark_returns, risk_free_rate, *resolve_period(index, period, trading_days_a_year), **options
+    )
+    instance.index = index
+    return instance
+
+
+def resolve_period(index, period, trading_days_a_year):
+    """ period 为 None 时由日期推断 (period, trading_days_a_year)，已给出的 trading_days_a_year 优先 """
+    if period is not None:
+        return period, trading_days_a_year
+    period, inferred = infer_period(index)
+    return period, inferred if trading_days_a_year is None else trading_days_a_year
@@ -0,0 +1,418 @@
+# -*- coding: utf-8 -*-
+# 版权所有 2021 深圳米筐科技有限公司（下称“米筐科技”）
+#
+# 除非遵守当前许可，否则不得使用本软件。
+#
+#     * 非商业用途（非商业用途指个人出于非商业目的使用本软件，或者高校、研究所等非营利机构出于教育、科研等目的使用本软件）：
+#         遵守 Apache License 2.0（下称“Apache 2.0 许可”），
+#         您可以在以下位置获得 Apache 2.0 许可的副本：http://www.apache.org/licenses/LICENSE-2.0。
+#         除非法律有要求或以书面形式达成协议，否则本软件分发时需保持当前许可“原样”不变，且不得附加任何条件。
+#
+#     * 商业用途（商业用途指个人出于任何商业目的使用本软件，或者法人或其他组织出于任何目的使用本软件）：
+#         未经米筐科技授权，任何个人不得出于任何商业目的使用本软件（包括但不限于向第三方提供、销售、出租、出借、转让本软件、
+#         本软件的衍生产品、引用或借鉴了本软件功能或源代码的产品或服务），任何法人或其他组织不得出于任何目的使用本软件，
+#         否则米筐科技有权追究相应的知识产权侵权责任。
+#         在此前提下，对本软件的使用同样需要遵守 Apache 2.0 许可，Apache 2.0 许可与本许可冲突之处，以本许可为准。
+#         详细的授权流程，请联系 public@ricequant.com 获取。
+
+from __future__ import division
+
+import numpy as np
+
+from .alignment import DROP, from_dated
+from .inputs import as_array
+from .moments import calc_moments
+from .periods import split_periods, calc_sub_period_indicators
+from .regression import regression_from_moments, regression_on_valid
+from .var import PARAMETRIC, var_from_log_returns, cvar_from_log_returns
+from .utils import (
+    indicator_property, lazy_property, annual_factor, safe_div_array, DAILY, deprecate_property, calc_cum_nav,
+    calc_drawdown, indicator_names, dependency_graph, evaluation_plan
+)
+
+
+class RiskBatch(object):
+    """
+    批量计算多个组合的风险指标，指标与 Risk 逐行一致，结果为沿组合维度的数组
+    :param returns: 组合收益率矩阵，shape 为 (组合数, 期数)，一维时视为单个组合
+    :param benchmark_returns: 基准收益率，一维时为所有组合共享的基准，二维时与 returns 逐行对应
+    """
+
+    # 由 from_dated 构造时为对齐后的日期
+    index = None
+
+    def __init__(self, returns, benchmark_returns, risk_free_rate, period=DAILY, trading_days_a_year=None):
+        returns = np.atleast_2d(as_array(returns))
+        benchmark_returns = as_array(benchmark_returns)
+        assert (returns.shape[-1] == benchmark_returns.shape[-1])
+        self.period_count = returns.shape[-1]
+        self.shape = np.broadcast_shapes(returns.shape[:-1], benchmark_returns.shape[:-1])
+
+        self._portfolio = returns
+        self._benchmark = benchmark_returns
+        if period == DAILY and trading_days_a_year is not None:
+            self._annual_factor = trading_days_a_year
+        else:
+            self._annual_factor = annual_factor(period)
+        self._risk_free_rate = risk_free_rate
+        self._risk_free_rate_per_period = (1 + risk_free_rate) ** (1 / self._annual_factor) - 1
+
+    # 子类中组合收益率可以是惰性的中间结果（如 BlendRisk），直接读取它的中间结果都在依赖中声明 _portfolio
+    @lazy_property(dependencies=("_portfolio",))
+    def _active_returns(self):
+        return self._portfolio - self._benchmark
+
+    @lazy_property(dependencies=("_portfolio",))
+    def _moments(self):
+        # 均值、离差平方和、交叉乘积和、下行离差平方和与胜率计数一次求出，见 rqrisk.moments.calc_moments
+        return calc_moments(self._portfolio, self._benchmark)
+
+    @lazy_property(dependencies=("_moments",))
+    def _portfolio_mean(self):
+        return self._moments.portfolio_mean
+
+    @lazy_property(dependencies=("_moments",))
+    def _benchmark_mean(self):
+        return self._moments.benchmark_mean
+
+    @lazy_property(dependencies=("_portfolio_mean",))
+    def _avg_excess_return(self):
+        return self._portfolio_mean - self._risk_free_rate_per_period
+
+    @lazy_property(dependencies=("_moments",))
+    def _portfolio_centered(self):
+        return self._moments.portfolio_centered
+
+    @lazy_property(dependencies=("_moments",))
+    def _benchmark_centered(self):
+        return self._moments.benchmark_centered
+
+    @lazy_property(dependencies=("_moments",))
+    def _portfolio_ss(self):
+        # 组合离差平方和
+        return self._moments.portfolio_ss
+
+    @lazy_property(dependencies=("_moments",))
+    def _benchmark_ss(self):
+        # 基准离差平方和
+        return self._moments.benchmark_ss
+
+    @lazy_property(dependencies=("_moments",))
+    def _cross_ss(self):
+        # 组合与基准的离差乘积和
+        return self._moments.cross_ss
+
+    @lazy_property(dependencies=("_moments",))
+    def _active_ss(self):
+        # 超额收益率（组合 - 基准）的离差平方和
+        return self._moments.active_ss
+
+    @lazy_property(dependencies=("_portfolio",))
+    def _log_portfolio(self):
+        return np.log1p(self._portfolio)
+
+    @lazy_property()
+    def _log_benchmark(self):
+        return np.log1p(self._benchmark)
+
+    @lazy_property(dependencies=("_active_returns",))
+    def _log_active(self):
+        return np.log1p(self._active_returns)
+
+    @lazy_property(dependencies=("_log_portfolio",))
+    def _portfolio_nav(self):
+        return calc_cum_nav(self._log_portfolio)
+
+    @lazy_property(dependencies=("_log_benchmark",))
+    def _benchmark_nav(self):
+        return calc_cum_nav(self._log_benchmark)
+
+    @lazy_property(dependencies=("_log_active",))
+    def _active_nav(self):
+        return calc_cum_nav(self._log_active)
+
+    @lazy_property(dependencies=("_portfolio_nav",))
+    def _portfolio_drawdown(self):
+        return calc_drawdown(self._portfolio_nav)
+
+    @lazy_property(dependencies=("_active_nav",))
+    def _active_drawdown(self):
+        return calc_drawdown(self._active_nav)
+
+    @lazy_property(dependencies=("_portfolio_nav", "_benchmark_nav"))
+    def _excess_drawdown(self):
+        # 组合净值与基准净值之比的回撤
+        return calc_drawdown(self._portfolio_nav / self._benchmark_nav)
+
+    @lazy_property(dependencies=("_benchmark_mean", "_portfolio_mean", "_benchmark_ss", "_cross_ss", "_portfolio_ss"))
+    def _regression(self):
+        return regression_from_moments(
+            self.period_count, self._benchmark_mean, self._portfolio_mean,
+            self._benchmark_ss, self._cross_ss, self._portfolio_ss
+        )
+
+    @lazy_property(dependencies=("_portfolio", "_regression"))
+    def _alpha_regression(self):
+        # 与 Risk 保持一致：含 nan 的行只在组合与基准均有效的期上回归
+        return regression_on_valid(self._regression, self._portfolio, self._benchmark)
+
+    @lazy_property()
+    def _regression_skipped(self):
+        # 与 Risk 保持一致：基准中不含 0 时不做回归
+        return np.all(self._benchmark != 0, axis=-1)
+
+    @indicator_property(dependencies=("_log_portfolio",))
+    def return_rate(self):
+        return np.expm1(self._log_portfolio.sum(axis=-1))
+
+    @indicator_property(min_period_count=1, dependencies=("return_rate",))
+    def annual_return(self):
+        return (1 + self.return_rate) ** (self._annual_factor / self.period_count) - 1
+
+    @indicator_property(dependencies=("_log_benchmark",))
+    def benchmark_return(self):
+        return np.expm1(self._log_benchmark.sum(axis=-1))
+
+    @indicator_property(min_period_count=1, dependencies=("benchmark_return",))
+    def benchmark_annual_return(self):
+        return (1 + self.benchmark_return) ** (self._annual_factor / self.period_count) - 1
+
+    @indicator_property(dependencies=("return_rate", "benchmark_return"))
+    def arithmetic_excess_return(self):
+        return self.return_rate - self.benchmark_return
+
+    @indicator_property(dependencies=("return_rate", "benchmark_return"))
+    def geometric_excess_return(self):
+        return (1 + self.return_rate) / (1 + self.benchmark_return) - 1
+
+    @indicator_property(dependencies=("annual_return", "benchmark_annual_return"))
+    def geometric_excess_annual_return(self):
+        return (1 + self.annual_return) / (1 + self.benchmark_annual_return) - 1
+
+    @indicator_property(min_period_count=2, dependencies=("annual_return", "beta", "benchmark_annual_return"))
+    def alpha(self):
+        return self.annual_return - self._risk_free_rate - self.beta * (
+            self.benchmark_annual_return - self._risk_free_rate
+        )
+
+    @indicator_property(min_period_count=2, dependencies=("_alpha_regression", "_regression_skipped"))
+    def alpha_t_value(self):
+        return np.where(self._regression_skipped, np.nan, self._alpha_regression.alpha_t_value)
+
+    @indicator_property(min_period_count=2, dependencies=("_alpha_regression", "_regression_skipped"))
+    def alpha_p_value(self):
+        return np.where(self._regression_skipped, np.nan, self._alpha_regression.alpha_p_value)
+
+    @indicator_property(min_period_count=2, dependencies=("_regression",))
+    def beta(self):
+        return self._regression.beta
+
+    @indicator_property(min_period_count=2, value_when_pc_not_satisfied=0., dependencies=("_portfolio_ss",))
+    def volatility(self):
+        return np.sqrt(self._portfolio_ss / (self.period_count - 1))
+
+    @indicator_property(dependencies=("volatility",))
+    def annual_volatility(self):
+        return self.volatility * (self._annual_factor ** 0.5)
+
+    @indicator_property(min_period_count=2, value_when_pc_not_satisfied=0., dependencies=("_benchmark_ss",))
+    def benchmark_volatility(self):
+        return np.sqrt(self._benchmark_ss / (self.period_count - 1))
+
+    @indicator_property(dependencies=("benchmark_volatility",))
+    def benchmark_annual_volatility(self):
+        return self.benchmark_volatility * (self._annual_factor ** 0.5)
+
+    @indicator_property(dependencies=("_portfolio_drawdown",))
+    def max_drawdown(self):
+        return np.abs(self._portfolio_drawdown.min(axis=-1))
+
+    @lazy_property()
+    def _benchmark_missing(self):
+        # 基准全部缺失的行
+        return np.all(np.isnan(self._benchmark), axis=-1)
+
+    @indicator_property(
+        min_period_count=2, value_when_pc_not_satisfied=0., dependencies=("excess_volatility", "_benchmark_missing")
+    )
+    def tracking_error(self):
+        return np.where(self._benchmark_missing, np.nan, self.excess_volatility)
+
+    @indicator_property(dependencies=("tracking_error", "_benchmark_missing"))
+    def annual_tracking_error(self):
+        return np.where(self._benchmark_missing, np.nan, self.tracking_error * (self._annual_factor ** 0.5))
+
+    @indicator_property(
+        min_period_count=2,
+        dependencies=("beta", "annual_return", "benchmark_annual_return", "_portfolio_centered", "_benchmark_centered")
+    )
+    def information_ratio(self):
+        residual = self._portfolio_centered - self.beta[..., np.newaxis] * self._benchmark_centered
+        annual_residual_std = np.sqrt(
+            np.square(residual).sum(axis=-1) / (self.period_count - 1) * self._annual_factor
+        )
+        return safe_div_array(self.annual_return - self.beta * self.benchmark_annual_return, annual_residual_std)
+
+    @indicator_property(min_period_count=2, dependencies=("_avg_excess_return", "volatility"))
+    def sharpe(self):
+        return safe_div_array(np.sqrt(self._annual_factor) * self._avg_excess_return, self.volatility)
+
+    @indicator_property(dependencies=("_portfolio_mean", "_benchmark_mean", "tracking_error"))
+    def excess_sharpe(self):
+        return safe_div_array(
+            np.sqrt(self._annual_factor) * (self._portfolio_mean - self._benchmark_mean), self.tracking_error
+        )
+
+    @indicator_property(min_period_count=2, value_when_pc_not_satisfied=0., dependencies=("_moments",))
+    def downside_risk(self):
+        return np.sqrt(self._moments.downside_ss / (self.period_count - 1))
+
+    @indicator_property(dependencies=("downside_risk",))
+    def annual_downside_risk(self):
+        return self.downside_risk * (self._annual_factor ** 0.5)
+
+    @indicator_property(dependencies=("_avg_excess_return", "annual_downside_risk"))
+    def sortino(self):
+        return safe_div_array(self._annual_factor * self._avg_excess_return, self.annual_downside_risk)
+
+    @indicator_property(dependencies=("max_drawdown", "annual_return"))
+    def calmar(self):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(
+                np.isclose(self.max_drawdown, 0),
+                np.inf * np.sign(self.annual_return),
+                self.annual_return / self.max_drawdown
+            )
+
+    @indicator_property(min_period_count=1, dependencies=("_log_active",))
+    def _excess_return_rate(self):
+        return np.expm1(self._log_active.sum(axis=-1))
+
+    @deprecate_property
+    def excess_return_rate(self):
+        return self._excess_return_rate
+
+    @deprecate_property
+    def excess_annual_return(self):
+        return self._excess_annual_return
+
+    @indicator_property(min_period_count=1, dependencies=("_excess_return_rate",))
+    def _excess_annual_return(self):
+        return (1 + self._excess_return_rate) ** (self._annual_factor / self.period_count) - 1
+
+    @indicator_property(min_period_count=2, value_when_pc_not_satisfied=0., dependencies=("_active_ss",))
+    def excess_volatility(self):
+        return np.sqrt(self._active_ss / (self.period_count - 1))
+
+    @indicator_property(dependencies=("excess_volatility",))
+    def excess_annual_volatility(self):
+        return self.excess_volatility * (self._annual_factor ** 0.5)
+
+    @indicator_property(min_period_count=1, dependencies=("_excess_drawdown",))
+    def geometric_excess_drawdown(self):
+        return np.abs(self._excess_drawdown.min(axis=-1))
+
+    @indicator_property(min_period_count=1, dependencies=("_active_drawdown",))
+    def excess_max_drawdown(self):
+        return np.abs(self._active_drawdown.min(axis=-1))
+
+    def sub_periods(self, labels=None, boundaries=None):
+        """ 与 Risk.sub_periods 一致，数组的第一维为组合，最后一维为段 """
+        starts, keys = split_periods(labels, boundaries, self.period_count)
+        return keys, calc_sub_period_indicators(
+            self._portfolio, self._benchmark, starts,
+            self._annual_factor, self._risk_free_rate_per_period
+        )
+
+    @indicator_property(dependencies=("_log_portfolio",))
+    def var(self):
+        """ default: 95% VaR """
+        return self.param_var(0.05)
+
+    def param_var(self, alpha):
+        # 与 Risk.param_var 一致，假设收益率服从对数正态分布
+        return self.value_at_risk(alpha, PARAMETRIC)
+
+    def value_at_risk(self, alpha=0.05, method=PARAMETRIC):
+        """ 与 Risk.value_at_risk 一致，结果的第一维为组合，之后为 alpha 的维度 """
+        return var_from_log_returns(self._log_portfolio, alpha, method)
+
+    def cvar(self, alpha=0.05, method=PARAMETRIC):
+        """ 与 Risk.cvar 一致，结果的第一维为组合，之后为 alpha 的维度 """
+        return cvar_from_log_returns(self._log_portfolio, alpha, method)
+
+    @indicator_property(min_period_count=1, dependencies=("_moments",))
+    def win_rate(self):
+        return self._moments.win_count / self.period_count
+
+    @indicator_property(min_period_count=1, dependencies=("_benchmark_missing", "_moments"))
+    def excess_win_rate(self):
+        return np.where(self._benchmark_missing, np.nan, self._moments.excess_win_count / self.period_count)
+
+    @indicator_property(min_period_count=2, dependencies=("_cross_ss", "_portfolio_ss", "_benchmark_ss"))
+    def correlation(self):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            correlation = self._cross_ss / np.sqrt(self._portfolio_ss) / np.sqrt(self._benchmark_ss)
+        return np.clip(correlation, -1, 1)
+
+    @staticmethod
+    def _calc_ulcer_index(drawdown):
+        return np.sqrt(np.square(drawdown * 100).sum(axis=-1) / drawdown.shape[-1])
+
+    @indicator_property(dependencies=("_portfolio_drawdown",))
+    def ulcer_index(self):
+        return self._calc_ulcer_index(self._portfolio_drawdown)
+
+    @indicator_property(dependencies=("_active_drawdown",))
+    def excess_ulcer_index(self):
+        return self._calc_ulcer_index(self._active_drawdown)
+
+    def _calc_ulcer_performance_index(self, returns, ulcer_index):
+        _return_rate = np.expm1(np.log1p(returns - self._risk_free_rate_per_period).sum(axis=-1))
+        return safe_div_array(_return_rate, ulcer_index)
+
+    @indicator_property(dependencies=("_portfolio", "ulcer_index"))
+    def ulcer_performance_index(self):
+        return self._calc_ulcer_performance_index(self._portfolio, self.ulcer_index)
+
+    @indicator_property(dependencies=("_active_returns", "excess_ulcer_index"))
+    def excess_ulcer_performance_index(self):
+        return self._calc_ulcer_performance_index(self._active_returns, self.excess_ulcer_index)
+
+    def _broadcast(self, value):
+        # 仅与组合或基准相关的指标按 shape 广播为完整的数组
+        if np.shape(value) == self.shape:
+            return value
+        return np.full(self.shape, value, dtype=float)
+
+    def all(self, names=None):
+        """
+        计算指标，返回指标名称到 shape 为 self.shape 的数组的字典
+        :param names: 需要计算的指标名称，None 表示全部指标；只计算这些指标及其依赖
+        """
+        if names is None:
+            names = indicator_names(self.__class__)
+        else:
+            evaluation_plan(self.__class__, names)
+        return {k: self._broadcast(getattr(self, k)) for k in names}
+
+    @classmethod
+    def from_dated(cls, dates, returns, benchmark_dates, benchmark_returns, risk_free_rate, fill=DROP, period=None,
+                   trading_days_a_year=None):
+        """
+        由日期不一致的组合与基准收益率构造，所有组合共用 dates，index 为对齐后的日期
+        :param fill: 日期不一致时的处理方式，"drop"、"zero" 或 "compound"，见 alignment.align_returns
+        :param period: None 时由对齐后的日期推断 period 与 trading_days_a_year
+        """
+        return from_dated(cls, dates, returns, benchmark_dates, benchmark_returns, risk_free_rate, fill, period,
+                          trading_days_a_year)
+
+    @classmethod
+    def dependency_graph(cls):
+        """ 各指标与中间结果直接依赖的名称，可据此估计 all(names) 需要计算的内容 """
+        return dependency_graph(cls)
+
+    @classmethod
+    def evaluation_plan(cls, names):
+        """ 计算 names 中的指标时依次计算的全部指标与中间结果，依赖在前 """
+        return evaluation_plan(cls, names)
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# 版权所有 2021 深圳米筐科技有限公司（下称“米筐科技”）
+#
+# 除非遵守当前许可，否则不得使用本软件。
+#
+#     * 非商业用途（非商业用途指个人出于非商业目的使用本软件，或者高校、研究所等非营利机构出于教育、科研等目的使用本软件）：
+#         遵守 Apache License 2.0（下称“Apache 2.0 许可”），
+#         您可以在以下位置获得 Apache 2.0 许可的副本：http://www.apache.org/licenses/LICENSE-2.0。
+#         除非法律有要求或以书面形式达成协议，否则本软件分发时需保持当前许可“原样”不变，且不得附加任何条件。
+#
+#     * 商业用途（商业用途指个人出于任何商业目的使用本软件，或者法人或其他组织出于任何目的使用本软件）：
+#         未经米筐科技授权，任何个人不得出于任何商业目的使用本软件（包括但不限于向第三方提供、销售、出租、出借、转让本软件、
+#         本软件的衍生产品、引用或借鉴了本软件功能或源代码的产品或服务），任何法人或其他组织不得出于任何目的使用本软件，
+#         否则米筐科技有权追究相应的知识产权侵权责任。
+#         在此前提下，对本软件的使用同样需要遵守 Apache 2.0 许可，Apache 2.0 许可与本许可冲突之处，以本许可为准。
+#         详细的授权流程，请联系 public@ricequant.com 获取。
+
+
+from __future__ import division
+
+import numpy as np
+
+from .alignment import DROP, align_returns, resolve_period
+from .batch import RiskBatch
+from .utils import DAILY, annual_factor, indicator_property, lazy_property, safe_div_array
+
+
+class BlendRisk(RiskBatch):
+    """
+    多个子策略按多组权重组合后的风险指标，结果为沿权重组数的数组，与对每组组合收益率构造 Risk 一致
+    组合收益率为 weights @ component_returns，只在需要路径的指标（收益率、回撤、下行风险、胜率等）中才计算；
+    波动率、beta、相关系数、跟踪误差、信息比率等由子策略的 K × K 离差乘积和得到，不需要组合收益率
+    :param component_returns: 子策略收益率，shape 为 (子策略数 K, 期数)
+    :param weights: 权重，shape 为 (组数 M, K)，一维时视为一组
+    :param benchmark_returns: 基准收益率，shape 为 (期数,)
+    """
+
+    def __init__(
+            self, component_returns, weights, benchmark_returns, risk_free_rate, period=DAILY, trading_days_a_year=None
+    ):
+        components = np.asarray(component_returns, dtype=float)
+        weights = np.atleast_2d(np.asarray(weights, dtype=float))
+        benchmark_returns = np.asarray(benchmark_returns, dtype=float)
+        if components.ndim != 2 or weights.ndim != 2 or weights.shape[1] != components.shape[0]:
+            raise ValueError("component_returns should be (K, periods) and weights (M, K), got {} and {}".format(
+                components.shape, weights.shape))
+        if benchmark_returns.shape != components.shape[1:]:
+            raise ValueError("benchmark_returns should be of shape {}, got {}".format(
+                components.shape[1:], benchmark_returns.shape))
+        self.period_count = components.shape[1]
+        self.shape = weights.shape[:1]
+
+        self._components = components
+        self._weights = weights
+        self._benchmark = benchmark_returns
+        if period == DAILY and trading_days_a_year is not None:
+            self._annual_factor = trading_days_a_year
+        else:
+            self._annual_factor = annual_factor(period)
+        self._risk_free_rate = risk_free_rate
+        self._risk_free_rate_per_period = (1 + risk_free_rate) ** (1 / self._annual_factor) - 1
+
+    @classmethod
+    def from_dated(cls, dates, component_returns, weights, benchmark_dates, benchmark_returns, risk_free_rate,
+                   fill=DROP, period=None, trading_days_a_year=None):
+        """ 由日期不一致的子策略与基准收益率构造，所有子策略共用 dates，见 RiskBatch.from_dated """
+        index, component_returns, benchmark_returns = align_returns(
+            dates, component_returns, benchmark_dates, benchmark_returns, fill)
+        instance = cls(component_returns, weights, benchmark_returns, risk_free_rate,
+                       *resolve_period(index, period, trading_days_a_year))
+        instance.index = index
+        return instance
+
+    @lazy_property()
+    def _portfolio(self):
+        # (M, K) @ (K, T)，所有组合的收益率由一次矩阵乘法得到
+        return self._weights @ self._components
+
+    @lazy_property()
+    def _benchmark_mean(self):
+        return self._benchmark.mean()
+
+    @lazy_property(dependencies=("_benchmark_mean",))
+    def _benchmark_centered(self):
+        return self._benchmark - self._benchmark_mean
+
+    @lazy_property(dependencies=("_benchmark_centered",))
+    def _benchmark_ss(self):
+        return np.dot(self._benchmark_centered, self._benchmark_centered)
+
+    @lazy_property()
+    def _component_mean(self):
+        return self._components.mean(axis=-1)
+
+    @lazy_property(dependencies=("_component_mean",))
+    def _component_centered(self):
+        return self._components - self._component_mean[:, np.newaxis]
+
+    @lazy_property(dependencies=("_component_centered",))
+    def _component_cross(self):
+        # 子策略两两之间的离差乘积和，(K, K)
+        return self._component_centered @ self._component_centered.T
+
+    @lazy_property(dependencies=("_component_centered", "_benchmark_centered"))
+    def _component_benchmark_cross(self):
+        return self._component_centered @ self._benchmark_centered
+
+    @lazy_property(dependencies=("_component_mean",))
+    def _portfolio_mean(self):
+        return self._weights @ self._component_mean
+
+    @lazy_property(dependencies=("_component_cross",))
+    def _portfolio_ss(self):
+        # w Σ w'，对每组权重
+        return np.maximum(((self._weights @ self._component_cross) * self._weights).sum(axis=-1), 0.)
+
+    @lazy_property(dependencies=("_component_benchmark_cross",))
+    def _cross_ss(self):
+        return self._weights @ self._component_benchmark_cross
+
+    @lazy_property(dependencies=("_component_centered", "_benchmark_centered", "_benchmark_ss"))
+    def _active_ss(self):
+        # 组合 - 基准 的离差平方和。超额收益写成 w·(C - b) + (Σw - 1)·b，由子策略相对基准的离差展开：
+        # 组合紧跟基准时 C - b 本身很小，不会像 w Σ w' - 2 w·Cb + b·b 那样由相近的大数相减
+        relative = self._component_centered - self._benchmark_centered
+        leverage = self._weights.sum(axis=-1) - 1
+        ss = ((self._weights @ (relative @ relative.T)) * self._weights).sum(axis=-1)
+        ss = ss + 2 * leverage * (self._weights @ (relative @ self._benchmark_centered))
+        return np.maximum(ss + np.square(leverage) * self._benchmark_ss, 0.)
+
+    @indicator_property(
+        min_period_count=2,
+        dependencies=("beta", "annual_return", "benchmark_annual_return", "_portfolio_ss", "_cross_ss", "_benchmark_ss")
+    )
+    def information_ratio(self):
+        # 残差平方和 Σ(p - beta * b)² 由离差乘积和展开得到
+        beta = self.beta
+        residual_ss = np.maximum(
+            self._portfolio_ss - 2 * beta * self._cross_ss + np.square(beta) * self._benchmark_ss, 0.
+        )
+        annual_residual_std = np.sqrt(residual_ss / (self.period_count - 1) * self._annual_factor)
+        return safe_div_array(self.annual_return - beta * self.benchmark_annual_return, annual_residual_std)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# 版权所有 2021 深圳米筐科技有限公司（下称“米筐科技”）
+#
+# 除非遵守当前许可，否则不得使用本软件。
+#
+#     * 非商业用途（非商业用途指个人出于非商业目的使用本软件，或者高校、研究所等非营利机构出于教育、科研等目的使用本软件）：
+#         遵守 Apache License 2.0（下称“Apache 2.0 许可”），
+#         您可以在以下位置获得 Apache 2.0 许可的副本：http://www.apache.org/licenses/LICENSE-2.0。
+#         除非法律有要求或以书面形式达成协议，否则本软件分发时需保持当前许可“原样”不变，且不得附加任何条件。
+#
+#     * 商业用途（商业用途指个人出于任何商业目的使用本软件，或者法人或其他组织出于任何目的使用本软件）：
+#         未经米筐科技授权，任何个人不得出于任何商业目的使用本软件（包括但不限于向第三方提供、销售、出租、出借、转让本软件、
+#         本软件的衍生产品、引用或借鉴了本软件功能或源代码的产品或服务），任何法人或其他组织不得出于任何目的使用本软件，
+#         否则米筐科技有权追究相应的知识产权侵权责任。
+#         在此前提下，对本软件的使用同样需要遵守 Apache 2.0 许可，Apache 2.0 许可与本许可冲突之处，以本许可为准。
+#         详细的授权流程，请联系 public@ricequant.com 获取。
+
+
+from __future__ import division
+
+from collections import namedtuple
+
+import numpy as np
+
+from .batch import RiskBatch
+from .utils import DAILY, evaluation_plan
+
+IID = "iid"
+BLOCK = "block"
+STATIONARY = "stationary"
+METHODS = (IID, BLOCK, STATIONARY)
+
+# 未指定 chunk_size 时每块重采样的收益率矩阵的字节数
+DEFAULT_CHUNK_BYTES = 16 << 20
+
+# estimate 为原始数据上的指标值，low / high 为百分位置信区间，standard_error 为重采样结果的标准差；
+# 重采样结果为 nan 的不参与统计
+BootstrapInterval = namedtuple("BootstrapInterval", ["estimate", "low", "high", "standard_error"])
+
+
+def resample_indices(rng, period_count, size, method=STATIONARY, block_size=None):
+    """
+    生成 shape 为 (size, period_count) 的重采样下标矩阵
+    :param method: "iid" 逐期独立抽样；"block" 固定长度的循环块；"stationary" 块长服从均值为 block_size 的几何分布
+        （Politis & Romano 的 stationary bootstrap）
+    :param block_size: 块长（stationary 为平均块长），默认为 period_count 的立方根
+    """
+    if method not in METHODS:
+        raise ValueError("method cannot be {}, possible values: {}".format(method, ", ".join(METHODS)))
+    if block_size is None:
+        block_size = max(1, int(round(period_count ** (1 / 3))))
+    if method == IID or block_size == 1:
+        return rng.integers(0, period_count, (size, period_count))
+    if method == BLOCK:
+        block_count = -(-period_count // block_size)
+        starts = rng.integers(0, period_count, (size, block_count, 1))
+        indices = (starts + np.arange(block_size)) % period_count
+        return indices.reshape(size, -1)[:, :period_count]
+    # 每期以 1 / block_size 的概率开始新的块，否则接着上一期
+    positions = np.arange(period_count)
+    new_block = rng.random((size, period_count)) < 1 / block_size
+    new_block[:, 0] = True
+    block_start = np.maximum.accumulate(np.where(new_block, positions, 0), axis=1)
+    starts = rng.integers(0, period_count, (size, period_count))
+    return (np.take_along_axis(starts, block_start, axis=1) + positions - block_start) % period_count
+
+
+def bootstrap(
+        daily_returns, benchmark_daily_returns, risk_free_rate, period=DAILY, trading_days_a_year=None,
+        names=("sharpe", "alpha", "information_ratio", "max_drawdown"), n_resamples=1000, method=STATIONARY,
+        block_size=None, confidence_level=0.95, seed=None, chunk_size=None
+):
+    """
+    组合与基准按相同的下标成对重采样，分块用 RiskBatch 计算各重采样上的指标，给出置信区间与标准误
+    :param names: 指标名称，可以是 Risk 的任意指标
+    :param n_resamples: 重采样次数
+    :param method: 见 resample_indices
+    :param confidence_level: 置信水平，区间为重采样结果的 (1 - level) / 2 与 (1 + level) / 2 分位数
+    :param seed: 随机数种子，seed 相同时结果相同
+    :param chunk_size: 每块的重采样次数，None 时按每块约 16MB 确定，只影响内存，不影响结果
+    :return: 指标名称到 BootstrapInterval 的字典
+    """
+    portfolio = np.asarray(daily_returns, dtype=float)
+    benchmark = np.asarray(benchmark_daily_returns, dtype=float)
+    if portfolio.ndim != 1 or portfolio.shape != benchmark.shape:
+        raise ValueError("daily_returns and benchmark_daily_returns should be 1-d arrays of the same length")
+    if not 0 < confidence_level < 1:
+        raise ValueError("confidence_level should be in (0, 1), got {}".format(confidence_level))
+    names = list(names)
+    evaluation_plan(RiskBatch, names)
+    period_count = len(portfolio)
+    chunk_size = chunk_size or max(1, DEFAULT_CHUNK_BYTES // (8 * max(period_count, 1)))
+
+    estimate = RiskBatch(portfolio, benchmark, risk_free_rate, period, trading_days_a_year).all(names)
+    samples = {k: np.empty(n_resamples) for k in names}
+    # 每次重采样使用由 seed 派生的独立随机数流，抽到的下标与分块方式无关
+    streams = np.random.SeedSequence(seed).spawn(n_resamples)
+    for start in range(0, n_resamples, chunk_size):
+        size = min(chunk_size, n_resamples - start)
+        indices = np.concatenate([
+            resample_indices(np.random.default_rng(stream), period_count, 1, method, block_size)
+            for stream in streams[start:start + size]
+        ])
+        batch = RiskBatch(portfolio[indices], benchmark[indices], risk_free_rate, period, trading_days_a_year)
+        for k, v in batch.all(names).items():
+            samples[k][start:start + size] = v
+
+    tail = (1 - confidence_level) / 2 * 100
+    result = {}
+    for k in names:
+        valid = samples[k][~np.isnan(samples[k])]
+        if len(valid):
+            low, high = np.percentile(valid, [tail, 100 - tail])
+            standard_error = valid.std(ddof=1) if len(valid) > 1 else np.nan
+        else:
+            low = high = standard_error = np.nan
+        result[k] = BootstrapInterval(estimate[k][0], low, high, standard_error)
+    return result
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# 版权所有 2021 深圳米筐科技有限公司（下称“米筐科技”）
+#
+# 除非遵守当前许可，否则不得使用本软件。
+#
+#     * 非商业用途（非商业用途指个人出于非商业目的使用本软件，或者高校、研究所等非营利机构出于教育、科研等目的使用本软件）：
+#         遵守 Apache License 2.0（下称“Apache 2.0 许可”），
+#         您可以在以下位置获得 Apache 2.0 许可的副本：http://www.apache.org/licenses/LICENSE-2.0。
+#         除非法律有要求或以书面形式达成协议，否则本软件分发时需保持当前许可“原样”不变，且不得附加任何条件。
+#
+#     * 商业用途（商业用途指个人出于任何商业目的使用本软件，或者法人或其他组织出于任何目的使用本软件）：
+#         未经米筐科技授权，任何个人不得出于任何商业目的使用本软件（包括但不限于向第三方提供、销售、出租、出借、转让本软件、
+#         本软件的衍生产品、引用或借鉴了本软件功能或源代码的产品或服务），任何法人或其他组织不得出于任何目的使用本软件，
+#         否则米筐科技有权追究相应的知识产权侵权责任。
+#         在此前提下，对本软件的使用同样需要遵守 Apache 2.0 许可，Apache 2.0 许可与本许可冲突之处，以本许可为准。
+#         详细的授权流程，请联系 public@ricequant.com 获取。
+
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from .inputs import PROPAGATE
+from .utils import DAILY
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+)
+"""
+
+
+class RiskCache(object):
+    """
+    以 sqlite 文件保存 Risk.all() 的结果，键为输入数据、risk_free_rate、period、trading_days_a_year、nan_policy
+    与 rqrisk 版本的哈希，
+    命中时直接返回保存的指标字典（值为 float），不再计算
+    总大小超过 max_bytes 时按最近访问时间淘汰；可被多个进程同时使用（WAL 模式，写入时加锁，fork 后自动重新连接）
+    :param path: 缓存文件路径
+    :param max_bytes: 保存的结果的总大小上限（字节）
+    """
+
+    def __init__(self, path, max_bytes=256 << 20, timeout=30.):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+
+    def _connection(self):
+        # sqlite 连接不能跨进程与线程共享，按 (进程, 线程) 各自连接
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(_SCHEMA)
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    @staticmethod
+    def key(daily_returns, benchmark_daily_returns, risk_free_rate, period=DAILY, trading_days_a_year=None,
+            names=None, nan_policy=PROPAGATE):
+        """ 输入的内容哈希，数据按 float64 计算，与传入的是列表、数组还是 pandas.Series 无关 """
+        from . import __version__
+
+        digest = hashlib.sha256()
+        digest.update(json.dumps(
+            [__version__, repr(float(risk_free_rate)), period, trading_days_a_year,
+             None if names is None else list(names), nan_policy]
+        ).encode())
+        for values in (daily_returns, benchmark_daily_returns):
+            values = np.ascontiguousarray(values, dtype=np.float64)
+            digest.update(repr(values.shape).encode())
+            digest.update(memoryview(values).cast("B"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """ 返回保存的指标字典，不存在时返回 None """
+        connection = self._connection()
+        row = connection.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        connection.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, result):
+        value = json.dumps({k: float(v) for k, v in result.items()})
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time())
+            )
+            self._evict(connection)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def _evict(self, connection):
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        while total > self.max_bytes:
+            oldest = connection.execute("SELECT key, size FROM entries ORDER BY accessed LIMIT 64").fetchall()
+            if not oldest:
+                break
+            for key, size in oldest:
+                connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def all(self, daily_returns, benchmark_daily_returns, risk_free_rate, period=DAILY, trading_days_a_year=None,
+            names=None, nan_policy=PROPAGATE):
+        """ 与 Risk(...).all(names) 相同，命中缓存时不构造 Risk """
+        key = self.key(
+            daily_returns, benchmark_daily_returns, risk_free_rate, period, trading_days_a_year, names, nan_policy
+        )
+        result = self.get(key)
+        if result is None:
+            from .risk import Risk
+
+            risk = Risk(daily_returns, benchmark_daily_returns, risk_free_rate, period, trading_days_a_year,
+                        nan_policy=nan_policy)
+            result = risk.all(names)
+            self.put(key, result)
+        return result
+
+    def clear(self):
+        self._connection().execute("DELETE FROM entries")
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    @property
+    def size(self):
+        """ 保存的结果的总大小（字节） """
+        return self._connection().execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# 版权所有 2021 深圳米筐科技有限公司（下称“米筐科技”）
+#
+# 除非遵守当前许可，否则不得使用本软件。
+#
+#     * 非商业用途（非商业用途指个人出于非商业目的使用本软件，或者高校、研究所等非营利机构出于教育、科研等目的使用本软件）：
+#         遵守 Apache License 2.0（下称“Apache 2.0 许可”），
+#         您可以在以下位置获得 Apache 2.0 许可的副本：http://www.apache.org/licenses/LICENSE-2.0。
+#         除非法律有要求或以书面形式达成协议，否则本软件分发时需保持当前许可“原样”不变，且不得附加任何条件。
+#
+#     * 商业用途（商业用途指个人出于任何商业目的使用本软件，或者法人或其他组织出于任何目的使用本软件）：
+#         未经米筐科技授权，任何个人不得出于任何商业目的使用本软件（包括但不限于向第三方提供、销售、出租、出借、转让本软件、
+#         本软件的衍生产品、引用或借鉴了本软件功能或源代码的产品或服务），任何法人或其他组织不得出于任何目的使用本软件，
+#         否则米筐科技有权追究相应的知识产权侵权责任。
+#         在此前提下，对本软件的使用同样需要遵守 Apache 2.0 许可，Apache 2.0 许可与本许可冲突之处，以本许可为准。
+#         详细的授权流程，请联系 public@ricequant.com 获取。
+
+
+import numpy as np
+
+from .batch import RiskBatch
+from .streaming import StreamingRisk
+from .utils import DAILY, indicator_names, evaluation_plan
+
+# 未指定 chunk_size 时每块读取的字节数
+DEFAULT_CHUNK_BYTES = 64 << 20
+COLUMNS = "columns"
+TIME = "time"
+# 以全部数据的均值为基准，按时间分块时需要再读一遍组合收益率
+_DOWNSIDE_INDICATORS = ("downside_risk", "annual_downside_risk", "sortino")
+
+
+class _ArrayPanel(object):
+    """ 内存中的数组或 np.memmap，shape 为 (期数, 组合数) """
+
+    def __init__(self, array):
+        if array.ndim != 2:
+            raise ValueError("returns should be a 2-d array of shape (periods, strategies)")
+        self._array = array
+        self.shape = array.shape
+
+    def iter_columns(self, chunk_size):
+        for start in range(0, self.shape[1], chunk_size):
+            yield start, np.asarray(self._array[:, start:start + chunk_size], dtype=float)
+
+    def iter_rows(self, chunk_size):
+        for start in range(0, self.shape[0], chunk_size):
+            yield start, np.asarray(self._array[start:start + chunk_size], dtype=float)
+
+
+class _ParquetPanel(object):
+    """ parquet 文件，每列为一个组合，每行为一期 """
+
+    def __init__(self, path, columns=None):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("reading parquet files requires pyarrow")
+        self._file = pq.ParquetFile(path)
+        self._columns = list(columns) if columns is not None else self._file.schema_arrow.names
+        self.shape = (self._file.metadata.num_rows, len(self._columns))
+
+    def iter_columns(self, chunk_size):
+        for start in range(0, self.shape[1], chunk_size):
+            table = self._file.read(columns=self._columns[start:start + chunk_size])
+            yield start, np.column_stack([np.asarray(c, dtype=float) for c in table.columns])
+
+    def iter_rows(self, chunk_size):
+        start = 0
+        for batch in self._file.iter_batches(batch_size=chunk_size, columns=self._columns):
+            block = np.column_stack([np.asarray(c, dtype=float) for c in batch.columns])
+            yield start, block
+            start += len(block)
+
+
+def open_returns(source, shape=None, dtype=float, columns=None):
+    """
+    以只读方式打开收益率面板，shape 为 (期数, 组合数)，数据只在计算时按块读入
+    :param source: 数组或 np.memmap；.npy 文件路径；.parquet 文件路径（需要 pyarrow，每列为一个组合）；
+        其它路径视为原始二进制文件，需要给出 shape 与 dtype
+    :param columns: parquet 文件中参与计算的列，None 表示全部列
+    """
+    if not isinstance(source, str) and not hasattr(source, "__fspath__"):
+        return _ArrayPanel(source if isinstance(source, np.memmap) else np.asarray(source))
+    path = str(getattr(source, "__fspath__", lambda: source)())
+    if path.endswith(".parquet"):
+        return _ParquetPanel(path, columns)
+    if path.endswith(".npy"):
+        return _ArrayPanel(np.load(path, mmap_mode="r"))
+    if shape is None:
+        raise ValueError("shape is required for raw binary file {}".format(path))
+    return _ArrayPanel(np.memmap(path, dtype=dtype, mode="r", shape=shape))
+
+
+def evaluate_chunked(
+        returns, benchmark_returns, risk_free_rate, period=DAILY, trading_days_a_year=None, names=None, by=COLUMNS,
+        chunk_size=None
+):
+    """
+    分块计算放不进内存的收益率面板的风险指标，返回指标名称到 shape 为 (组合数,) 的数组的字典，与 Risk 逐列一致
+    :param returns: open_returns 的返回值，或可以传给 open_returns 的数组 / 文件路径，shape 为 (期数, 组合数)
+    :param benchmark_returns: 基准收益率，shape 为 (期数,)
+    :param names: 需要计算的指标名称，None 表示全部指标
+    :param by: "columns" 每次读入若干组合的全部数据，用 RiskBatch 计算，每块只读一次。
+        .npy 与原始二进制文件按行（C 顺序）存储，每个列块都分散在所有的页中，按列分块时每个列块都要把整个文件读一遍，
+        文件放不进内存时应按时间分块；
+        "time" 每次读入全部组合的若干期数据，合并到 StreamingRisk 的累加器中（矩、净值路径的最高点与回撤等），
+        每块只读一次，适合按时间存储的文件。例外：下行风险以全部数据的均值为基准，无法在第一遍中得到，
+        names 中含 downside_risk、annual_downside_risk 或 sortino 时（默认的全部指标即包含）会再读一遍
+    :param chunk_size: 每块的组合数（columns）或期数（time），None 时按每块约 64MB 确定
+    """
+    if not isinstance(returns, (_ArrayPanel, _ParquetPanel)):
+        returns = open_returns(returns)
+    benchmark_returns = np.asarray(benchmark_returns, dtype=float)
+    periods, size = returns.shape
+    if benchmark_returns.shape != (periods,):
+        raise ValueError("benchmark_returns should be of shape ({},), got {}".format(periods, benchmark_returns.shape))
+    if names is None:
+        names = indicator_names(RiskBatch)
+    else:
+        names = list(names)
+        evaluation_plan(RiskBatch, names)
+
+    if by == COLUMNS:
+        chunk_size = chunk_size or max(1, DEFAULT_CHUNK_BYTES // (8 * max(periods, 1)))
+        result = {k: np.full(size, np.nan) for k in names}
+        for start, block in returns.iter_columns(chunk_size):
+            values = RiskBatch(block.T, benchmark_returns, risk_free_rate, period, trading_days_a_year).all(names)
+            for k, v in values.items():
+                result[k][start:start + len(v)] = v
+        return result
+    if by != TIME:
+        raise ValueError("by should be {!r} or {!r}, got {!r}".format(COLUMNS, TIME, by))
+
+    chunk_size = chunk_size or max(1, DEFAULT_CHUNK_BYTES // (8 * max(size, 1)))
+    streaming = StreamingRisk(risk_free_rate, period, trading_days_a_year, keep_history=False)
+    for start, block in returns.iter_rows(chunk_size):
+        streaming.extend(block.T, benchmark_returns[start:start + len(block)])
+
+    if any(k in names for k in _DOWNSIDE_INDICATORS) and streaming.period_count >= 2:
+        downside_ss = np.zeros(size)
+        for _, block in returns.iter_rows(chunk_size):
+            downside_ss += streaming.partial_downside_ss(block.T)
+        streaming.set_downside_ss(downside_ss)
+
+    return {k: np.array(np.broadcast_to(v, (size,)), dtype=float) for k, v in streaming.all(names).items()}
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+# 版权所有 2021 深圳米筐科技有限公司（下称“米筐科技”）
+#
+# 除非遵守当前许可，否则不得使用本软件。
+#
+#     * 非商业用途（非商业用途指个人出于非商业目的使用本软件，或者高校、研究所等非营利机构出于教育、科研等目的使用本软件）：
+#         遵守 Apache License 2.0（下称“Apache 2.0 许可”），
+#         您可以在以下位置获得 Apache 2.0 许可的副本：http://www.apache.org/licenses/LICENSE-2.0。
+#         除非法律有要求或以书面形式达成协议，否则本软件分发时需保持当前许可“原样”不变，且不得附加任何条件。
+#
+#     * 商业用途（商业用途指个人出于任何商业目的使用本软件，或者法人或其他组织出于任何目的使用本软件）：
+#         未经米筐科技授权，任何个人不得出于任何商业目的使用本软件（包括但不限于向第三方提供、销售、出租、出借、转让本软件、
+#         本软件的衍生产品、引用或借鉴了本软件功能或源代码的产品或服务），任何法人或其他组织不得出于任何目的使用本软件，
+#         否则米筐科技有权追究相应的知识产权侵权责任。
+#         在此前提下，对本软件的使用同样需要遵守 Apache 2.0 许可，Apache 2.0 许可与本许可冲突之处，以本许可为准。
+#         详细的授权流程，请联系 public@ricequant.com 获取。
+
+
+from __future__ import division
+
+import numpy as np
+
+COVARIANCE = "covariance"
+CORRELATION = "correlation"
+BETA = "beta"
+KINDS = (COVARIANCE, CORRELATION, BETA)
+
+
+class CrossStatistics(object):
+    """
+    多个组合两两之间的协方差、相关系数与 beta，收益率矩阵只中心化一次，由矩阵乘法得到离差乘积和
+    相关系数与 beta 的定义与 Risk.correlation、Risk.beta 一致：beta[i, j] 为组合 i 对组合 j 回归的斜率，
+    方差为 0 时相关系数与 beta 为 nan
+    :param returns: 收益率矩阵，shape 为 (组合数, 期数)
+    """
+
+    def __init__(self, returns):
+        returns = np.asarray(returns, dtype=float)
+        if returns.ndim != 2:
+            raise ValueError("returns should be a 2-d array of shape (strategies, periods)")
+        self.size, self.period_count = returns.shape
+        self._centered = returns - returns.mean(axis=1, keepdims=True)
+        # 每个组合的离差平方和
+        self._ss = np.einsum("ij,ij->i", self._centered, self._centered)
+
+    def covariance(self, out=None, block_size=None):
+        """
+        协方差矩阵，shape 为 (组合数, 组合数)
+        :param out: 结果写入的数组，可以是 np.memmap，用于放不进内存的大矩阵
+        :param block_size: 分块计算时每块的组合数，None 时一次矩阵乘法算出全部
+        """
+        return self._matrix(COVARIANCE, out, block_size)
+
+    def correlation(self, out=None, block_size=None):
+        """ 相关系数矩阵，参数同 covariance """
+        return self._matrix(CORRELATION, out, block_size)
+
+    def beta(self, out=None, block_size=None):
+        """ beta 矩阵，beta[i, j] 为组合 i 相对组合 j 的 beta，参数同 covariance """
+        return self._matrix(BETA, out, block_size)
+
+    @staticmethod
+    def block_size_for(max_bytes, size):
+        """ 分块计算时内存中同时存在的临时块不超过 max_bytes 的最大块大小 """
+        # 结果在离差乘积和上原地算出，最多同时存在 3 个 block_size × block_size 的块：
+        # beta 的离差乘积和及其一个结果块，以及调用方还未释放的上一个结果块
+        return max(1, min(size, int((max_bytes / 24) ** 0.5)))
+
+    def iter_blocks(self, kind, block_size):
+        """
+        按块生成 (行切片, 列切片, 块)，只计算对角线及以上的块，以下的由转置得到，
+        beta 不对称，对角线以上的块同时给出其转置位置的块；块在下一次迭代时可能被改写，需要保留时应复制
+        """
+        if kind not in KINDS:
+            raise ValueError("kind cannot be {}, possible values: {}".format(kind, ", ".join(KINDS)))
+        starts = range(0, self.size, block_size)
+        for i in starts:
+            rows = slice(i, min(i + block_size, self.size))
+            for j in starts:
+                if j < i:
+                    continue
+                cols = slice(j, min(j + block_size, self.size))
+                cross = self._centered[rows] @ self._centered[cols].T
+                if kind != BETA:
+                    block = self._finish(kind, cross, rows, cols)
+                    yield rows, cols, block
+                    if j > i:
+                        yield cols, rows, block.T
+                    continue
+                # beta 的两个块都由同一个离差乘积和得到，先算的块需要另外的内存
+                yield rows, cols, self._finish(kind, cross.copy() if j > i else cross, rows, cols)
+                if j > i:
+                    yield cols, rows, self._finish(kind, cross.T, cols, rows)
+
+    def _finish(self, kind, cross, rows, cols):
+        # 由离差乘积和原地得到协方差、相关系数或 beta，不再创建同样大小的临时数组
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if kind == COVARIANCE:
+                if self.period_count > 1:
+                    cross /= self.period_count - 1
+                else:
+                    cross.fill(np.nan)
+                return cross
+            if kind == CORRELATION:
+                scale = np.sqrt(self._ss)
+                np.divide(cross, scale[rows, np.newaxis], out=cross)
+                np.divide(cross, scale[np.newaxis, cols], out=cross)
+                return np.clip(cross, -1, 1, out=cross)
+            ss = self._ss[cols]
+            np.divide(cross, ss, out=cross)
+            cross[:, ss == 0] = np.nan
+            return cross
+
+    def _matrix(self, kind, out, block_size):
+        if out is None:
+            out = np.empty((self.size, self.size))
+        elif out.shape != (self.size, self.size):
+            raise ValueError("out should be of shape {}, got {}".format((self.size, self.size), out.shape))
+        if block_size is None:
+            if kind not in KINDS:
+                raise ValueError("kind cannot be {}, possible values: {}".format(kind, ", ".join(KINDS)))
+            everything = slice(None)
+            out[...] = self._finish(kind, self._centered @ self._centered.T, everything, everything)
+            return out
+        for rows, cols, block in self.iter_blocks(kind, block_size):
+            out[rows, cols] = block
+        return out
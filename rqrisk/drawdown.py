@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# 版权所有 2021 深圳米筐科技有限公司（下称“米筐科技”）
+#
+# 除非遵守当前许可，否则不得使用本软件。
+#
+#     * 非商业用途（非商业用途指个人出于非商业目的使用本软件，或者高校、研究所等非营利机构出于教育、科研等目的使用本软件）：
+#         遵守 Apache License 2.0（下称“Apache 2.0 许可”），
+#         您可以在以下位置获得 Apache 2.0 许可的副本：http://www.apache.org/licenses/LICENSE-2.0。
+#         除非法律有要求或以书面形式达成协议，否则本软件分发时需保持当前许可“原样”不变，且不得附加任何条件。
+#
+#     * 商业用途（商业用途指个人出于任何商业目的使用本软件，或者法人或其他组织出于任何目的使用本软件）：
+#         未经米筐科技授权，任何个人不得出于任何商业目的使用本软件（包括但不限于向第三方提供、销售、出租、出借、转让本软件、
+#         本软件的衍生产品、引用或借鉴了本软件功能或源代码的产品或服务），任何法人或其他组织不得出于任何目的使用本软件，
+#         否则米筐科技有权追究相应的知识产权侵权责任。
+#         在此前提下，对本软件的使用同样需要遵守 Apache 2.0 许可，Apache 2.0 许可与本许可冲突之处，以本许可为准。
+#         详细的授权流程，请联系 public@ricequant.com 获取。
+
+
+from collections import namedtuple
+
+import numpy as np
+
+# 每次回撤的信息，各字段为等长的数组，下标为净值序列的下标（Risk 中下标 0 为初始净值 1，下标 i 为第 i 期之后的净值）：
+# start 回撤前最高点，trough 最低点，recovery 恢复到最高点的位置（尚未恢复时为 -1），
+# depth 回撤幅度（正数），duration 从最高点到恢复（尚未恢复时到最后一期）的期数
+_DrawdownEpisodes = namedtuple("DrawdownEpisodes", ["start", "trough", "recovery", "depth", "duration"])
+
+
+class DrawdownEpisodes(_DrawdownEpisodes):
+    __slots__ = ()
+
+    @property
+    def recovered(self):
+        return self.recovery >= 0
+
+    @property
+    def longest_duration(self):
+        """ 最长的水下时间（期数），没有回撤时为 0 """
+        return int(self.duration.max()) if len(self.duration) else 0
+
+    def top(self, n):
+        """ 按幅度从大到小的前 n 次回撤，幅度相同时先发生的在前；只对前 n 个做部分排序 """
+        depth = self.depth
+        if n < len(depth):
+            index = np.sort(np.argpartition(-depth, n - 1)[:n]) if n > 0 else np.empty(0, dtype=int)
+        else:
+            index = np.arange(len(depth))
+        index = index[np.argsort(-depth[index], kind="stable")]
+        return DrawdownEpisodes(*(field[index] for field in self))
+
+
+def drawdown_episodes(drawdown):
+    """
+    由回撤序列（净值 / 历史最高净值 - 1）一次遍历得到全部回撤，按发生的先后排列
+    :param drawdown: 一维的回撤序列，如 calc_drawdown 的结果
+    """
+    drawdown = np.asarray(drawdown, dtype=float)
+    if drawdown.ndim != 1:
+        raise ValueError("drawdown should be 1-d, got shape {}".format(drawdown.shape))
+    n = len(drawdown)
+    edges = np.diff(np.concatenate(([0], (drawdown < 0).view(np.int8), [0])))
+    # begins 为每段水下的第一个位置，ends 为恢复到最高点的位置，等于 n 时表示尚未恢复
+    begins = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    if not len(begins):
+        empty = np.empty(0, dtype=int)
+        return DrawdownEpisodes(empty, empty, empty, np.empty(0), empty)
+
+    # 相邻两段之间的回撤为 0，不影响每段的最小值
+    lowest = np.minimum.reduceat(drawdown, begins)
+    tail = drawdown[begins[0]:]
+    at_lowest = np.flatnonzero(tail == np.repeat(lowest, np.diff(np.append(begins, n))))
+    _, first = np.unique(np.searchsorted(begins, at_lowest + begins[0], side="right"), return_index=True)
+    trough = at_lowest[first] + begins[0]
+
+    start = begins - 1
+    recovered = ends < n
+    recovery = np.where(recovered, ends, -1)
+    duration = np.where(recovered, ends, n - 1) - start
+    return DrawdownEpisodes(start, trough, recovery, -lowest, duration)
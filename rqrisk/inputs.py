@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# 版权所有 2021 深圳米筐科技有限公司（下称“米筐科技”）
+#
+# 除非遵守当前许可，否则不得使用本软件。
+#
+#     * 非商业用途（非商业用途指个人出于非商业目的使用本软件，或者高校、研究所等非营利机构出于教育、科研等目的使用本软件）：
+#         遵守 Apache License 2.0（下称“Apache 2.0 许可”），
+#         您可以在以下位置获得 Apache 2.0 许可的副本：http://www.apache.org/licenses/LICENSE-2.0。
+#         除非法律有要求或以书面形式达成协议，否则本软件分发时需保持当前许可“原样”不变，且不得附加任何条件。
+#
+#     * 商业用途（商业用途指个人出于任何商业目的使用本软件，或者法人或其他组织出于任何目的使用本软件）：
+#         未经米筐科技授权，任何个人不得出于任何商业目的使用本软件（包括但不限于向第三方提供、销售、出租、出借、转让本软件、
+#         本软件的衍生产品、引用或借鉴了本软件功能或源代码的产品或服务），任何法人或其他组织不得出于任何目的使用本软件，
+#         否则米筐科技有权追究相应的知识产权侵权责任。
+#         在此前提下，对本软件的使用同样需要遵守 Apache 2.0 许可，Apache 2.0 许可与本许可冲突之处，以本许可为准。
+#         详细的授权流程，请联系 public@ricequant.com 获取。
+
+
+import numpy as np
+
+PROPAGATE = "propagate"
+OMIT = "omit"
+NAN_POLICIES = (PROPAGATE, OMIT)
+
+
+def as_array(values, dtype=np.float64):
+    """
+    将收益率转为 dtype 的 C 连续 numpy 数组，只在必要时复制
+    numpy 数组、pandas.Series / DataFrame、array.array 等支持 buffer 协议的对象在类型与布局已满足时直接返回其视图；
+    pyarrow 的 Array / ChunkedArray 无空值且只有一块时为零拷贝视图，空值转为 nan；列表等其它序列复制一次
+    返回的视图可能是只读的，调用方不应原地修改
+    """
+    if type(values).__module__.split(".")[0] == "pyarrow":
+        values = _from_arrow(values)
+    elif not isinstance(values, np.ndarray) and hasattr(values, "to_numpy"):
+        # pandas 对象：直接取底层数组，避免之后的运算按 index 对齐；可空类型中的缺失值转为 nan
+        try:
+            values = values.to_numpy(dtype=dtype, copy=False, na_value=np.nan)
+        except TypeError:
+            values = values.to_numpy()
+    return np.ascontiguousarray(values, dtype=dtype)
+
+
+def index_of(values):
+    """ pandas 对象的 index，其它输入返回 None；只作为结果的标注，计算中不按 index 对齐 """
+    return getattr(values, "index", None) if hasattr(values, "to_numpy") else None
+
+
+def omit_missing(returns, benchmark_returns):
+    """
+    剔除组合或基准为 nan 的期，返回 (组合收益率, 基准收益率, 有效期的掩码)，没有缺失时不复制，掩码为 None
+    基准全部缺失时视为没有基准，只按组合剔除，依赖基准的指标仍为 nan
+    """
+    valid = ~np.isnan(returns)
+    benchmark_valid = ~np.isnan(benchmark_returns)
+    if benchmark_valid.any():
+        valid &= benchmark_valid
+    if valid.all():
+        return returns, benchmark_returns, None
+    return returns[valid], benchmark_returns[valid], valid
+
+
+def _from_arrow(values):
+    chunks = getattr(values, "chunks", None)
+    if chunks is not None:
+        if len(chunks) == 1:
+            return _from_arrow(chunks[0])
+        return np.concatenate([_from_arrow(chunk) for chunk in chunks]) if chunks else np.empty(0)
+    if values.null_count == 0:
+        try:
+            return values.to_numpy(zero_copy_only=True)
+        except Exception:  # 需要转换的类型，如 decimal
+            pass
+    # 浮点与整数类型中的空值转为 nan
+    return values.to_numpy(zero_copy_only=False)
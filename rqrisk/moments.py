@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# 版权所有 2021 深圳米筐科技有限公司（下称“米筐科技”）
+#
+# 除非遵守当前许可，否则不得使用本软件。
+#
+#     * 非商业用途（非商业用途指个人出于非商业目的使用本软件，或者高校、研究所等非营利机构出于教育、科研等目的使用本软件）：
+#         遵守 Apache License 2.0（下称“Apache 2.0 许可”），
+#         您可以在以下位置获得 Apache 2.0 许可的副本：http://www.apache.org/licenses/LICENSE-2.0。
+#         除非法律有要求或以书面形式达成协议，否则本软件分发时需保持当前许可“原样”不变，且不得附加任何条件。
+#
+#     * 商业用途（商业用途指个人出于任何商业目的使用本软件，或者法人或其他组织出于任何目的使用本软件）：
+#         未经米筐科技授权，任何个人不得出于任何商业目的使用本软件（包括但不限于向第三方提供、销售、出租、出借、转让本软件、
+#         本软件的衍生产品、引用或借鉴了本软件功能或源代码的产品或服务），任何法人或其他组织不得出于任何目的使用本软件，
+#         否则米筐科技有权追究相应的知识产权侵权责任。
+#         在此前提下，对本软件的使用同样需要遵守 Apache 2.0 许可，Apache 2.0 许可与本许可冲突之处，以本许可为准。
+#         详细的授权流程，请联系 public@ricequant.com 获取。
+
+
+from collections import namedtuple
+
+import numpy as np
+
+Moments = namedtuple("Moments", [
+    "portfolio_mean", "benchmark_mean", "portfolio_centered", "benchmark_centered",
+    "portfolio_ss", "benchmark_ss", "cross_ss", "active_ss", "downside_ss", "win_count", "excess_win_count",
+])
+
+
+def _dot(a, b):
+    # 沿最后一维的内积，一方只有一行时用矩阵乘法，否则按前面的维度广播，均不产生 a * b 的临时数组
+    if b.ndim == 1:
+        return a @ b
+    if a.ndim == 1:
+        return b @ a
+    if a.ndim == b.ndim == 2:
+        if len(a) == 1:
+            return b @ a[0]
+        if len(b) == 1:
+            return a @ b[0]
+    return np.einsum("...t,...t->...", a, b)
+
+
+def calc_moments(portfolio, benchmark):
+    """
+    沿最后一维求出各指标共用的统计量：均值与离差，离差平方和、交叉乘积和、超额收益率的离差平方和、下行离差平方和，
+    以及组合收益率为正、组合跑赢基准的期数。各项由单独的 numpy 归约得到，共用同一份离差，每项各读一遍数据
+    组合与基准各自的统计量保持各自的 shape，涉及两者的按前面的维度广播
+    :param portfolio: 组合收益率，shape 为 (..., 期数)
+    :param benchmark: 基准收益率，shape 为 (..., 期数)
+    """
+    portfolio_mean = portfolio.mean(axis=-1)
+    benchmark_mean = benchmark.mean(axis=-1)
+    portfolio_centered = portfolio - portfolio_mean[..., np.newaxis]
+    benchmark_centered = benchmark - benchmark_mean[..., np.newaxis]
+
+    # 超额收益率的离差即两者离差之差，单独求平方和而不由交叉项展开，避免两者接近时的抵消误差
+    buffer = portfolio_centered - benchmark_centered
+    active_ss = _dot(buffer, buffer)
+    cross_ss = _dot(portfolio_centered, benchmark_centered)
+    # 下行离差只与组合有关，buffer 与组合的 shape 不同时另外分配
+    if buffer.shape != portfolio_centered.shape:
+        buffer = np.empty_like(portfolio_centered)
+    downside = np.minimum(portfolio_centered, 0., out=buffer)
+    return Moments(
+        portfolio_mean, benchmark_mean, portfolio_centered, benchmark_centered,
+        _dot(portfolio_centered, portfolio_centered), _dot(benchmark_centered, benchmark_centered), cross_ss, active_ss,
+        _dot(downside, downside), np.count_nonzero(portfolio > 0, axis=-1),
+        np.count_nonzero(portfolio > benchmark, axis=-1),
+    )
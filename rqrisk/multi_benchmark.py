@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# 版权所有 2021 深圳米筐科技有限公司（下称“米筐科技”）
+#
+# 除非遵守当前许可，否则不得使用本软件。
+#
+#     * 非商业用途（非商业用途指个人出于非商业目的使用本软件，或者高校、研究所等非营利机构出于教育、科研等目的使用本软件）：
+#         遵守 Apache License 2.0（下称“Apache 2.0 许可”），
+#         您可以在以下位置获得 Apache 2.0 许可的副本：http://www.apache.org/licenses/LICENSE-2.0。
+#         除非法律有要求或以书面形式达成协议，否则本软件分发时需保持当前许可“原样”不变，且不得附加任何条件。
+#
+#     * 商业用途（商业用途指个人出于任何商业目的使用本软件，或者法人或其他组织出于任何目的使用本软件）：
+#         未经米筐科技授权，任何个人不得出于任何商业目的使用本软件（包括但不限于向第三方提供、销售、出租、出借、转让本软件、
+#         本软件的衍生产品、引用或借鉴了本软件功能或源代码的产品或服务），任何法人或其他组织不得出于任何目的使用本软件，
+#         否则米筐科技有权追究相应的知识产权侵权责任。
+#         在此前提下，对本软件的使用同样需要遵守 Apache 2.0 许可，Apache 2.0 许可与本许可冲突之处，以本许可为准。
+#         详细的授权流程，请联系 public@ricequant.com 获取。
+
+
+from __future__ import division
+
+import numpy as np
+
+from .batch import RiskBatch
+from .utils import DAILY
+
+
+class MultiBenchmarkRisk(RiskBatch):
+    """
+    单个组合相对多个基准的风险指标，结果为沿基准维度的数组，与对每个基准分别构造 Risk 逐个一致
+    仅与组合有关的统计量（均值、波动率、净值与回撤等）只计算一次，与各基准的离差乘积和由一次矩阵乘法得到
+    :param daily_returns: 组合收益率，shape 为 (期数,)
+    :param benchmark_returns: 基准收益率矩阵，shape 为 (基准数, 期数)
+    :param benchmark_names: 基准名称，用于 by_benchmark()，默认为 0, 1, 2, ...
+    """
+
+    def __init__(
+            self, daily_returns, benchmark_returns, risk_free_rate, period=DAILY, trading_days_a_year=None,
+            benchmark_names=None
+    ):
+        daily_returns = np.asarray(daily_returns, dtype=float)
+        benchmark_returns = np.atleast_2d(np.asarray(benchmark_returns, dtype=float))
+        if daily_returns.ndim != 1 or benchmark_returns.ndim != 2:
+            raise ValueError("daily_returns should be 1-d and benchmark_returns should be 2-d (benchmarks, periods)")
+        super(MultiBenchmarkRisk, self).__init__(
+            daily_returns, benchmark_returns, risk_free_rate, period, trading_days_a_year
+        )
+        if benchmark_names is None:
+            benchmark_names = list(range(len(benchmark_returns)))
+        elif len(benchmark_names) != len(benchmark_returns):
+            raise ValueError("benchmark_names should have one name per benchmark")
+        self.benchmark_names = list(benchmark_names)
+
+    def by_benchmark(self, names=None):
+        """ 基准名称到该基准下 {指标名称: 指标值} 的字典，names 同 all() """
+        result = self.all(names)
+        return {
+            benchmark: {k: v[i] for k, v in result.items()} for i, benchmark in enumerate(self.benchmark_names)
+        }
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+# 版权所有 2021 深圳米筐科技有限公司（下称“米筐科技”）
+#
+# 除非遵守当前许可，否则不得使用本软件。
+#
+#     * 非商业用途（非商业用途指个人出于非商业目的使用本软件，或者高校、研究所等非营利机构出于教育、科研等目的使用本软件）：
+#         遵守 Apache License 2.0（下称“Apache 2.0 许可”），
+#         您可以在以下位置获得 Apache 2.0 许可的副本：http://www.apache.org/licenses/LICENSE-2.0。
+#         除非法律有要求或以书面形式达成协议，否则本软件分发时需保持当前许可“原样”不变，且不得附加任何条件。
+#
+#     * 商业用途（商业用途指个人出于任何商业目的使用本软件，或者法人或其他组织出于任何目的使用本软件）：
+#         未经米筐科技授权，任何个人不得出于任何商业目的使用本软件（包括但不限于向第三方提供、销售、出租、出借、转让本软件、
+#         本软件的衍生产品、引用或借鉴了本软件功能或源代码的产品或服务），任何法人或其他组织不得出于任何目的使用本软件，
+#         否则米筐科技有权追究相应的知识产权侵权责任。
+#         在此前提下，对本软件的使用同样需要遵守 Apache 2.0 许可，Apache 2.0 许可与本许可冲突之处，以本许可为准。
+#         详细的授权流程，请联系 public@ricequant.com 获取。
+
+
+import mmap
+import os
+import tempfile
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .batch import RiskBatch
+from .risk import Risk
+from .utils import DAILY, indicator_names, evaluation_plan
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # python 3.7
+    shared_memory = None
+
+# 工作进程中挂载的收益率矩阵，由 _init_worker 设置
+_worker_arrays = None
+
+
+def evaluate_many(
+        returns, benchmark_returns, risk_free_rate, period=DAILY, trading_days_a_year=None, names=None,
+        chunk_size=1000, max_workers=None, mp_context=None
+):
+    """
+    用多进程计算大量组合的风险指标，返回指标名称到 shape 为 (组合数,) 的数组的字典，顺序与输入一致
+    收益率矩阵只放入共享内存（不支持时为临时的 memmap 文件）一次，工作进程直接挂载，不再逐个序列化；
+    returns 本身为 np.memmap 时直接由工作进程打开对应的文件
+    每块组合用 RiskBatch 计算，出错时逐个组合用 Risk 重算，仍然出错的组合对应的结果为 nan 并给出警告
+    :param returns: 组合收益率矩阵，shape 为 (组合数, 期数)
+    :param benchmark_returns: 基准收益率，一维时为所有组合共享的基准，二维时与 returns 逐行对应
+    :param risk_free_rate: 无风险利率，所有组合相同
+    :param names: 需要计算的指标名称，None 表示全部指标
+    :param chunk_size: 每个任务包含的组合数
+    :param max_workers: 进程数，None 为 CPU 数，为 1 时在当前进程中计算
+    :param mp_context: 传给 ProcessPoolExecutor 的 multiprocessing context
+    """
+    if not isinstance(returns, np.memmap):
+        returns = np.asarray(returns, dtype=float)
+    benchmark_returns = np.asarray(benchmark_returns, dtype=float)
+    if returns.ndim != 2:
+        raise ValueError("returns should be a 2-d array of shape (strategies, periods)")
+    if benchmark_returns.shape not in ((returns.shape[1],), returns.shape):
+        raise ValueError("benchmark_returns should be of shape ({0},) or {1}, got {2}".format(
+            returns.shape[1], returns.shape, benchmark_returns.shape))
+    if names is None:
+        names = indicator_names(RiskBatch)
+    else:
+        names = list(names)
+        evaluation_plan(RiskBatch, names)
+    if chunk_size < 1:
+        raise ValueError("chunk_size should be positive, got {}".format(chunk_size))
+
+    size = len(returns)
+    options = (risk_free_rate, period, trading_days_a_year, names)
+    result = {k: np.full(size, np.nan) for k in names}
+    chunks = [(start, min(start + chunk_size, size)) for start in range(0, size, chunk_size)]
+    max_workers = max_workers or os.cpu_count() or 1
+    failed = 0
+
+    if max_workers == 1 or len(chunks) <= 1:
+        for start, stop in chunks:
+            failed += _fill(result, start, _evaluate_chunk(returns, benchmark_returns, start, stop, options))
+    else:
+        shared, cleanups = [], []
+        try:
+            for array in (returns, benchmark_returns):
+                descriptor, cleanup = _share(array)
+                shared.append(descriptor)
+                cleanups.append(cleanup)
+            with ProcessPoolExecutor(
+                    min(max_workers, len(chunks)), mp_context=mp_context, initializer=_init_worker, initargs=shared
+            ) as executor:
+                futures = [(start, stop, executor.submit(_evaluate_shared_chunk, start, stop, options))
+                           for start, stop in chunks]
+                for start, stop, future in futures:
+                    try:
+                        failed += _fill(result, start, future.result())
+                    except Exception:
+                        # 工作进程异常退出等，整块结果为 nan
+                        failed += stop - start
+        finally:
+            for cleanup in cleanups:
+                cleanup()
+
+    if failed:
+        warnings.warn("{} of {} strategies failed, their indicators are nan".format(failed, size))
+    return result
+
+
+def _fill(result, start, chunk_result):
+    values, failed = chunk_result
+    for k, v in values.items():
+        result[k][start:start + len(v)] = v
+    return failed
+
+
+def _evaluate_chunk(returns, benchmark_returns, start, stop, options):
+    """ 返回 (指标名称到数组的字典, 失败的组合数) """
+    risk_free_rate, period, trading_days_a_year, names = options
+    portfolio = np.asarray(returns[start:stop], dtype=float)
+    benchmark = benchmark_returns if benchmark_returns.ndim == 1 else benchmark_returns[start:stop]
+    try:
+        return RiskBatch(portfolio, benchmark, risk_free_rate, period, trading_days_a_year).all(names), 0
+    except Exception:
+        pass
+
+    values = {k: np.full(len(portfolio), np.nan) for k in names}
+    failed = 0
+    for i, row in enumerate(portfolio):
+        try:
+            row_result = Risk(
+                row, benchmark if benchmark.ndim == 1 else benchmark[i], risk_free_rate, period, trading_days_a_year
+            ).all(names)
+        except Exception:
+            failed += 1
+            continue
+        for k, v in row_result.items():
+            values[k][i] = v
+    return values, failed
+
+
+def _evaluate_shared_chunk(start, stop, options):
+    return _evaluate_chunk(_worker_arrays[0], _worker_arrays[1], start, stop, options)
+
+
+def _share(array):
+    """ 返回 (工作进程据此挂载数组的描述, 清理函数) """
+    offset = _memmap_offset(array) if isinstance(array, np.memmap) else None
+    if offset is not None:
+        return ("memmap", array.filename, offset, array.shape, array.dtype.str), lambda: None
+
+    array = np.ascontiguousarray(array, dtype=float)
+    if shared_memory is not None:
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+
+        def cleanup():
+            shm.close()
+            shm.unlink()
+
+        return ("shm", shm.name, array.shape, array.dtype.str), cleanup
+
+    fd, path = tempfile.mkstemp(suffix=".dat")
+    os.close(fd)
+    np.memmap(path, dtype=array.dtype, mode="w+", shape=array.shape)[...] = array
+    return ("memmap", path, 0, array.shape, array.dtype.str), lambda: os.remove(path)
+
+
+def _memmap_offset(array):
+    """
+    memmap 的数据在文件中的字节偏移，不连续或无法确定时返回 None
+    切片得到的 memmap 的 offset 仍是原数组的，需按数据地址相对映射起点的距离计算
+    """
+    mapping = getattr(array, "_mmap", None)
+    if mapping is None or array.filename is None or not array.flags.c_contiguous:
+        return None
+    # np.memmap 从 offset 向下对齐到 ALLOCATIONGRANULARITY 处开始映射
+    start = array.offset - array.offset % mmap.ALLOCATIONGRANULARITY
+    base = np.frombuffer(mapping, dtype=np.uint8).__array_interface__["data"][0]
+    return start + array.__array_interface__["data"][0] - base
+
+
+def _attach(descriptor):
+    if descriptor[0] == "shm":
+        _, name, shape, dtype = descriptor
+        shm = shared_memory.SharedMemory(name=name)
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf), shm
+    _, path, offset, shape, dtype = descriptor
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape), None
+
+
+def _init_worker(returns_descriptor, benchmark_descriptor):
+    global _worker_arrays
+    # 保留 SharedMemory 对象的引用，避免缓冲区在进程结束前被释放
+    returns, returns_handle = _attach(returns_descriptor)
+    benchmark, benchmark_handle = _attach(benchmark_descriptor)
+    _worker_arrays = (returns, benchmark, returns_handle, benchmark_handle)
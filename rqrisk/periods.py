@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# 版权所有 2021 深圳米筐科技有限公司（下称“米筐科技”）
+#
+# 除非遵守当前许可，否则不得使用本软件。
+#
+#     * 非商业用途（非商业用途指个人出于非商业目的使用本软件，或者高校、研究所等非营利机构出于教育、科研等目的使用本软件）：
+#         遵守 Apache License 2.0（下称“Apache 2.0 许可”），
+#         您可以在以下位置获得 Apache 2.0 许可的副本：http://www.apache.org/licenses/LICENSE-2.0。
+#         除非法律有要求或以书面形式达成协议，否则本软件分发时需保持当前许可“原样”不变，且不得附加任何条件。
+#
+#     * 商业用途（商业用途指个人出于任何商业目的使用本软件，或者法人或其他组织出于任何目的使用本软件）：
+#         未经米筐科技授权，任何个人不得出于任何商业目的使用本软件（包括但不限于向第三方提供、销售、出租、出借、转让本软件、
+#         本软件的衍生产品、引用或借鉴了本软件功能或源代码的产品或服务），任何法人或其他组织不得出于任何目的使用本软件，
+#         否则米筐科技有权追究相应的知识产权侵权责任。
+#         在此前提下，对本软件的使用同样需要遵守 Apache 2.0 许可，Apache 2.0 许可与本许可冲突之处，以本许可为准。
+#         详细的授权流程，请联系 public@ricequant.com 获取。
+
+
+from __future__ import division
+
+import numpy as np
+
+from .utils import DAILY, annual_factor, safe_div_array
+
+MONTH = "M"
+QUARTER = "Q"
+YEAR = "Y"
+
+SUB_PERIOD_INDICATORS = (
+    "period_count", "return_rate", "annual_return", "benchmark_return", "arithmetic_excess_return",
+    "volatility", "annual_volatility", "max_drawdown", "sharpe", "downside_risk", "sortino",
+    "win_rate", "excess_win_rate",
+)
+
+
+def calendar_labels(dates, freq=MONTH):
+    """
+    每期所属的自然月 / 季度 / 年，可作为 sub_period_indicators 的 labels
+    :param dates: 每期的日期，可以是 datetime64 数组、pandas.DatetimeIndex 或日期字符串列表
+    :param freq: "M" 月，"Q" 季度（以季度第一个月表示），"Y" 年
+    """
+    months = np.asarray(dates, dtype="datetime64[D]").astype("datetime64[M]")
+    if freq == MONTH:
+        return months
+    if freq == QUARTER:
+        return (months.astype(np.int64) // 3 * 3).astype("datetime64[M]")
+    if freq == YEAR:
+        return months.astype("datetime64[Y]")
+    raise ValueError("freq cannot be {}, possible values: {}, {}, {}".format(freq, MONTH, QUARTER, YEAR))
+
+
+def bucket_starts(labels):
+    """ 由每期的标签得到 (每段的起始下标, 每段的标签)，相同标签的期必须相邻 """
+    labels = np.asarray(labels)
+    if labels.ndim != 1 or len(labels) == 0:
+        raise ValueError("labels should be a non-empty 1-d array")
+    starts = np.concatenate(([0], np.flatnonzero(labels[1:] != labels[:-1]) + 1))
+    keys = labels[starts]
+    if len(np.unique(keys)) != len(keys):
+        raise ValueError("periods with the same label should be contiguous")
+    return starts, keys
+
+
+def sub_period_indicators(
+        returns, benchmark_returns, risk_free_rate, labels=None, boundaries=None, period=DAILY,
+        trading_days_a_year=None
+):
+    """
+    按标签或分段起点把收益率切成若干段，一次计算每段的指标，与对每段单独构造 Risk 的结果一致
+    :param returns: 组合收益率，最后一维为时间，二维时每行为一个组合
+    :param benchmark_returns: 基准收益率，可与 returns 广播
+    :param labels: 每期的标签，如 calendar_labels 的结果，相同标签的期必须相邻
+    :param boundaries: 每段的起始下标，从 0 开始严格递增；与 labels 二选一
+    :return: (每段的标签或起始下标, 指标名称到数组的字典)，数组最后一维为段，指标见 SUB_PERIOD_INDICATORS，
+        其中 period_count 为每段的期数
+    """
+    if period == DAILY and trading_days_a_year is not None:
+        factor = trading_days_a_year
+    else:
+        factor = annual_factor(period)
+    returns = np.asarray(returns, dtype=float)
+    starts, keys = split_periods(labels, boundaries, returns.shape[-1])
+    return keys, calc_sub_period_indicators(
+        returns, np.asarray(benchmark_returns, dtype=float), starts, factor, (1 + risk_free_rate) ** (1 / factor) - 1
+    )
+
+
+def split_periods(labels, boundaries, period_count):
+    """ 检查 labels 或 boundaries（二选一），返回 (每段的起始下标, 每段的标签或起始下标) """
+    if (labels is None) == (boundaries is None):
+        raise ValueError("exactly one of labels and boundaries should be given")
+    if labels is not None:
+        if len(labels) != period_count:
+            raise ValueError("labels should have one label per period")
+        return bucket_starts(labels)
+    starts = np.asarray(boundaries, dtype=np.intp)
+    if starts.ndim != 1 or len(starts) == 0 or starts[0] != 0 or np.any(np.diff(starts) <= 0) or \
+            starts[-1] >= period_count:
+        raise ValueError("boundaries should start at 0, be strictly increasing and less than the period count")
+    return starts, starts
+
+
+def _segmented_peak(values, bucket, starts):
+    """
+    沿最后一维在各段内分别求历史最高点，内存为 O(期数)
+    第 j 段加上 j 倍的（取值范围 + 1）后，后一段的值都大于前一段的最高点，一次 accumulate 即不会跨段；
+    再由取到最高点的下标从原值中取出最高点，不受加减偏移的舍入误差影响
+    """
+    finite = np.where(np.isfinite(values), values, np.nan)
+    span = np.fmax.reduce(finite, axis=-1) - np.fmin.reduce(finite, axis=-1) + 1
+    shifted = values + bucket * np.nan_to_num(span)[..., np.newaxis]
+    is_peak = shifted == np.fmax.accumulate(shifted, axis=-1)
+    # 段首为 -inf 或 nan 时上一段的最高点会延续到本段，段首总是作为起点
+    is_peak[..., starts] = True
+    index = np.maximum.accumulate(np.where(is_peak, np.arange(values.shape[-1]), 0), axis=-1)
+    return np.take_along_axis(values, index, axis=-1)
+
+
+def calc_sub_period_indicators(returns, benchmark_returns, starts, factor, risk_free_rate_per_period):
+    """ sub_period_indicators 的实现，starts 为每段的起始下标，用 np.ufunc.reduceat 对所有段同时归约 """
+    n = returns.shape[-1]
+    counts = np.diff(np.append(starts, n))
+    # 每期所属的段与在段内的位置
+    bucket = np.repeat(np.arange(len(starts)), counts)
+
+    def _sum(values):
+        return np.add.reduceat(values, starts, axis=-1)
+
+    log_returns = np.log1p(returns)
+    log_benchmark = np.log1p(benchmark_returns)
+    result = {"period_count": counts}
+    result["return_rate"] = np.expm1(_sum(log_returns))
+    result["annual_return"] = (1 + result["return_rate"]) ** (factor / counts) - 1
+    result["benchmark_return"] = np.expm1(_sum(log_benchmark))
+    result["arithmetic_excess_return"] = result["return_rate"] - result["benchmark_return"]
+
+    mean = _sum(returns) / counts
+    centered = returns - mean[..., bucket]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        volatility = np.where(counts > 1, np.sqrt(_sum(np.square(centered)) / (counts - 1)), 0.)
+        downside_risk = np.where(counts > 1, np.sqrt(_sum(np.square(np.minimum(centered, 0.))) / (counts - 1)), 0.)
+    result["volatility"] = volatility
+    result["annual_volatility"] = volatility * factor ** 0.5
+    avg_excess_return = mean - risk_free_rate_per_period
+    result["sharpe"] = np.where(counts > 1, safe_div_array(np.sqrt(factor) * avg_excess_return, volatility), np.nan)
+    result["downside_risk"] = downside_risk
+    result["sortino"] = safe_div_array(factor * avg_excess_return, downside_risk * factor ** 0.5)
+
+    # 段内的对数净值（段首为 0，即净值从 1 开始）
+    cum = np.cumsum(log_returns, axis=-1)
+    before = np.concatenate((np.zeros(cum.shape[:-1] + (1,)), cum[..., starts[1:] - 1]), axis=-1)
+    log_nav = cum - before[..., bucket]
+    peak = np.maximum(_segmented_peak(log_nav, bucket, starts), 0.)
+    result["max_drawdown"] = np.abs(np.minimum.reduceat(np.expm1(log_nav - peak), starts, axis=-1))
+
+    result["win_rate"] = _sum(returns > 0) / counts
+    result["excess_win_rate"] = _sum(returns > benchmark_returns) / counts
+
+    # 仅与基准相关的指标按组合广播，period_count 只与分段有关
+    shape = np.broadcast_shapes(returns.shape[:-1], benchmark_returns.shape[:-1]) + (len(starts),)
+    for k, v in result.items():
+        if k != "period_count" and v.shape != shape:
+            result[k] = np.array(np.broadcast_to(v, shape))
+    return {k: result[k] for k in SUB_PERIOD_INDICATORS}
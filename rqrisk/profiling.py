@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# 版权所有 2021 深圳米筐科技有限公司（下称“米筐科技”）
+#
+# 除非遵守当前许可，否则不得使用本软件。
+#
+#     * 非商业用途（非商业用途指个人出于非商业目的使用本软件，或者高校、研究所等非营利机构出于教育、科研等目的使用本软件）：
+#         遵守 Apache License 2.0（下称“Apache 2.0 许可”），
+#         您可以在以下位置获得 Apache 2.0 许可的副本：http://www.apache.org/licenses/LICENSE-2.0。
+#         除非法律有要求或以书面形式达成协议，否则本软件分发时需保持当前许可“原样”不变，且不得附加任何条件。
+#
+#     * 商业用途（商业用途指个人出于任何商业目的使用本软件，或者法人或其他组织出于任何目的使用本软件）：
+#         未经米筐科技授权，任何个人不得出于任何商业目的使用本软件（包括但不限于向第三方提供、销售、出租、出借、转让本软件、
+#         本软件的衍生产品、引用或借鉴了本软件功能或源代码的产品或服务），任何法人或其他组织不得出于任何目的使用本软件，
+#         否则米筐科技有权追究相应的知识产权侵权责任。
+#         在此前提下，对本软件的使用同样需要遵守 Apache 2.0 许可，Apache 2.0 许可与本许可冲突之处，以本许可为准。
+#         详细的授权流程，请联系 public@ricequant.com 获取。
+
+
+import json
+import threading
+
+from .utils import add_indicator_hook, remove_indicator_hook
+
+
+class IndicatorProfiler(object):
+    """
+    记录指标与中间结果（名称以 _ 开头）的调用次数、缓存命中、耗时与数据长度，作为上下文管理器使用：
+
+        with IndicatorProfiler() as profiler:
+            Risk(...).all()
+        profiler.summary()
+
+    也可以调用 start() / stop() 手动开启与关闭，未开启时指标计算没有额外开销
+    """
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        add_indicator_hook(self)
+        return self
+
+    def stop(self):
+        remove_indicator_hook(self)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def __call__(self, instance, name, cached, elapsed, self_elapsed):
+        key = "{}.{}".format(instance.__class__.__name__, name)
+        period_count = getattr(instance, "period_count", None)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = {
+                    "calls": 0, "hits": 0, "time": 0., "self_time": 0., "max_time": 0., "max_period_count": None
+                }
+            if cached:
+                stats["hits"] += 1
+                return
+            stats["calls"] += 1
+            stats["time"] += elapsed
+            stats["self_time"] += self_elapsed
+            stats["max_time"] = max(stats["max_time"], elapsed)
+            if period_count is not None:
+                stats["max_period_count"] = max(stats["max_period_count"] or 0, period_count)
+
+    def summary(self):
+        """
+        返回 "类名.指标名" 到统计值的字典，按不含依赖的总耗时从大到小排列，耗时单位为秒：
+        calls 计算次数，hits 缓存命中次数，time 含依赖的总耗时，self_time 不含依赖的总耗时，
+        mean_time 平均每次计算耗时，max_time 单次最大耗时，max_period_count 最大数据长度
+        """
+        with self._lock:
+            items = [(k, dict(v)) for k, v in self._stats.items()]
+        for _, stats in items:
+            stats["mean_time"] = stats["time"] / stats["calls"] if stats["calls"] else 0.
+        return dict(sorted(items, key=lambda item: item[1]["self_time"], reverse=True))
+
+    def export(self, path=None):
+        """ 以 JSON 格式导出 summary()，给定 path 时写入文件，否则返回字符串 """
+        content = json.dumps(self.summary(), indent=2)
+        if path is None:
+            return content
+        with open(path, "w") as f:
+            f.write(content)
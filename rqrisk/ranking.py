@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# 版权所有 2021 深圳米筐科技有限公司（下称“米筐科技”）
+#
+# 除非遵守当前许可，否则不得使用本软件。
+#
+#     * 非商业用途（非商业用途指个人出于非商业目的使用本软件，或者高校、研究所等非营利机构出于教育、科研等目的使用本软件）：
+#         遵守 Apache License 2.0（下称“Apache 2.0 许可”），
+#         您可以在以下位置获得 Apache 2.0 许可的副本：http://www.apache.org/licenses/LICENSE-2.0。
+#         除非法律有要求或以书面形式达成协议，否则本软件分发时需保持当前许可“原样”不变，且不得附加任何条件。
+#
+#     * 商业用途（商业用途指个人出于任何商业目的使用本软件，或者法人或其他组织出于任何目的使用本软件）：
+#         未经米筐科技授权，任何个人不得出于任何商业目的使用本软件（包括但不限于向第三方提供、销售、出租、出借、转让本软件、
+#         本软件的衍生产品、引用或借鉴了本软件功能或源代码的产品或服务），任何法人或其他组织不得出于任何目的使用本软件，
+#         否则米筐科技有权追究相应的知识产权侵权责任。
+#         在此前提下，对本软件的使用同样需要遵守 Apache 2.0 许可，Apache 2.0 许可与本许可冲突之处，以本许可为准。
+#         详细的授权流程，请联系 public@ricequant.com 获取。
+
+
+from __future__ import division
+
+from collections import namedtuple
+
+import numpy as np
+
+from .batch import RiskBatch
+from .inputs import OMIT
+from .risk import Risk
+from .utils import DAILY, evaluation_plan, indicator_names
+
+# 未指定 chunk_size 时每块计算的收益率的字节数
+DEFAULT_CHUNK_BYTES = 64 << 20
+
+# index 为入选组合在输入中的下标，按名次排列；report 为入选组合的指标名称到数组的字典，顺序与 index 一致
+TopK = namedtuple("TopK", ["index", "report"])
+
+
+def top_k(
+        returns, benchmark_returns, risk_free_rate, k, by="sharpe", ascending=False, filters=None,
+        period=DAILY, trading_days_a_year=None, names=None, chunk_size=None
+):
+    """
+    选出排名前 k 的组合：先分块只计算排序与过滤用到的指标，用 np.argpartition 选出候选，再只对入选的组合计算完整的指标
+    :param returns: 组合收益率矩阵，shape 为 (组合数, 期数)
+    :param benchmark_returns: 基准收益率，一维时为所有组合共享的基准，二维时与 returns 逐行对应
+    :param by: 排序的指标名称，多个时依次作为第一、第二……排序键
+    :param ascending: 是否从小到大排序，可以对每个排序键分别给出
+    :param filters: 指标名称（或 "period_count"）到 (下限, 上限) 的字典，None 表示不限，如 {"max_drawdown": (None, 0.3)}
+    :param names: 入选组合需要计算的指标，None 表示全部指标
+    :param chunk_size: 计算排序指标时每块的组合数，None 时按每块约 64MB 确定
+    排序键为 nan 或不满足过滤条件的组合不参与排名；排序键全部相同时下标小的在前
+    含 nan 的组合（如历史较短、以 nan 补齐的组合）逐个用 Risk(nan_policy="omit") 计算，即只用组合与基准均有效的期，
+    过滤条件中的 "period_count" 为每个组合的有效期数
+    """
+    returns = np.asarray(returns, dtype=float)
+    benchmark_returns = np.asarray(benchmark_returns, dtype=float)
+    if returns.ndim != 2:
+        raise ValueError("returns should be a 2-d array of shape (strategies, periods)")
+    by = [by] if isinstance(by, str) else list(by)
+    ascending = [ascending] * len(by) if isinstance(ascending, bool) else list(ascending)
+    if not by or len(ascending) != len(by):
+        raise ValueError("ascending should be a bool or have one value per key in by")
+    filters = dict(filters or {})
+    metrics = list(dict.fromkeys(by + [f for f in filters if f != "period_count"]))
+    evaluation_plan(RiskBatch, metrics)
+    if names is not None:
+        evaluation_plan(RiskBatch, names)
+
+    size, period_count = returns.shape
+    chunk_size = chunk_size or max(1, DEFAULT_CHUNK_BYTES // (8 * max(period_count, 1)))
+    options = (risk_free_rate, period, trading_days_a_year)
+    values = {m: np.empty(size) for m in metrics + ["period_count"]}
+    for start in range(0, size, chunk_size):
+        stop = min(start + chunk_size, size)
+        chunk = _evaluate(returns[start:stop], _rows(benchmark_returns, start, stop), options, metrics)
+        for m, v in chunk.items():
+            values[m][start:stop] = v
+
+    # 越小越靠前的排序键
+    keys = [values[m] if asc else -values[m] for m, asc in zip(by, ascending)]
+    selected = np.ones(size, dtype=bool)
+    for key in keys:
+        selected &= ~np.isnan(key)
+    for m, (low, high) in filters.items():
+        if low is not None:
+            selected &= values[m] >= low
+        if high is not None:
+            selected &= values[m] <= high
+    candidates = np.flatnonzero(selected)
+
+    if k < len(candidates):
+        primary = keys[0][candidates]
+        # 第 k 名的第一排序键，与其相同的都需要参与后续的排序
+        kth = primary[np.argpartition(primary, k - 1)[k - 1]] if k > 0 else -np.inf
+        candidates = candidates[primary <= kth]
+    order = np.lexsort([candidates] + [key[candidates] for key in reversed(keys)])
+    index = candidates[order][:max(k, 0)]
+
+    report = _evaluate(returns[index], _rows(benchmark_returns, index), options, names) if len(index) else {}
+    report.pop("period_count", None)
+    return TopK(index, report)
+
+
+def _evaluate(returns, benchmark_returns, options, names):
+    # 与逐行 Risk(nan_policy="omit") 一致：行按有效期的掩码分组，每组剔除缺失的期后用一次 RiskBatch 计算，
+    # 共享基准中的 nan 使所有行同属一组；另给出每行的有效期数
+    if names is None:
+        names = indicator_names(RiskBatch)
+    benchmark_valid = ~np.isnan(benchmark_returns)
+    benchmark_missing = ~benchmark_valid.any(axis=-1)
+    valid = ~np.isnan(returns) & benchmark_valid
+    result = {k: np.empty(len(returns)) for k in names}
+    result["period_count"] = np.count_nonzero(valid, axis=-1)
+
+    complete = result["period_count"] == returns.shape[-1]
+    # 基准全部缺失时 Risk 只按组合剔除且依赖基准的指标另做处理，这样的行逐个计算
+    benchmark_missing = np.broadcast_to(benchmark_missing, complete.shape)
+    single = np.flatnonzero(benchmark_missing)
+    incomplete = np.flatnonzero(~complete & ~benchmark_missing)
+    # 没有缺失时直接用整块，不复制
+    groups = [(slice(None) if complete.all() else np.flatnonzero(complete), None)]
+    if len(incomplete):
+        # 掩码按位打包成定长字节串再去重，比按行比较布尔数组快得多
+        packed = np.ascontiguousarray(np.packbits(valid[incomplete], axis=-1))
+        keys = packed.view(np.dtype((np.void, packed.shape[-1]))).ravel()
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+        members = np.split(incomplete[np.argsort(inverse, kind="stable")], np.cumsum(np.bincount(inverse))[:-1])
+        groups += [(rows, valid[incomplete[i]]) for rows, i in zip(members, first)]
+    for rows, mask in groups:
+        if isinstance(rows, np.ndarray) and not len(rows):
+            continue
+        group_returns, group_benchmark = returns[rows], _rows(benchmark_returns, rows)
+        if mask is not None:
+            group_returns, group_benchmark = group_returns[:, mask], group_benchmark[..., mask]
+        for k, v in RiskBatch(group_returns, group_benchmark, *options).all(names).items():
+            result[k][rows] = v
+    for i in single:
+        risk = Risk(returns[i], _rows(benchmark_returns, i), *options, nan_policy=OMIT)
+        for k, v in risk.all(names).items():
+            result[k][i] = v
+        result["period_count"][i] = risk.period_count
+    return result
+
+
+def _rows(benchmark_returns, *selection):
+    # 二维基准与组合逐行对应，按同样的行选取
+    if benchmark_returns.ndim == 1:
+        return benchmark_returns
+    if len(selection) == 2:
+        return benchmark_returns[selection[0]:selection[1]]
+    return benchmark_returns[selection[0]]
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# 版权所有 2021 深圳米筐科技有限公司（下称“米筐科技”）
+#
+# 除非遵守当前许可，否则不得使用本软件。
+#
+#     * 非商业用途（非商业用途指个人出于非商业目的使用本软件，或者高校、研究所等非营利机构出于教育、科研等目的使用本软件）：
+#         遵守 Apache License 2.0（下称“Apache 2.0 许可”），
+#         您可以在以下位置获得 Apache 2.0 许可的副本：http://www.apache.org/licenses/LICENSE-2.0。
+#         除非法律有要求或以书面形式达成协议，否则本软件分发时需保持当前许可“原样”不变，且不得附加任何条件。
+#
+#     * 商业用途（商业用途指个人出于任何商业目的使用本软件，或者法人或其他组织出于任何目的使用本软件）：
+#         未经米筐科技授权，任何个人不得出于任何商业目的使用本软件（包括但不限于向第三方提供、销售、出租、出借、转让本软件、
+#         本软件的衍生产品、引用或借鉴了本软件功能或源代码的产品或服务），任何法人或其他组织不得出于任何目的使用本软件，
+#         否则米筐科技有权追究相应的知识产权侵权责任。
+#         在此前提下，对本软件的使用同样需要遵守 Apache 2.0 许可，Apache 2.0 许可与本许可冲突之处，以本许可为准。
+#         详细的授权流程，请联系 public@ricequant.com 获取。
+
+from __future__ import division
+
+from collections import namedtuple
+
+import numpy as np
+
+from .utils import safe_div_array
+
+# beta 为斜率，自变量方差为 0 时为 nan；alpha_t_value / alpha_p_value 为截距项的 t 值与双侧 p 值
+Regression = namedtuple("Regression", ["alpha", "beta", "alpha_t_value", "alpha_p_value"])
+
+
+def regression_from_moments(n, mean_x, mean_y, sxx, sxy, syy):
+    """
+    由样本矩计算一元线性回归 y = alpha + beta * x，结果与 statsmodels 的 OLS 一致
+    :param n: 样本数
+    :param sxx: x 的离差平方和
+    :param sxy: x 与 y 的离差乘积和
+    :param syy: y 的离差平方和
+    各参数可以是同 shape 的数组，逐元素计算
+    """
+    from scipy.special import stdtr
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # x 为常数时设计矩阵秩为 1，statsmodels 以伪逆求解：斜率为 0，残差自由度为 n - 1
+        degenerate = sxx == 0
+        slope = np.where(degenerate, 0., sxy / sxx)
+        intercept = mean_y - slope * mean_x
+        df = np.where(degenerate, n - 1, n - 2)
+        scale = np.maximum(syy - slope * sxy, 0.) / df
+        leverage = np.where(degenerate, 0., np.square(mean_x) / sxx)
+        t_value = intercept / np.sqrt(scale * (1 / n + leverage))
+        p_value = 2 * stdtr(df, -np.abs(t_value))
+    return Regression(intercept[()], safe_div_array(sxy, sxx), t_value[()], p_value[()])
+
+
+def moments_on_valid(y, x):
+    """
+    沿最后一维只在 x、y 均不为 nan 的期上求回归用到的矩，x 可以与 y 广播
+    返回 (期数, x 的均值, y 的均值, x 的离差平方和, x 与 y 的离差乘积和, y 的离差平方和)，与 regression_from_moments 的参数一致
+    """
+    y = np.asarray(y, dtype=float)
+    x = np.asarray(x, dtype=float)
+    valid = ~(np.isnan(x) | np.isnan(y))
+    n = np.count_nonzero(valid, axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_x = np.where(valid, x, 0.).sum(axis=-1) / n
+        mean_y = np.where(valid, y, 0.).sum(axis=-1) / n
+    x_centered = np.where(valid, x - mean_x[..., np.newaxis], 0.)
+    y_centered = np.where(valid, y - mean_y[..., np.newaxis], 0.)
+    return (
+        n, mean_x, mean_y,
+        np.square(x_centered).sum(axis=-1),
+        (x_centered * y_centered).sum(axis=-1),
+        np.square(y_centered).sum(axis=-1),
+    )
+
+
+def simple_regression(y, x):
+    """
+    沿最后一维对每一行做一元线性回归 y = alpha + beta * x，x 可以与 y 广播
+    与 statsmodels 的 ols 一致，x 或 y 为 nan 的期不参与回归
+    """
+    return regression_from_moments(*moments_on_valid(y, x))
+
+
+def regression_on_valid(regression, y, x):
+    """
+    截距项的 t 值与 p 值与 statsmodels 的 ols 一致：含 nan 的行只在 x、y 均有效的期上重新回归，其余行沿用 regression
+    :param regression: 对全部期的回归结果，如 regression_from_moments 的返回值
+    """
+    missing = np.isnan(y).any(axis=-1) | np.isnan(x).any(axis=-1)
+    if not np.any(missing):
+        return regression
+    valid = simple_regression(y, x)
+    return Regression(*(np.where(missing, v, r)[()] for v, r in zip(valid, regression)))
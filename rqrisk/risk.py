@@ -17,17 +17,56 @@
 
 from __future__ import division
 
-import warnings
-
 import numpy as np
-from statsmodels.formula.api import ols
 
-from .utils import indicator_property, IndicatorProperty, annual_factor, safe_div, DAILY, deprecate_property
+from .alignment import DROP, from_dated
+from .drawdown import DrawdownEpisodes, drawdown_episodes
+from .inputs import PROPAGATE, OMIT, NAN_POLICIES, as_array, index_of, omit_missing
+from .moments import calc_moments
+from .periods import split_periods, calc_sub_period_indicators
+from .regression import regression_from_moments, regression_on_valid
+from .var import PARAMETRIC, var_from_log_returns, cvar_from_log_returns
+from .utils import (
+    indicator_property, lazy_property, annual_factor, safe_div, DAILY, deprecate_property, calc_cum_nav, calc_drawdown,
+    indicator_names, dependency_graph, evaluation_plan
+)
+
+
+# 只用到组合收益率的指标，基准缺失时仍可计算
+PORTFOLIO_INDICATORS = (
+    "return_rate", "annual_return", "volatility", "annual_volatility", "max_drawdown", "sharpe", "downside_risk",
+    "annual_downside_risk", "sortino", "calmar", "var", "win_rate", "ulcer_index", "ulcer_performance_index",
+)
 
 
 class Risk(object):
-    def __init__(self, daily_returns, benchmark_daily_returns, risk_free_rate, period=DAILY, trading_days_a_year=None):
+    """
+    单个组合相对基准的风险指标
+    :param nan_policy: 收益率中 nan 的处理方式
+        "propagate"（默认）：不做处理，nan 随计算传播；
+        "omit"：在构造时一次求出组合与基准均有效的期，之后所有指标只在这些期上计算，period_count 为有效期数，
+            missing_count 为剔除的期数。基于净值的指标（收益率、回撤等）相当于缺失的期净值不变，
+            年化按有效期数折算；基准全部缺失时只按组合剔除，依赖基准的指标为 nan。没有缺失时不复制数据
+    """
+
+    def __init__(self, daily_returns, benchmark_daily_returns, risk_free_rate, period=DAILY, trading_days_a_year=None,
+                 nan_policy=PROPAGATE):
         assert (len(daily_returns) == len(benchmark_daily_returns))
+        # pandas 输入的 index，只作为标注，计算均按位置进行
+        self.index = index_of(daily_returns)
+        daily_returns, benchmark_daily_returns = as_array(daily_returns), as_array(benchmark_daily_returns)
+        self.missing_count = 0
+        # nan_policy="omit" 且有缺失时为有效期的掩码，用于把按原始的期给出的标签与位置对应到剔除后的期
+        self._valid = None
+        if nan_policy == OMIT:
+            daily_returns, benchmark_daily_returns, valid = omit_missing(daily_returns, benchmark_daily_returns)
+            self._valid = valid
+            if valid is not None:
+                self.missing_count = len(valid) - len(daily_returns)
+                if self.index is not None:
+                    self.index = self.index[valid]
+        elif nan_policy != PROPAGATE:
+            raise ValueError("nan_policy cannot be {}, possible values: {}".format(nan_policy, ", ".join(NAN_POLICIES)))
         self.period_count = len(daily_returns)
 
         self._portfolio = daily_returns
@@ -39,153 +78,264 @@ class Risk(object):
             self._annual_factor = annual_factor(period)
         self._risk_free_rate = risk_free_rate
         self._risk_free_rate_per_period = (1 + risk_free_rate) ** (1 / self._annual_factor) - 1
-        self._avg_excess_return = np.mean(daily_returns) - self._risk_free_rate_per_period
+        portfolio_mean = daily_returns.mean() if self.period_count else np.nan
+        self._avg_excess_return = portfolio_mean - self._risk_free_rate_per_period
         self._active_returns = daily_returns - benchmark_daily_returns
 
-    @indicator_property()
+    # 以下为各指标共用的中间结果，均在首次使用时计算一次
+
+    @lazy_property()
+    def _moments(self):
+        # 均值、离差平方和、交叉乘积和、下行离差平方和与胜率计数一次求出，见 rqrisk.moments.calc_moments
+        return calc_moments(self._portfolio, self._benchmark)
+
+    @lazy_property(dependencies=("_moments",))
+    def _portfolio_mean(self):
+        return self._moments.portfolio_mean
+
+    @lazy_property(dependencies=("_moments",))
+    def _benchmark_mean(self):
+        return self._moments.benchmark_mean
+
+    @lazy_property(dependencies=("_moments",))
+    def _portfolio_centered(self):
+        return self._moments.portfolio_centered
+
+    @lazy_property(dependencies=("_moments",))
+    def _benchmark_centered(self):
+        return self._moments.benchmark_centered
+
+    @lazy_property(dependencies=("_moments",))
+    def _portfolio_ss(self):
+        # 组合离差平方和
+        return self._moments.portfolio_ss
+
+    @lazy_property(dependencies=("_moments",))
+    def _benchmark_ss(self):
+        return self._moments.benchmark_ss
+
+    @lazy_property(dependencies=("_moments",))
+    def _cross_ss(self):
+        # 组合与基准的离差乘积和
+        return self._moments.cross_ss
+
+    @lazy_property(dependencies=("_moments",))
+    def _active_ss(self):
+        # 超额收益率（组合 - 基准）的离差平方和
+        return self._moments.active_ss
+
+    @lazy_property()
+    def _log_portfolio(self):
+        return np.log1p(self._portfolio)
+
+    @lazy_property()
+    def _log_benchmark(self):
+        return np.log1p(self._benchmark)
+
+    @lazy_property()
+    def _log_active(self):
+        return np.log1p(self._active_returns)
+
+    @lazy_property(dependencies=("_log_portfolio",))
+    def _portfolio_nav(self):
+        return calc_cum_nav(self._log_portfolio)
+
+    @lazy_property(dependencies=("_log_benchmark",))
+    def _benchmark_nav(self):
+        return calc_cum_nav(self._log_benchmark)
+
+    @lazy_property(dependencies=("_log_active",))
+    def _active_nav(self):
+        return calc_cum_nav(self._log_active)
+
+    @lazy_property(dependencies=("_portfolio_nav",))
+    def _portfolio_peak(self):
+        return np.maximum.accumulate(self._portfolio_nav)
+
+    @lazy_property(dependencies=("_active_nav",))
+    def _active_peak(self):
+        return np.maximum.accumulate(self._active_nav)
+
+    @lazy_property(dependencies=("_portfolio_nav", "_portfolio_peak"))
+    def _portfolio_drawdown(self):
+        return calc_drawdown(self._portfolio_nav, self._portfolio_peak)
+
+    @lazy_property(dependencies=("_active_nav", "_active_peak"))
+    def _active_drawdown(self):
+        return calc_drawdown(self._active_nav, self._active_peak)
+
+    @lazy_property(dependencies=("_portfolio_nav", "_benchmark_nav"))
+    def _excess_nav(self):
+        # 组合净值与基准净值之比
+        return self._portfolio_nav / self._benchmark_nav
+
+    @lazy_property(dependencies=("_excess_nav",))
+    def _excess_drawdown(self):
+        return calc_drawdown(self._excess_nav)
+
+    @indicator_property(dependencies=("_log_portfolio",))
     def return_rate(self):
-        return np.expm1(np.log1p(self._portfolio).sum())
+        return np.expm1(self._log_portfolio.sum())
 
-    @indicator_property(min_period_count=1)
+    @indicator_property(min_period_count=1, dependencies=("return_rate",))
     def annual_return(self):
         return (1 + self.return_rate) ** (self._annual_factor / self.period_count) - 1
 
-    @indicator_property()
+    @indicator_property(dependencies=("_log_benchmark",))
     def benchmark_return(self):
-        return np.expm1(np.log1p(self._benchmark).sum())
+        return np.expm1(self._log_benchmark.sum())
 
-    @indicator_property(min_period_count=1)
+    @indicator_property(min_period_count=1, dependencies=("benchmark_return",))
     def benchmark_annual_return(self):
         return (1 + self.benchmark_return) ** (self._annual_factor / self.period_count) - 1
 
-    @indicator_property()
+    @indicator_property(dependencies=("return_rate", "benchmark_return"))
     def arithmetic_excess_return(self):
         return self.return_rate - self.benchmark_return
 
-    @indicator_property()
+    @indicator_property(dependencies=("return_rate", "benchmark_return"))
     def geometric_excess_return(self):
         return (1 + self.return_rate) / (1 + self.benchmark_return) - 1
 
-    @indicator_property()
+    @indicator_property(dependencies=("annual_return", "benchmark_annual_return"))
     def geometric_excess_annual_return(self):
         return (1 + self.annual_return) / (1 + self.benchmark_annual_return) - 1
 
-    @indicator_property(min_period_count=2)
+    @indicator_property(min_period_count=2, dependencies=("annual_return", "beta", "benchmark_annual_return"))
     def alpha(self):
         # annualized Jensen's alpha：https://en.wikipedia.org/wiki/Jensen%27s_alpha
         return self.annual_return - self._risk_free_rate - self.beta * (
             self.benchmark_annual_return - self._risk_free_rate
         )
 
-    @indicator_property(min_period_count=2)
+    @lazy_property(dependencies=("_benchmark_mean", "_portfolio_mean", "_benchmark_ss", "_cross_ss", "_portfolio_ss"))
+    def _regression(self):
+        # 组合对基准的一元线性回归，beta、alpha_t_value、alpha_p_value 共用
+        return regression_from_moments(
+            self.period_count, self._benchmark_mean, self._portfolio_mean,
+            self._benchmark_ss, self._cross_ss, self._portfolio_ss
+        )
+
+    @lazy_property()
+    def _benchmark_nonzero(self):
+        # 基准没有为 0 的期时不给出 alpha 的 t 值与 p 值
+        return bool(np.all(self._benchmark != 0))
+
+    @lazy_property(dependencies=("_regression",))
+    def _alpha_regression(self):
+        # 收益率含 nan 时只在组合与基准均有效的期上回归，见 regression_on_valid
+        return regression_on_valid(self._regression, self._portfolio, self._benchmark)
+
+    @indicator_property(min_period_count=2, dependencies=("_benchmark_nonzero", "_alpha_regression"))
     def alpha_t_value(self):
-        if all(self._benchmark):
+        if self._benchmark_nonzero:
             return np.nan
-        result = ols("p ~ b", data={"p": self._portfolio, "b": self._benchmark}).fit()
-        return result.tvalues["Intercept"]
+        return self._alpha_regression.alpha_t_value
 
-    @indicator_property(min_period_count=2)
+    @indicator_property(min_period_count=2, dependencies=("_benchmark_nonzero", "_alpha_regression"))
     def alpha_p_value(self):
-        if all(self._benchmark):
+        if self._benchmark_nonzero:
             return np.nan
-        result = ols("p ~ b", data={"p": self._portfolio, "b": self._benchmark}).fit()
-        return result.pvalues["Intercept"]
+        return self._alpha_regression.alpha_p_value
 
-    @indicator_property(min_period_count=2)
+    @indicator_property(min_period_count=2, dependencies=("_regression",))
     def beta(self):
-        cov = np.cov(np.vstack([self._portfolio, self._benchmark]), ddof=1)
-        return safe_div(cov[0][1], cov[1][1])
+        return self._regression.beta
 
-    @indicator_property(min_period_count=2, value_when_pc_not_satisfied=0.)
+    @indicator_property(min_period_count=2, value_when_pc_not_satisfied=0., dependencies=("_portfolio_ss",))
     def volatility(self):
-        return self._portfolio.std(ddof=1)
+        return np.sqrt(self._portfolio_ss / (self.period_count - 1))
 
-    @indicator_property()
+    @indicator_property(dependencies=("volatility",))
     def annual_volatility(self):
         return self.volatility * (self._annual_factor ** 0.5)
 
-    @indicator_property(min_period_count=2, value_when_pc_not_satisfied=0.)
+    @indicator_property(min_period_count=2, value_when_pc_not_satisfied=0., dependencies=("_benchmark_ss",))
     def benchmark_volatility(self):
-        return self._benchmark.std(ddof=1)
+        return np.sqrt(self._benchmark_ss / (self.period_count - 1))
 
-    @indicator_property()
+    @indicator_property(dependencies=("benchmark_volatility",))
     def benchmark_annual_volatility(self):
         return self.benchmark_volatility * (self._annual_factor ** 0.5)
 
     @staticmethod
     def _calc_cum(returns):
         """ 计算累计净值 """
-        returns = [0] + list(returns)
-        df_cum = np.exp(np.log1p(returns).cumsum())
-        return df_cum
+        return calc_cum_nav(np.log1p(as_array(returns)))
 
     @classmethod
     def _calc_max_drawdown(cls, cum_nav):
-        max_nav = np.maximum.accumulate(cum_nav)
-        return abs(((cum_nav - max_nav) / max_nav).min())
+        return abs(calc_drawdown(cum_nav).min())
 
-    @indicator_property()
+    @indicator_property(dependencies=("_portfolio_drawdown",))
     def max_drawdown(self):
-        cum_returns = self._calc_cum(self._portfolio)
-        return self._calc_max_drawdown(cum_returns)
+        return abs(self._portfolio_drawdown.min())
+
+    @lazy_property()
+    def _benchmark_missing(self):
+        # 基准全部缺失
+        return bool(np.all(np.isnan(self._benchmark)))
 
-    @indicator_property(min_period_count=2, value_when_pc_not_satisfied=0.)
+    @indicator_property(
+        min_period_count=2, value_when_pc_not_satisfied=0., dependencies=("excess_volatility", "_benchmark_missing")
+    )
     def tracking_error(self):
-        if np.all(np.isnan(self._benchmark)):
+        if self._benchmark_missing:
             return np.nan
-        return self._active_returns.std(ddof=1)
+        return self.excess_volatility
 
-    @indicator_property()
+    @indicator_property(dependencies=("tracking_error", "_benchmark_missing"))
     def annual_tracking_error(self):
-        if np.all(np.isnan(self._benchmark)):
+        if self._benchmark_missing:
             return np.nan
         return self.tracking_error * (self._annual_factor ** 0.5)
 
-    @indicator_property(min_period_count=2)
+    @indicator_property(
+        min_period_count=2,
+        dependencies=("beta", "annual_return", "benchmark_annual_return", "_portfolio_centered", "_benchmark_centered")
+    )
     def information_ratio(self):
         # residual_return / residual_risk
-        residual_returns = self._portfolio - self.beta * self._benchmark
-        annual_residual_std = residual_returns.std(ddof=1) * np.sqrt(self._annual_factor)
+        residual_returns = self._portfolio_centered - self.beta * self._benchmark_centered
+        annual_residual_std = np.sqrt(
+            np.dot(residual_returns, residual_returns) / (self.period_count - 1) * self._annual_factor
+        )
         if not annual_residual_std:
             return np.nan
         return (self.annual_return - self.beta * self.benchmark_annual_return) / annual_residual_std
 
-    @indicator_property(min_period_count=2)
+    @indicator_property(min_period_count=2, dependencies=("volatility",))
     def sharpe(self):
-        std_excess_return = np.sqrt((1 / (len(self._portfolio) - 1)) * np.sum(
-            (self._portfolio - self._risk_free_rate_per_period - self._avg_excess_return) ** 2
-        ))
-        return safe_div(np.sqrt(self._annual_factor) * self._avg_excess_return, std_excess_return)
+        return safe_div(np.sqrt(self._annual_factor) * self._avg_excess_return, self.volatility)
 
-    @indicator_property()
+    @indicator_property(dependencies=("tracking_error", "_portfolio_mean", "_benchmark_mean"))
     def excess_sharpe(self):
         # sharpe ratio of active returns
-        return safe_div(np.sqrt(self._annual_factor) * np.mean(self._active_returns), self.tracking_error)
+        active_mean = self._portfolio_mean - self._benchmark_mean
+        return safe_div(np.sqrt(self._annual_factor) * active_mean, self.tracking_error)
 
-    @indicator_property(min_period_count=2, value_when_pc_not_satisfied=0.)
+    @indicator_property(min_period_count=2, value_when_pc_not_satisfied=0., dependencies=("_moments",))
     def downside_risk(self):
-        diff = self._portfolio - self._portfolio.mean()
-        diff[diff > 0] = 0.
-        return (np.sum(np.square(diff)) / (len(diff) - 1)) ** 0.5
+        return (self._moments.downside_ss / (self.period_count - 1)) ** 0.5
 
-    @indicator_property()
+    @indicator_property(dependencies=("downside_risk",))
     def annual_downside_risk(self):
         return self.downside_risk * (self._annual_factor ** 0.5)
 
-    @indicator_property()
+    @indicator_property(dependencies=("annual_downside_risk",))
     def sortino(self):
         return safe_div(self._annual_factor * self._avg_excess_return, self.annual_downside_risk)
 
-    @indicator_property()
+    @indicator_property(dependencies=("max_drawdown", "annual_return"))
     def calmar(self):
         if np.isclose(self.max_drawdown, 0):
             return np.inf * np.sign(self.annual_return)
         else:
             return self.annual_return / self.max_drawdown
 
-    @indicator_property(min_period_count=1)
+    @indicator_property(min_period_count=1, dependencies=("_log_active",))
     def _excess_return_rate(self):
-        return np.expm1(np.log1p(self._active_returns).sum())
+        return np.expm1(self._log_active.sum())
 
     @deprecate_property
     def excess_return_rate(self):
@@ -196,85 +346,183 @@ class Risk(object):
     def excess_annual_return(self):
         return self._excess_annual_return
 
-    @indicator_property(min_period_count=1)
+    @indicator_property(min_period_count=1, dependencies=("_excess_return_rate",))
     def _excess_annual_return(self):
         # active annual return
         return (1 + self._excess_return_rate) ** safe_div(self._annual_factor, self.period_count) - 1
 
-    @indicator_property(min_period_count=2, value_when_pc_not_satisfied=0.)
+    @indicator_property(min_period_count=2, value_when_pc_not_satisfied=0., dependencies=("_active_ss",))
     def excess_volatility(self):
         # volatility of active returns
-        return self._active_returns.std(ddof=1)
+        return np.sqrt(self._active_ss / (self.period_count - 1))
 
-    @indicator_property()
+    @indicator_property(dependencies=("excess_volatility",))
     def excess_annual_volatility(self):
         return self.excess_volatility * (self._annual_factor ** 0.5)
 
-    @indicator_property(min_period_count=1)
+    @indicator_property(min_period_count=1, dependencies=("_excess_drawdown",))
     def geometric_excess_drawdown(self):
-        excess = self._calc_cum(self._portfolio) / self._calc_cum(self._benchmark)
-        return self._calc_max_drawdown(excess)
+        return abs(self._excess_drawdown.min())
 
-    @indicator_property(min_period_count=1)
+    @indicator_property(min_period_count=1, dependencies=("_active_drawdown",))
     def excess_max_drawdown(self):
-        cum_returns = self._calc_cum(self._active_returns)
-        return self._calc_max_drawdown(cum_returns)
+        return abs(self._active_drawdown.min())
+
+    def drawdown_episodes(self, top=None):
+        """
+        组合净值的每次回撤（rqrisk.drawdown.DrawdownEpisodes），按发生的先后排列
+        :param top: 只给出幅度最大的 top 次回撤，按幅度从大到小排列
+        nan_policy="omit" 时各位置与期数按原始的期给出，缺失的期净值不变
+        """
+        return self._drawdown_episodes(self._portfolio_drawdown, top)
+
+    def excess_drawdown_episodes(self, top=None):
+        """ 超额收益率（组合 - 基准）净值的每次回撤，与 excess_max_drawdown 对应 """
+        return self._drawdown_episodes(self._active_drawdown, top)
+
+    def geometric_excess_drawdown_episodes(self, top=None):
+        """ 组合净值与基准净值之比的每次回撤，与 geometric_excess_drawdown 对应 """
+        return self._drawdown_episodes(self._excess_drawdown, top)
+
+    def _drawdown_episodes(self, drawdown, top):
+        episodes = drawdown_episodes(drawdown)
+        if self._valid is not None:
+            # 剔除后净值序列的下标 i（i > 0）对应原始的第 i 个有效期之后的净值；缺失的期净值不变，
+            # 回撤前最高点取开始回撤的前一期，与把缺失的期的收益率记为 0 一致
+            positions = np.concatenate(([0], np.flatnonzero(self._valid) + 1))
+            start, trough = positions[episodes.start + 1] - 1, positions[episodes.trough]
+            recovery = np.where(episodes.recovered, positions[episodes.recovery], -1)
+            duration = np.where(episodes.recovered, recovery, len(self._valid)) - start
+            episodes = DrawdownEpisodes(start, trough, recovery, episodes.depth, duration)
+        return episodes if top is None else episodes.top(top)
+
+    def sub_periods(self, labels=None, boundaries=None):
+        """
+        按标签或分段起始下标分段，一次计算每段的收益、波动率、最大回撤、夏普比率、胜率等，与对每段单独构造 Risk 一致
+        :param labels: 每期的标签，如 rqrisk.periods.calendar_labels(dates, "M")，相同标签的期必须相邻
+        :param boundaries: 每段的起始下标，与 labels 二选一
+        :return: (每段的标签或起始下标, 指标名称到数组的字典)，见 rqrisk.periods.sub_period_indicators
+        nan_policy="omit" 时 labels 可以按原始的期给出（剔除缺失的期后使用），也可以按剔除后的期给出；
+        boundaries 为剔除后的期的下标
+        """
+        if labels is not None and self._valid is not None and len(labels) == len(self._valid):
+            labels = np.asarray(labels)[self._valid]
+        starts, keys = split_periods(labels, boundaries, self.period_count)
+        return keys, calc_sub_period_indicators(
+            self._portfolio, self._benchmark, starts,
+            self._annual_factor, self._risk_free_rate_per_period
+        )
 
-    @indicator_property()
+    @indicator_property(dependencies=("_log_portfolio",))
     def var(self):
         """ default: 95% VaR """
         return self.param_var(0.05)
 
     def param_var(self, alpha):
         # 假设价格服从对数正态分布，则收益率亦应服从对数正态分布：https://stats.stackexchange.com/questions/378047/log-normal-returns
-        import scipy.stats as stats
-        log_return = np.log1p(self._portfolio)
-        mean = np.mean(log_return)
-        std = np.std(log_return)
-        with warnings.catch_warnings():
-            warnings.filterwarnings("ignore", "invalid value encountered in multiply")
-            return np.expm1(-stats.norm(mean, std).ppf(alpha))
-
-    @indicator_property(min_period_count=1)
+        return self.value_at_risk(alpha, PARAMETRIC)
+
+    def value_at_risk(self, alpha=0.05, method=PARAMETRIC):
+        """
+        :param alpha: 尾部概率，可以是数组，一次给出所有水平的 VaR
+        :param method: "parametric"、"historical" 或 "cornish_fisher"，见 rqrisk.var.value_at_risk
+        """
+        return var_from_log_returns(self._log_portfolio, alpha, method)
+
+    def cvar(self, alpha=0.05, method=PARAMETRIC):
+        """ 超过 VaR 的尾部的平均损失，参数同 value_at_risk """
+        return cvar_from_log_returns(self._log_portfolio, alpha, method)
+
+    @indicator_property(min_period_count=1, dependencies=("_moments",))
     def win_rate(self):
-        return len(self._portfolio[self._portfolio > 0]) / self.period_count
+        return self._moments.win_count / self.period_count
 
-    @indicator_property(min_period_count=1)
+    @indicator_property(min_period_count=1, dependencies=("_benchmark_missing", "_moments"))
     def excess_win_rate(self):
-        return len(self._portfolio[self._portfolio > self._benchmark]) / self.period_count
+        if self._benchmark_missing:
+            return np.nan
+        return self._moments.excess_win_count / self.period_count
 
-    @indicator_property(min_period_count=2)
+    @indicator_property(min_period_count=2, dependencies=("_cross_ss", "_portfolio_ss", "_benchmark_ss"))
     def correlation(self):
         # 相关系数算法参考 https://numpy.org/doc/stable/reference/generated/numpy.corrcoef.html?highlight=corr#numpy.corrcoef
-        return np.corrcoef(self._portfolio, self._benchmark)[0][1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            correlation = self._cross_ss / np.sqrt(self._portfolio_ss) / np.sqrt(self._benchmark_ss)
+        return np.clip(correlation, -1, 1)
 
-    @classmethod
-    def _calc_ulcer_index(cls, returns):
-        """ 累计回撤深度  相关计算公式参考：http://www.tangotools.com/ui/ui.htm """
-        cum = cls._calc_cum(returns)
-        drawdown_squared = ((cum / np.maximum.accumulate(cum) - 1) * 100) ** 2
-        return (np.sum(drawdown_squared) / len(cum)) ** 0.5
-
-    @indicator_property()
+    @staticmethod
+    def _calc_ulcer_index(drawdown):
+        """
+        累计回撤深度  相关计算公式参考：http://www.tangotools.com/ui/ui.htm
+        :param drawdown: 含初始净值在内的回撤序列（净值 / 历史最高净值 - 1），如 _portfolio_drawdown
+        """
+        return (np.dot(drawdown, drawdown) * 10000 / len(drawdown)) ** 0.5
+
+    @indicator_property(dependencies=("_portfolio_drawdown",))
     def ulcer_index(self):
-        return self._calc_ulcer_index(self._portfolio)
+        return self._calc_ulcer_index(self._portfolio_drawdown)
 
-    @indicator_property()
+    @indicator_property(dependencies=("_active_drawdown",))
     def excess_ulcer_index(self):
-        return self._calc_ulcer_index(self._active_returns)
+        return self._calc_ulcer_index(self._active_drawdown)
 
     def _calc_ulcer_performance_index(self, returns, ulcer_index):
         """ 累计回撤夏普率 相关计算公式参考：http://www.tangotools.com/ui/ui.htm """
         _return_rate = np.expm1(np.log1p(returns - self._risk_free_rate_per_period).sum())
         return safe_div(_return_rate, ulcer_index)
 
-    @indicator_property()
+    @indicator_property(dependencies=("ulcer_index",))
     def ulcer_performance_index(self):
         return self._calc_ulcer_performance_index(self._portfolio, self.ulcer_index)
 
-    @indicator_property()
+    @indicator_property(dependencies=("excess_ulcer_index",))
     def excess_ulcer_performance_index(self):
         return self._calc_ulcer_performance_index(self._active_returns, self.excess_ulcer_index)
 
-    def all(self):
-        return {k: getattr(self, k) for k, v in self.__class__.__dict__.items() if isinstance(v, IndicatorProperty)}
+    def all(self, names=None):
+        """
+        计算指标，返回指标名称到指标值的字典
+        :param names: 需要计算的指标名称，None 表示全部指标；只计算这些指标及其依赖
+        """
+        if names is None:
+            names = indicator_names(self.__class__)
+        else:
+            evaluation_plan(self.__class__, names)
+        return {k: getattr(self, k) for k in names}
+
+    def period_counts(self, names=None):
+        """
+        各指标实际参与计算的期数，nan_policy="omit" 时为剔除缺失后的期数；基准全部缺失时依赖基准的指标为 0
+        :param names: 指标名称，None 表示全部指标
+        """
+        if names is None:
+            names = indicator_names(self.__class__)
+        else:
+            evaluation_plan(self.__class__, names)
+        without_benchmark = 0 if self._benchmark_missing else self.period_count
+        return {k: self.period_count if k in PORTFOLIO_INDICATORS else without_benchmark for k in names}
+
+    @classmethod
+    def from_dated(cls, dates, daily_returns, benchmark_dates, benchmark_daily_returns, risk_free_rate, fill=DROP,
+                   period=None, trading_days_a_year=None, nan_policy=PROPAGATE):
+        """
+        由日期不一致的组合与基准收益率构造，按日期对齐后计算，index 为对齐后的日期
+        :param fill: 日期不一致时的处理方式，"drop"、"zero" 或 "compound"，见 alignment.align_returns
+        :param period: None 时由对齐后的日期推断 period 与 trading_days_a_year
+        :param nan_policy: 同构造函数，"omit" 时 index 为剔除缺失后的日期
+        """
+        instance = from_dated(cls, dates, daily_returns, benchmark_dates, benchmark_daily_returns, risk_free_rate,
+                              fill, period, trading_days_a_year, nan_policy=nan_policy)
+        if instance._valid is not None:
+            instance.index = instance.index[instance._valid]
+        return instance
+
+    @classmethod
+    def dependency_graph(cls):
+        """ 各指标与中间结果直接依赖的名称，可据此估计 all(names) 需要计算的内容 """
+        return dependency_graph(cls)
+
+    @classmethod
+    def evaluation_plan(cls, names):
+        """ 计算 names 中的指标时依次计算的全部指标与中间结果，依赖在前 """
+        return evaluation_plan(cls, names)
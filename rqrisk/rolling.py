@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+# 版权所有 2021 深圳米筐科技有限公司（下称“米筐科技”）
+#
+# 除非遵守当前许可，否则不得使用本软件。
+#
+#     * 非商业用途（非商业用途指个人出于非商业目的使用本软件，或者高校、研究所等非营利机构出于教育、科研等目的使用本软件）：
+#         遵守 Apache License 2.0（下称“Apache 2.0 许可”），
+#         您可以在以下位置获得 Apache 2.0 许可的副本：http://www.apache.org/licenses/LICENSE-2.0。
+#         除非法律有要求或以书面形式达成协议，否则本软件分发时需保持当前许可“原样”不变，且不得附加任何条件。
+#
+#     * 商业用途（商业用途指个人出于任何商业目的使用本软件，或者法人或其他组织出于任何目的使用本软件）：
+#         未经米筐科技授权，任何个人不得出于任何商业目的使用本软件（包括但不限于向第三方提供、销售、出租、出借、转让本软件、
+#         本软件的衍生产品、引用或借鉴了本软件功能或源代码的产品或服务），任何法人或其他组织不得出于任何目的使用本软件，
+#         否则米筐科技有权追究相应的知识产权侵权责任。
+#         在此前提下，对本软件的使用同样需要遵守 Apache 2.0 许可，Apache 2.0 许可与本许可冲突之处，以本许可为准。
+#         详细的授权流程，请联系 public@ricequant.com 获取。
+
+from __future__ import division
+
+import numpy as np
+
+from .utils import indicator_property, IndicatorProperty, lazy_property, annual_factor, safe_div_array, DAILY
+
+# 下行离差平方和按 sum(x²) - 2m·sum(x) + n·m² 展开，三项各自带有 eps 量级的相对舍入误差（块内累加、几次乘加），
+# 结果不超过 sum(x²) + n·m²（|2m·sum(x)| 也不超过它）的这一倍数时无法与 0 区分，如窗口内数据全部相同
+_DOWNSIDE_SS_TOLERANCE = 16 * np.finfo(float).eps
+
+
+def _sliding_max_drawdown(log_nav, size):
+    """
+    对数净值上长度为 size 的滑动窗口内的最大回撤（对数形式），返回长度为 len(log_nav) - size + 1 的数组
+    采用 van Herk / Gil-Werman 分块算法：每个窗口至多跨越两个块，由前一块的后缀聚合与后一块的前缀聚合合并得到，
+    聚合量为 (最大值, 最小值, 最大回撤)，总开销为 O(T)
+    """
+    n = len(log_nav)
+    blocks = -(-n // size)
+    padded = np.empty(blocks * size)
+    padded[:n] = log_nav
+    padded[n:] = log_nav[-1]
+    padded = padded.reshape(blocks, size)
+
+    prefix_max = np.maximum.accumulate(padded, axis=1)
+    prefix_min = np.minimum.accumulate(padded, axis=1)
+    prefix_mdd = np.maximum.accumulate(prefix_max - padded, axis=1)
+    reverse = padded[:, ::-1]
+    suffix_max = np.maximum.accumulate(reverse, axis=1)[:, ::-1]
+    suffix_min = np.minimum.accumulate(reverse, axis=1)[:, ::-1]
+    suffix_mdd = np.maximum.accumulate(reverse - suffix_min[:, ::-1], axis=1)[:, ::-1]
+
+    start = np.arange(n - size + 1)
+    end = start + size - 1
+    prefix_max, prefix_min, prefix_mdd, suffix_max, suffix_min, suffix_mdd = (
+        a.ravel() for a in (prefix_max, prefix_min, prefix_mdd, suffix_max, suffix_min, suffix_mdd)
+    )
+    spanning = np.maximum(np.maximum(suffix_mdd[start], prefix_mdd[end]), suffix_max[start] - prefix_min[end])
+    # 窗口恰好对齐一个块时只取该块的聚合
+    return np.where(start % size == 0, suffix_mdd[start], spanning)
+
+
+def _window_downside_ss(values, starts, stops, means):
+    """
+    每个窗口的下行离差平方和：第 i 个为 sum(min(values[starts[i]:stops[i]] - means[i], 0) ** 2)
+    同线段树，每个窗口拆成每层至多两个对齐的长度为 2 ** level 的块。每层把数据按 (块, 取值排名) 排序，
+    由 searchsorted 得到块中小于均值的个数、和与平方和。上一层的顺序在新的一层中是两两有序的段，稳定排序只需合并，
+    每层的排序与查找开销为 O((T + 窗口数) log T)，共 log T 层，总开销为 O((T + 窗口数) log² T)，内存为 O(T + 窗口数)
+    """
+    n = len(values)
+    order = np.argsort(values, kind="stable")
+    ranks = np.empty(n, dtype=np.int64)
+    ranks[order] = np.arange(n)
+    # 小于窗口均值的数据即排名小于 bound 的数据
+    bounds = np.searchsorted(values[order], means, side="left")
+
+    count, total, squares = (np.zeros(len(means)) for _ in range(3))
+    positions = np.arange(n)
+    low, high = np.array(starts, dtype=np.int64), np.array(stops, dtype=np.int64)
+    level = 0
+    while (1 << level) <= n:
+        keys = (positions >> level) * n + ranks[positions]
+        resort = np.argsort(keys, kind="stable")
+        positions, keys = positions[resort], keys[resort]
+        # 每块内的累计和从 0 开始，误差只与块内数据的大小有关
+        size = 1 << level
+        blocks = -(-n // size)
+        padded = np.zeros((blocks, size))
+        padded.ravel()[:n] = values[positions]
+        cum = np.zeros((blocks, size + 1))
+        np.cumsum(padded, axis=1, out=cum[:, 1:])
+        cum_square = np.zeros((blocks, size + 1))
+        np.cumsum(padded * padded, axis=1, out=cum_square[:, 1:])
+
+        for taken, block in [(low & 1, low), (high & 1, high - 1)]:
+            selected = np.flatnonzero(taken & (low < high))
+            block = block[selected]
+            offset = np.searchsorted(keys, block * n + bounds[selected], side="left") - (block << level)
+            count[selected] += offset
+            total[selected] += cum[block, offset]
+            squares[selected] += cum_square[block, offset]
+        low = (low + 1) >> 1
+        high >>= 1
+        level += 1
+
+    scale = squares + count * means * means
+    result = scale - 2 * means * total
+    result[result <= _DOWNSIDE_SS_TOLERANCE * scale] = 0.
+    return result
+
+
+class RollingRisk(object):
+    """
+    滚动窗口或扩展窗口的风险指标序列，第 t 个值与 Risk(daily_returns[t - window + 1: t + 1], ...) 一致
+    :param window: 窗口长度，None 表示扩展窗口（第 t 个值对应前 t + 1 期）；滚动窗口前 window - 1 个值为 nan
+    输入需为不含 nan 的一维收益率序列
+    各指标由前缀和或分块聚合得到，开销为 O(T)；downside_risk、sortino 的窗口均值随窗口变化，开销为 O(T log² T)
+    """
+
+    def __init__(self, daily_returns, benchmark_daily_returns, risk_free_rate, window=None, period=DAILY,
+                 trading_days_a_year=None):
+        assert (len(daily_returns) == len(benchmark_daily_returns))
+        if window is not None and window < 1:
+            raise ValueError("window must be a positive integer, got {}".format(window))
+        self.period_count = len(daily_returns)
+        self._window = window
+
+        self._portfolio = np.asarray(daily_returns, dtype=float)
+        self._benchmark = np.asarray(benchmark_daily_returns, dtype=float)
+        if period == DAILY and trading_days_a_year is not None:
+            self._annual_factor = trading_days_a_year
+        else:
+            self._annual_factor = annual_factor(period)
+        self._risk_free_rate = risk_free_rate
+        self._risk_free_rate_per_period = (1 + risk_free_rate) ** (1 / self._annual_factor) - 1
+
+    def _window_sum(self, values):
+        """ 每个窗口内 values 之和，滚动窗口未满时为 nan """
+        cum = np.zeros(len(values) + 1)
+        np.cumsum(values, out=cum[1:])
+        if self._window is None:
+            return cum[1:]
+        sums = np.full(len(values), np.nan)
+        if self._window <= len(values):
+            sums[self._window - 1:] = cum[self._window:] - cum[:-self._window]
+        return sums
+
+    @staticmethod
+    def _where_count(counts, min_count, value, values):
+        return np.where(counts < min_count, value, values)
+
+    @lazy_property()
+    def _counts(self):
+        if self._window is None:
+            return np.arange(1, self.period_count + 1, dtype=float)
+        return np.full(self.period_count, float(self._window))
+
+    @lazy_property()
+    def _centered(self):
+        # 减去全局均值以减小累加平方和时的相消误差
+        portfolio = self._portfolio - self._portfolio.mean() if self.period_count else self._portfolio
+        benchmark = self._benchmark - self._benchmark.mean() if self.period_count else self._benchmark
+        return portfolio, benchmark
+
+    @lazy_property()
+    def _moments(self):
+        """ 每个窗口内的 (组合均值, 基准均值, 组合离差平方和, 基准离差平方和, 离差乘积和, 超额收益离差平方和) """
+        p, b = self._centered
+        n = self._counts
+        sum_p, sum_b = self._window_sum(p), self._window_sum(b)
+        ss_p = np.maximum(self._window_sum(p * p) - sum_p * sum_p / n, 0.)
+        ss_b = np.maximum(self._window_sum(b * b) - sum_b * sum_b / n, 0.)
+        cross = self._window_sum(p * b) - sum_p * sum_b / n
+        a = p - b
+        sum_a = self._window_sum(a)
+        ss_a = np.maximum(self._window_sum(a * a) - sum_a * sum_a / n, 0.)
+        mean_p = self._window_sum(self._portfolio) / n
+        mean_b = self._window_sum(self._benchmark) / n
+        return mean_p, mean_b, ss_p, ss_b, cross, ss_a
+
+    def _annualize_return(self, returns):
+        log_sum = self._window_sum(np.log1p(returns))
+        return np.expm1(log_sum * (self._annual_factor / self._counts))
+
+    @indicator_property()
+    def annual_return(self):
+        return self._annualize_return(self._portfolio)
+
+    @indicator_property()
+    def benchmark_annual_return(self):
+        return self._annualize_return(self._benchmark)
+
+    @indicator_property()
+    def volatility(self):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            volatility = np.sqrt(self._moments[2] / (self._counts - 1))
+        return self._where_count(self._counts, 2, 0., volatility)
+
+    @indicator_property()
+    def beta(self):
+        beta = safe_div_array(self._moments[4], self._moments[3])
+        return self._where_count(self._counts, 2, np.nan, beta)
+
+    @indicator_property()
+    def alpha(self):
+        alpha = self.annual_return - self._risk_free_rate - self.beta * (
+            self.benchmark_annual_return - self._risk_free_rate
+        )
+        return self._where_count(self._counts, 2, np.nan, alpha)
+
+    @indicator_property()
+    def tracking_error(self):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            tracking_error = np.sqrt(self._moments[5] / (self._counts - 1))
+        return self._where_count(self._counts, 2, 0., tracking_error)
+
+    @indicator_property()
+    def information_ratio(self):
+        _, _, ss_p, ss_b, cross, _ = self._moments
+        beta = self.beta
+        residual_ss = np.maximum(ss_p - 2 * beta * cross + beta * beta * ss_b, 0.)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            annual_residual_std = np.sqrt(residual_ss / (self._counts - 1) * self._annual_factor)
+        information_ratio = safe_div_array(
+            self.annual_return - beta * self.benchmark_annual_return, annual_residual_std
+        )
+        return self._where_count(self._counts, 2, np.nan, information_ratio)
+
+    @indicator_property()
+    def sharpe(self):
+        avg_excess_return = self._moments[0] - self._risk_free_rate_per_period
+        sharpe = safe_div_array(np.sqrt(self._annual_factor) * avg_excess_return, self.volatility)
+        return self._where_count(self._counts, 2, np.nan, sharpe)
+
+    @lazy_property()
+    def _downside_ss(self):
+        p, _ = self._centered
+        result = np.full(self.period_count, np.nan)
+        if self._window is not None and self._window > self.period_count:
+            return result
+        window = self._window or 1
+        stops = np.arange(window, self.period_count + 1)
+        starts = stops - self._window if self._window is not None else np.zeros_like(stops)
+        means = (self._window_sum(p) / self._counts)[window - 1:]
+        result[window - 1:] = _window_downside_ss(p, starts, stops, means)
+        return result
+
+    @indicator_property()
+    def downside_risk(self):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            downside_risk = np.sqrt(self._downside_ss / (self._counts - 1))
+        return self._where_count(self._counts, 2, 0., downside_risk)
+
+    @indicator_property()
+    def sortino(self):
+        avg_excess_return = self._moments[0] - self._risk_free_rate_per_period
+        return safe_div_array(
+            self._annual_factor * avg_excess_return, self.downside_risk * (self._annual_factor ** 0.5)
+        )
+
+    @indicator_property()
+    def max_drawdown(self):
+        log_nav = np.zeros(self.period_count + 1)
+        np.cumsum(np.log1p(self._portfolio), out=log_nav[1:])
+        if self._window is None:
+            drawdown = np.maximum.accumulate(np.maximum.accumulate(log_nav) - log_nav)[1:]
+        else:
+            drawdown = np.full(self.period_count, np.nan)
+            if self._window <= self.period_count:
+                # 长度为 window 的收益率窗口对应包含起始净值在内的 window + 1 个净值
+                drawdown[self._window - 1:] = _sliding_max_drawdown(log_nav, self._window + 1)
+        return np.abs(np.expm1(-drawdown))
+
+    @indicator_property()
+    def win_rate(self):
+        return self._window_sum((self._portfolio > 0).astype(float)) / self._counts
+
+    def all(self):
+        return {k: getattr(self, k) for k, v in self.__class__.__dict__.items() if isinstance(v, IndicatorProperty)}
@@ -0,0 +1,618 @@
+# -*- coding: utf-8 -*-
+# 版权所有 2021 深圳米筐科技有限公司（下称“米筐科技”）
+#
+# 除非遵守当前许可，否则不得使用本软件。
+#
+#     * 非商业用途（非商业用途指个人出于非商业目的使用本软件，或者高校、研究所等非营利机构出于教育、科研等目的使用本软件）：
+#         遵守 Apache License 2.0（下称“Apache 2.0 许可”），
+#         您可以在以下位置获得 Apache 2.0 许可的副本：http://www.apache.org/licenses/LICENSE-2.0。
+#         除非法律有要求或以书面形式达成协议，否则本软件分发时需保持当前许可“原样”不变，且不得附加任何条件。
+#
+#     * 商业用途（商业用途指个人出于任何商业目的使用本软件，或者法人或其他组织出于任何目的使用本软件）：
+#         未经米筐科技授权，任何个人不得出于任何商业目的使用本软件（包括但不限于向第三方提供、销售、出租、出借、转让本软件、
+#         本软件的衍生产品、引用或借鉴了本软件功能或源代码的产品或服务），任何法人或其他组织不得出于任何目的使用本软件，
+#         否则米筐科技有权追究相应的知识产权侵权责任。
+#         在此前提下，对本软件的使用同样需要遵守 Apache 2.0 许可，Apache 2.0 许可与本许可冲突之处，以本许可为准。
+#         详细的授权流程，请联系 public@ricequant.com 获取。
+
+from __future__ import division
+
+import numpy as np
+
+from .regression import regression_from_moments, moments_on_valid
+from .var import parametric_var_from_moments
+from .utils import (
+    indicator_property, IndicatorProperty, annual_factor, safe_div_array, DAILY, deprecate_property, clear_cached,
+    evaluation_plan
+)
+
+
+class _Moments(object):
+    """ 单个序列的均值与离差平方和，按 Welford 算法逐期更新，按 Chan 等人的公式合并 """
+
+    __slots__ = ("mean", "m2")
+
+    def __init__(self, mean=0., m2=0.):
+        self.mean = mean
+        self.m2 = m2
+
+    def update(self, n, x):
+        """ n 为加入 x 之后的期数，返回 x 与旧均值之差，用于更新协方差 """
+        delta = x - self.mean
+        self.mean = self.mean + delta / n
+        self.m2 = self.m2 + delta * (x - self.mean)
+        return delta
+
+    def combine(self, n, other_n, other):
+        """ 合并紧随其后的另一段，n 为本段期数，返回两段均值之差，用于更新协方差 """
+        total = n + other_n
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other_n / total)
+        self.m2 = self.m2 + other.m2 + np.square(delta) * (n * other_n / total)
+        return delta
+
+    @classmethod
+    def of(cls, values):
+        """ 由一段数据（最后一维为时间）直接计算 """
+        mean = values.mean(axis=-1)
+        return cls(mean, np.square(values - mean[..., np.newaxis]).sum(axis=-1))
+
+
+class _PairMoments(object):
+    """
+    组合与基准均不为 nan 的期上的期数、均值、离差平方和与离差乘积和，
+    用于与 statsmodels 的 ols 一致的截距项 t 值与 p 值，见 rqrisk.regression.regression_on_valid
+    """
+
+    __slots__ = ("count", "portfolio_mean", "benchmark_mean", "portfolio_m2", "benchmark_m2", "cross")
+
+    def __init__(self, count=0, portfolio_mean=0., benchmark_mean=0., portfolio_m2=0., benchmark_m2=0., cross=0.):
+        self.count = count
+        self.portfolio_mean = portfolio_mean
+        self.benchmark_mean = benchmark_mean
+        self.portfolio_m2 = portfolio_m2
+        self.benchmark_m2 = benchmark_m2
+        self.cross = cross
+
+    def update(self, p, b):
+        # 无效的期离差取 0，均值与各平方和不变
+        valid = ~(np.isnan(p) | np.isnan(b))
+        self.count = self.count + valid
+        n = np.maximum(self.count, 1)
+        delta_p = np.where(valid, p - self.portfolio_mean, 0.)
+        delta_b = np.where(valid, b - self.benchmark_mean, 0.)
+        self.portfolio_mean = self.portfolio_mean + delta_p / n
+        self.benchmark_mean = self.benchmark_mean + delta_b / n
+        self.portfolio_m2 = self.portfolio_m2 + delta_p * np.where(valid, p - self.portfolio_mean, 0.)
+        self.benchmark_m2 = self.benchmark_m2 + delta_b * np.where(valid, b - self.benchmark_mean, 0.)
+        self.cross = self.cross + delta_p * np.where(valid, b - self.benchmark_mean, 0.)
+
+    def combine(self, other):
+        """ 合并紧随其后的另一段，两段都可能没有有效的期 """
+        n, other_n = self.count, other.count
+        total = np.maximum(n + other_n, 1)
+        delta_p = other.portfolio_mean - self.portfolio_mean
+        delta_b = other.benchmark_mean - self.benchmark_mean
+        weight = n * other_n / total
+        self.portfolio_mean = self.portfolio_mean + delta_p * (other_n / total)
+        self.benchmark_mean = self.benchmark_mean + delta_b * (other_n / total)
+        self.portfolio_m2 = self.portfolio_m2 + other.portfolio_m2 + np.square(delta_p) * weight
+        self.benchmark_m2 = self.benchmark_m2 + other.benchmark_m2 + np.square(delta_b) * weight
+        self.cross = self.cross + other.cross + delta_p * delta_b * weight
+        self.count = n + other_n
+
+    @classmethod
+    def of(cls, p, b):
+        """ 由一段数据（最后一维为时间）直接计算 """
+        count, benchmark_mean, portfolio_mean, benchmark_m2, cross, portfolio_m2 = moments_on_valid(p, b)
+        # 没有有效的期时均值为 nan，取 0 使之后的合并不受影响
+        return cls(count, np.where(count > 0, portfolio_mean, 0.), np.where(count > 0, benchmark_mean, 0.),
+                   portfolio_m2, benchmark_m2, cross)
+
+    def regression(self):
+        return regression_from_moments(
+            self.count, self.benchmark_mean, self.portfolio_mean, self.benchmark_m2, self.cross, self.portfolio_m2
+        )
+
+
+class _NavPath(object):
+    """
+    对数净值路径的可合并状态：当前对数净值、历史最高与最低、最大回撤以及回撤平方和
+    路径起点为 0（即净值 1），与 Risk._calc_cum 在最前面补上初始净值一致
+    """
+
+    __slots__ = ("log_nav", "peak", "trough", "max_drawdown", "drawdown_ss")
+
+    def __init__(self):
+        self.log_nav = 0.
+        self.peak = 0.
+        self.trough = 0.
+        # 以对数形式保存的最大回撤，即 max(peak - log_nav)
+        self.max_drawdown = 0.
+        # (nav / peak - 1) ** 2 之和，用于计算 ulcer index
+        self.drawdown_ss = 0.
+
+    def update(self, log_return):
+        self.log_nav = self.log_nav + log_return
+        self.peak = np.maximum(self.peak, self.log_nav)
+        self.trough = np.minimum(self.trough, self.log_nav)
+        drawdown = self.peak - self.log_nav
+        self.max_drawdown = np.maximum(self.max_drawdown, drawdown)
+        self.drawdown_ss = self.drawdown_ss + np.square(np.expm1(-drawdown))
+
+    def extend(self, log_returns):
+        """ 接续当前状态加入一段对数收益率（最后一维为时间），结果是精确的 """
+        if log_returns.shape[-1] == 0:
+            return
+        path = np.cumsum(log_returns, axis=-1) + np.asarray(self.log_nav)[..., np.newaxis]
+        peak = np.maximum(np.maximum.accumulate(path, axis=-1), np.asarray(self.peak)[..., np.newaxis])
+        drawdown = peak - path
+        self.log_nav = path[..., -1]
+        self.peak = peak[..., -1]
+        self.trough = np.minimum(self.trough, path.min(axis=-1))
+        self.max_drawdown = np.maximum(self.max_drawdown, drawdown.max(axis=-1))
+        self.drawdown_ss = self.drawdown_ss + np.square(np.expm1(-drawdown)).sum(axis=-1)
+
+    def merge(self, other, other_log_returns=None):
+        """
+        合并紧随其后的另一段路径。最大回撤总能精确合并；回撤平方和只有在本段结束时处于最高点，
+        或提供了另一段的对数收益率时才能精确合并，否则为 nan
+        """
+        underwater = self.peak - self.log_nav
+        crossing = self.peak - (self.log_nav + other.trough)
+        if other_log_returns is not None:
+            continued = _NavPath()
+            continued.log_nav, continued.peak = self.log_nav, self.peak
+            continued.extend(other_log_returns)
+            drawdown_ss = self.drawdown_ss + continued.drawdown_ss
+        else:
+            drawdown_ss = np.where(underwater == 0, self.drawdown_ss + other.drawdown_ss, np.nan)[()]
+        self.max_drawdown = np.maximum(np.maximum(self.max_drawdown, other.max_drawdown), crossing)
+        self.peak = np.maximum(self.peak, self.log_nav + other.peak)
+        self.trough = np.minimum(self.trough, self.log_nav + other.trough)
+        self.log_nav = self.log_nav + other.log_nav
+        self.drawdown_ss = drawdown_ss
+
+
+class _History(object):
+    """ 按时间追加的组合与基准收益率，容量按倍数增长，追加的均摊开销为 O(1) """
+
+    def __init__(self):
+        self._data = None
+        self._size = 0
+
+    def append(self, portfolio_returns, benchmark_returns):
+        """ 最后一维为时间 """
+        values = np.stack(np.broadcast_arrays(portfolio_returns, benchmark_returns))
+        size = self._size + values.shape[-1]
+        if self._data is None:
+            self._data = np.empty(values.shape[:-1] + (max(size, 64),))
+        elif self._data.shape[:-1] != values.shape[:-1] or size > self._data.shape[-1]:
+            leading = np.broadcast_shapes(self._data.shape[:-1], values.shape[:-1])
+            capacity = max(size, self._data.shape[-1] * 2) if size > self._data.shape[-1] else self._data.shape[-1]
+            data = np.empty(leading + (capacity,))
+            data[..., :self._size] = self._data[..., :self._size]
+            self._data = data
+        self._data[..., self._size:size] = values
+        self._size = size
+
+    @property
+    def returns(self):
+        """ (组合收益率, 基准收益率) """
+        if self._data is None:
+            return None
+        return self._data[0, ..., :self._size], self._data[1, ..., :self._size]
+
+
+class StreamingRisk(object):
+    """
+    增量计算的风险指标，每加入一期数据的开销与内存均为 O(1)，任意时刻可给出与 Risk 同名的指标
+    下行风险（downside_risk、annual_downside_risk、sortino）以全部数据的均值为基准，无法增量计算，默认为 nan：
+    可以在加入全部数据后再读一遍，用 partial_downside_ss 与 set_downside_ss 提供下行离差平方和，或选用 keep_history
+    :param keep_history: 是否保留组合与基准的收益率，默认不保留。保留时内存为 O(期数)，上述三个指标每次读取
+        都重新扫描全部收益率，开销为 O(期数)；merge 另一个未保留收益率的实例时，若本段结束时仍在回撤中，ulcer index 为 nan
+    传入数组时可同时跟踪多个组合，各组合的期数相同
+    """
+
+    def __init__(self, risk_free_rate, period=DAILY, trading_days_a_year=None, keep_history=False):
+        self.period_count = 0
+        if period == DAILY and trading_days_a_year is not None:
+            self._annual_factor = trading_days_a_year
+        else:
+            self._annual_factor = annual_factor(period)
+        self._risk_free_rate = risk_free_rate
+        self._risk_free_rate_per_period = (1 + risk_free_rate) ** (1 / self._annual_factor) - 1
+
+        self._portfolio = _Moments()
+        self._benchmark = _Moments()
+        self._active = _Moments()
+        self._log_portfolio = _Moments()
+        # 组合与基准的离差乘积和
+        self._cross = 0.
+        self._portfolio_path = _NavPath()
+        self._benchmark_path = _NavPath()
+        self._active_path = _NavPath()
+        # 组合净值与基准净值之比
+        self._excess_path = _NavPath()
+        # log1p(returns - risk_free_rate_per_period) 之和，用于 ulcer performance index
+        self._portfolio_rf_log_sum = 0.
+        self._active_rf_log_sum = 0.
+        self._win_count = 0
+        self._excess_win_count = 0
+        self._benchmark_zero_count = 0
+        self._benchmark_nan_count = 0
+        self._pair = _PairMoments()
+        # 由 set_downside_ss 提供的下行离差平方和，加入数据后失效
+        self._downside_ss = None
+        self._history = _History() if keep_history else None
+
+    def update(self, portfolio_return, benchmark_return):
+        """ 加入一期数据 """
+        p = np.asarray(portfolio_return, dtype=float)[()]
+        b = np.asarray(benchmark_return, dtype=float)[()]
+        a = p - b
+        n = self.period_count = self.period_count + 1
+
+        delta_p = self._portfolio.update(n, p)
+        self._benchmark.update(n, b)
+        self._cross = self._cross + delta_p * (b - self._benchmark.mean)
+        self._active.update(n, a)
+        log_p, log_b, log_a = np.log1p(p), np.log1p(b), np.log1p(a)
+        self._log_portfolio.update(n, log_p)
+
+        self._portfolio_path.update(log_p)
+        self._benchmark_path.update(log_b)
+        self._active_path.update(log_a)
+        self._excess_path.update(log_p - log_b)
+        self._portfolio_rf_log_sum = self._portfolio_rf_log_sum + np.log1p(p - self._risk_free_rate_per_period)
+        self._active_rf_log_sum = self._active_rf_log_sum + np.log1p(a - self._risk_free_rate_per_period)
+
+        self._win_count = self._win_count + (p > 0)
+        self._excess_win_count = self._excess_win_count + (p > b)
+        self._benchmark_zero_count = self._benchmark_zero_count + (b == 0)
+        self._benchmark_nan_count = self._benchmark_nan_count + np.isnan(b)
+        self._pair.update(p, b)
+        if self._history is not None:
+            self._history.append(p[..., np.newaxis], b[..., np.newaxis])
+        self._invalidate()
+        return self
+
+    def extend(self, portfolio_returns, benchmark_returns):
+        """ 一次加入一段数据（最后一维为时间），结果与逐期 update 一致 """
+        chunk = self._from_returns(portfolio_returns, benchmark_returns)
+        return self.merge(chunk)
+
+    def _from_returns(self, portfolio_returns, benchmark_returns):
+        p = np.asarray(portfolio_returns, dtype=float)
+        b = np.asarray(benchmark_returns, dtype=float)
+        assert (p.shape[-1] == b.shape[-1])
+        a = p - b
+        log_p, log_b, log_a = np.log1p(p), np.log1p(b), np.log1p(a)
+
+        chunk = StreamingRisk(self._risk_free_rate, keep_history=True)
+        chunk._annual_factor = self._annual_factor
+        chunk._risk_free_rate_per_period = self._risk_free_rate_per_period
+        chunk.period_count = p.shape[-1]
+        if chunk.period_count == 0:
+            return chunk
+        chunk._portfolio = _Moments.of(p)
+        chunk._benchmark = _Moments.of(b)
+        chunk._active = _Moments.of(a)
+        chunk._log_portfolio = _Moments.of(log_p)
+        chunk._cross = (
+            (p - chunk._portfolio.mean[..., np.newaxis]) * (b - chunk._benchmark.mean[..., np.newaxis])
+        ).sum(axis=-1)
+        chunk._portfolio_path.extend(log_p)
+        chunk._benchmark_path.extend(log_b)
+        chunk._active_path.extend(log_a)
+        chunk._excess_path.extend(log_p - log_b)
+        chunk._portfolio_rf_log_sum = np.log1p(p - self._risk_free_rate_per_period).sum(axis=-1)
+        chunk._active_rf_log_sum = np.log1p(a - self._risk_free_rate_per_period).sum(axis=-1)
+        chunk._win_count = np.count_nonzero(p > 0, axis=-1)
+        chunk._excess_win_count = np.count_nonzero(p > b, axis=-1)
+        chunk._benchmark_zero_count = np.count_nonzero(b == 0, axis=-1)
+        chunk._benchmark_nan_count = np.count_nonzero(np.isnan(b), axis=-1)
+        chunk._pair = _PairMoments.of(p, b)
+        chunk._history.append(p, b)
+        return chunk
+
+    def merge(self, other):
+        """ 合并紧随本段之后的另一段数据的累加器，other 不会被修改 """
+        if other.period_count == 0:
+            return self
+        n, other_n = self.period_count, other.period_count
+        if n == 0:
+            for k, v in other.__dict__.items():
+                if k in ("_history", "_annual_factor", "_risk_free_rate", "_risk_free_rate_per_period"):
+                    continue
+                if isinstance(v, (_Moments, _PairMoments, _NavPath)):
+                    v = _copy_state(v)
+                setattr(self, k, v)
+        else:
+            delta_p = self._portfolio.combine(n, other_n, other._portfolio)
+            delta_b = self._benchmark.combine(n, other_n, other._benchmark)
+            self._cross = self._cross + other._cross + delta_p * delta_b * (n * other_n / (n + other_n))
+            self._active.combine(n, other_n, other._active)
+            self._log_portfolio.combine(n, other_n, other._log_portfolio)
+
+            other_returns = other._history.returns if other._history is not None else None
+            if other_returns is not None:
+                p, b = other_returns
+                log_p, log_b = np.log1p(p), np.log1p(b)
+                log_returns = (log_p, log_b, np.log1p(p - b), log_p - log_b)
+            else:
+                log_returns = (None, None, None, None)
+            for path, other_path, log_return in zip(
+                    (self._portfolio_path, self._benchmark_path, self._active_path, self._excess_path),
+                    (other._portfolio_path, other._benchmark_path, other._active_path, other._excess_path),
+                    log_returns):
+                path.merge(other_path, log_return)
+
+            self._portfolio_rf_log_sum = self._portfolio_rf_log_sum + other._portfolio_rf_log_sum
+            self._active_rf_log_sum = self._active_rf_log_sum + other._active_rf_log_sum
+            self._win_count = self._win_count + other._win_count
+            self._excess_win_count = self._excess_win_count + other._excess_win_count
+            self._benchmark_zero_count = self._benchmark_zero_count + other._benchmark_zero_count
+            self._benchmark_nan_count = self._benchmark_nan_count + other._benchmark_nan_count
+            self._pair.combine(other._pair)
+            self.period_count = n + other_n
+
+        if self._history is not None:
+            if other._history is None:
+                # 另一段没有保留收益率，之后无法再计算下行风险
+                self._history = None
+            elif other._history.returns is not None:
+                self._history.append(*other._history.returns)
+        self._invalidate()
+        return self
+
+    def _invalidate(self):
+        # 指标由 indicator_property 缓存在实例上，数据变化后需要清除
+        clear_cached(self, _INDICATOR_NAMES)
+        self._downside_ss = None
+
+    def partial_downside_ss(self, portfolio_returns):
+        """
+        一段组合收益率（最后一维为时间）相对当前全部数据均值的下行离差平方和
+        不保留收益率时，在加入全部数据之后再逐段读一遍，各段的结果之和传给 set_downside_ss
+        """
+        returns = np.asarray(portfolio_returns, dtype=float)
+        mean = np.asarray(self._portfolio.mean)[..., np.newaxis]
+        return np.square(np.minimum(returns - mean, 0.)).sum(axis=-1)
+
+    def set_downside_ss(self, downside_ss):
+        """ 提供全部数据的下行离差平方和，downside_risk、annual_downside_risk、sortino 由此计算，再加入数据后失效 """
+        clear_cached(self, _INDICATOR_NAMES)
+        self._downside_ss = downside_ss
+
+    @property
+    def _avg_excess_return(self):
+        return self._portfolio.mean - self._risk_free_rate_per_period
+
+    @staticmethod
+    def _calc_max_drawdown(path):
+        return np.abs(np.expm1(-path.max_drawdown))
+
+    def _calc_ulcer_index(self, path):
+        return np.sqrt(path.drawdown_ss * 10000 / (self.period_count + 1))
+
+    @indicator_property()
+    def return_rate(self):
+        return np.expm1(self._portfolio_path.log_nav)
+
+    @indicator_property(min_period_count=1)
+    def annual_return(self):
+        return (1 + self.return_rate) ** (self._annual_factor / self.period_count) - 1
+
+    @indicator_property()
+    def benchmark_return(self):
+        return np.expm1(self._benchmark_path.log_nav)
+
+    @indicator_property(min_period_count=1)
+    def benchmark_annual_return(self):
+        return (1 + self.benchmark_return) ** (self._annual_factor / self.period_count) - 1
+
+    @indicator_property()
+    def arithmetic_excess_return(self):
+        return self.return_rate - self.benchmark_return
+
+    @indicator_property()
+    def geometric_excess_return(self):
+        return (1 + self.return_rate) / (1 + self.benchmark_return) - 1
+
+    @indicator_property()
+    def geometric_excess_annual_return(self):
+        return (1 + self.annual_return) / (1 + self.benchmark_annual_return) - 1
+
+    @indicator_property(min_period_count=2)
+    def alpha(self):
+        return self.annual_return - self._risk_free_rate - self.beta * (
+            self.benchmark_annual_return - self._risk_free_rate
+        )
+
+    def _regression(self):
+        return regression_from_moments(
+            self.period_count, self._benchmark.mean, self._portfolio.mean,
+            self._benchmark.m2, self._cross, self._portfolio.m2
+        )
+
+    @indicator_property(min_period_count=2)
+    def alpha_t_value(self):
+        # 与 Risk 一致，只在组合与基准均有效的期上回归
+        return np.where(self._benchmark_zero_count == 0, np.nan, self._pair.regression().alpha_t_value)[()]
+
+    @indicator_property(min_period_count=2)
+    def alpha_p_value(self):
+        return np.where(self._benchmark_zero_count == 0, np.nan, self._pair.regression().alpha_p_value)[()]
+
+    @indicator_property(min_period_count=2)
+    def beta(self):
+        return self._regression().beta
+
+    @indicator_property(min_period_count=2, value_when_pc_not_satisfied=0.)
+    def volatility(self):
+        return np.sqrt(self._portfolio.m2 / (self.period_count - 1))
+
+    @indicator_property()
+    def annual_volatility(self):
+        return self.volatility * (self._annual_factor ** 0.5)
+
+    @indicator_property(min_period_count=2, value_when_pc_not_satisfied=0.)
+    def benchmark_volatility(self):
+        return np.sqrt(self._benchmark.m2 / (self.period_count - 1))
+
+    @indicator_property()
+    def benchmark_annual_volatility(self):
+        return self.benchmark_volatility * (self._annual_factor ** 0.5)
+
+    @indicator_property()
+    def max_drawdown(self):
+        return self._calc_max_drawdown(self._portfolio_path)
+
+    @indicator_property(min_period_count=2, value_when_pc_not_satisfied=0.)
+    def tracking_error(self):
+        return np.where(self._benchmark_nan_count == self.period_count, np.nan, self.excess_volatility)[()]
+
+    @indicator_property()
+    def annual_tracking_error(self):
+        return np.where(
+            self._benchmark_nan_count == self.period_count, np.nan,
+            self.tracking_error * (self._annual_factor ** 0.5)
+        )[()]
+
+    @indicator_property(min_period_count=2)
+    def information_ratio(self):
+        # 残差 p - beta * b 的离差平方和由矩直接展开
+        residual_ss = self._portfolio.m2 - 2 * self.beta * self._cross + np.square(self.beta) * self._benchmark.m2
+        annual_residual_std = np.sqrt(np.maximum(residual_ss, 0.) / (self.period_count - 1) * self._annual_factor)
+        return safe_div_array(self.annual_return - self.beta * self.benchmark_annual_return, annual_residual_std)
+
+    @indicator_property(min_period_count=2)
+    def sharpe(self):
+        return safe_div_array(np.sqrt(self._annual_factor) * self._avg_excess_return, self.volatility)
+
+    @indicator_property()
+    def excess_sharpe(self):
+        return safe_div_array(np.sqrt(self._annual_factor) * self._active.mean, self.tracking_error)
+
+    @indicator_property(min_period_count=2, value_when_pc_not_satisfied=0.)
+    def downside_risk(self):
+        downside_ss = self._downside_ss
+        if downside_ss is None:
+            history = self._history.returns if self._history is not None else None
+            if history is None:
+                return np.full(np.shape(self._portfolio.mean), np.nan)[()]
+            downside_ss = self.partial_downside_ss(history[0])
+        return np.sqrt(downside_ss / (self.period_count - 1))
+
+    @indicator_property()
+    def annual_downside_risk(self):
+        return self.downside_risk * (self._annual_factor ** 0.5)
+
+    @indicator_property()
+    def sortino(self):
+        return safe_div_array(self._annual_factor * self._avg_excess_return, self.annual_downside_risk)
+
+    @indicator_property()
+    def calmar(self):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(
+                np.isclose(self.max_drawdown, 0),
+                np.inf * np.sign(self.annual_return),
+                self.annual_return / self.max_drawdown
+            )[()]
+
+    @indicator_property(min_period_count=1)
+    def _excess_return_rate(self):
+        return np.expm1(self._active_path.log_nav)
+
+    @deprecate_property
+    def excess_return_rate(self):
+        return self._excess_return_rate
+
+    @deprecate_property
+    def excess_annual_return(self):
+        return self._excess_annual_return
+
+    @indicator_property(min_period_count=1)
+    def _excess_annual_return(self):
+        return (1 + self._excess_return_rate) ** (self._annual_factor / self.period_count) - 1
+
+    @indicator_property(min_period_count=2, value_when_pc_not_satisfied=0.)
+    def excess_volatility(self):
+        return np.sqrt(self._active.m2 / (self.period_count - 1))
+
+    @indicator_property()
+    def excess_annual_volatility(self):
+        return self.excess_volatility * (self._annual_factor ** 0.5)
+
+    @indicator_property(min_period_count=1)
+    def geometric_excess_drawdown(self):
+        return self._calc_max_drawdown(self._excess_path)
+
+    @indicator_property(min_period_count=1)
+    def excess_max_drawdown(self):
+        return self._calc_max_drawdown(self._active_path)
+
+    @indicator_property()
+    def var(self):
+        """ default: 95% VaR """
+        return self.param_var(0.05)
+
+    def param_var(self, alpha):
+        # 与 Risk.param_var 一致，假设收益率服从对数正态分布，alpha 可以是数组
+        mean = self._log_portfolio.mean if self.period_count else np.nan
+        std = np.sqrt(self._log_portfolio.m2 / self.period_count) if self.period_count else np.nan
+        return parametric_var_from_moments(mean, std, alpha)
+
+    @indicator_property(min_period_count=1)
+    def win_rate(self):
+        return self._win_count / self.period_count
+
+    @indicator_property(min_period_count=1)
+    def excess_win_rate(self):
+        return np.where(self._benchmark_nan_count == self.period_count, np.nan,
+                        self._excess_win_count / self.period_count)[()]
+
+    @indicator_property(min_period_count=2)
+    def correlation(self):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            correlation = self._cross / np.sqrt(self._portfolio.m2) / np.sqrt(self._benchmark.m2)
+        return np.clip(correlation, -1, 1)
+
+    @indicator_property()
+    def ulcer_index(self):
+        return self._calc_ulcer_index(self._portfolio_path)
+
+    @indicator_property()
+    def excess_ulcer_index(self):
+        return self._calc_ulcer_index(self._active_path)
+
+    @indicator_property()
+    def ulcer_performance_index(self):
+        return safe_div_array(np.expm1(self._portfolio_rf_log_sum), self.ulcer_index)
+
+    @indicator_property()
+    def excess_ulcer_performance_index(self):
+        return safe_div_array(np.expm1(self._active_rf_log_sum), self.excess_ulcer_index)
+
+    def all(self, names=None):
+        """
+        计算指标，返回指标名称到指标值的字典
+        :param names: 需要计算的指标名称，None 表示全部指标
+        """
+        if names is None:
+            names = _INDICATOR_NAMES
+        else:
+            evaluation_plan(self.__class__, names)
+        return {k: getattr(self, k) for k in names}
+
+
+def _copy_state(state):
+    copied = state.__class__()
+    for k in state.__slots__:
+        setattr(copied, k, getattr(state, k))
+    return copied
+
+
+_INDICATOR_NAMES = [k for k, v in StreamingRisk.__dict__.items() if isinstance(v, IndicatorProperty)]
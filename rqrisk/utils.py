@@ -15,19 +15,27 @@
 #         在此前提下，对本软件的使用同样需要遵守 Apache 2.0 许可，Apache 2.0 许可与本许可冲突之处，以本许可为准。
 #         详细的授权流程，请联系 public@ricequant.com 获取。
 
-import numpy as np
+import threading
+import time
 import warnings
 
+import numpy as np
+
 
 class IndicatorProperty:
     pass
 
 
-def indicator_property(min_period_count=None, value_when_pc_not_satisfied=np.nan):
+class LazyProperty:
+    pass
+
+
+def indicator_property(min_period_count=None, value_when_pc_not_satisfied=np.nan, dependencies=()):
     """
     封装绑定方法为缓存的 property 的装饰器
     :param min_period_count: 最小的 portfolio 长度，不满足时则给出 value_when_pc_not_satisfied，None 表示不做此项检查
     :param value_when_pc_not_satisfied: portfolio 长度小于 min_period_count 时给出的值，默认为 np.nan
+    :param dependencies: 计算时直接用到的其他指标或中间结果（lazy_property）的名称
     """
 
     class cached_property(IndicatorProperty):  # noqa
@@ -37,17 +45,151 @@ def indicator_property(min_period_count=None, value_when_pc_not_satisfied=np.nan
             else:
                 self._getter = getter
             self._name = getter.__name__
+            self.dependencies = tuple(dependencies)
 
         def __get__(self, instance, owner):
             if instance is None:
                 return self._getter
-            value = self._getter(instance)
-            setattr(instance, self._name, value)
-            return value
+            return _cached_get(instance, self._name, self._getter)
+
+    return cached_property
+
+
+def lazy_property(dependencies=()):
+    """
+    封装绑定方法为缓存的中间结果的装饰器，与 indicator_property 不同，不会出现在 all() 的结果中
+    :param dependencies: 计算时直接用到的其他中间结果的名称
+    """
+
+    class cached_property(LazyProperty):  # noqa
+        def __init__(self, getter):
+            self._getter = getter
+            self._name = getter.__name__
+            self.dependencies = tuple(dependencies)
+
+        def __get__(self, instance, owner):
+            if instance is None:
+                return self
+            return _cached_get(instance, self._name, self._getter)
 
     return cached_property
 
 
+# 指标计算的回调，为空时不做任何计时
+_indicator_hooks = []
+# 注册了回调时计算结果暂存在实例的这个属性中，使每次访问都经过 __get__，以便记录缓存命中
+_PROFILED_VALUES = "_profiled_values"
+_timing = threading.local()
+
+
+def add_indicator_hook(hook):
+    """
+    注册指标与中间结果的计算回调 hook(instance, name, cached, elapsed, self_elapsed)
+    cached 为 True 表示命中缓存，此时两个耗时均为 0；elapsed 包含计算依赖的耗时，self_elapsed 不包含
+    注册前已缓存在实例上的结果不经过回调
+    """
+    _indicator_hooks.append(hook)
+
+
+def remove_indicator_hook(hook):
+    _indicator_hooks.remove(hook)
+
+
+def clear_cached(instance, names):
+    """ 清除实例上缓存的 names 中的指标与中间结果 """
+    for k in names:
+        instance.__dict__.pop(k, None)
+    instance.__dict__.pop(_PROFILED_VALUES, None)
+
+
+def _cached_get(instance, name, getter):
+    profiled = instance.__dict__.get(_PROFILED_VALUES)
+    if not _indicator_hooks:
+        if profiled is not None and name in profiled:
+            value = profiled[name]
+        else:
+            value = getter(instance)
+        setattr(instance, name, value)
+        return value
+
+    if profiled is None:
+        profiled = instance.__dict__[_PROFILED_VALUES] = {}
+    if name in profiled:
+        for hook in list(_indicator_hooks):
+            hook(instance, name, True, 0., 0.)
+        return profiled[name]
+
+    # 栈中记录正在计算的各层已用于计算依赖的时间，用于求不含依赖的耗时
+    stack = _timing.__dict__.setdefault("stack", [])
+    stack.append(0.)
+    start = time.perf_counter()
+    try:
+        value = getter(instance)
+    finally:
+        elapsed = time.perf_counter() - start
+        children = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+    profiled[name] = value
+    for hook in list(_indicator_hooks):
+        hook(instance, name, False, elapsed, elapsed - children)
+    return value
+
+
+def indicator_names(cls):
+    """ cls 及其父类中定义的全部指标名称，按定义顺序排列 """
+    names = {}
+    for klass in reversed(cls.__mro__):
+        for k, v in klass.__dict__.items():
+            if isinstance(v, IndicatorProperty):
+                names[k] = None
+            else:
+                names.pop(k, None)
+    return list(names)
+
+
+def dependency_graph(cls):
+    """ cls 中各指标与中间结果直接依赖的名称 """
+    graph = {}
+    for klass in reversed(cls.__mro__):
+        for k, v in klass.__dict__.items():
+            if isinstance(v, (IndicatorProperty, LazyProperty)):
+                graph[k] = v.dependencies
+            else:
+                graph.pop(k, None)
+    return graph
+
+
+def evaluation_plan(cls, names):
+    """
+    计算 names 中的指标需要依次计算的全部指标与中间结果，依赖在前
+    :param names: 指标名称，未知的名称抛出 ValueError
+    """
+    graph = dependency_graph(cls)
+    known = set(indicator_names(cls))
+    for name in names:
+        if name not in known:
+            raise ValueError("unknown indicator {!r}, possible values: {}".format(name, ", ".join(sorted(known))))
+
+    plan, done, visiting = [], set(), set()
+
+    def _visit(name):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError("circular dependency on {!r}".format(name))
+        visiting.add(name)
+        for dependency in graph.get(name, ()):
+            _visit(dependency)
+        visiting.discard(name)
+        done.add(name)
+        plan.append(name)
+
+    for name in names:
+        _visit(name)
+    return plan
+
+
 MONTHS_PER_YEAR = 12
 WEEKS_PER_YEAR = 52
 APPROX_BDAYS_PER_YEAR = 252
@@ -81,6 +223,26 @@ def safe_div(dividend, divisor):
     return dividend / divisor
 
 
+def safe_div_array(dividend, divisor):
+    """ safe_div 的向量化版本，除数为 0 的位置给出 np.nan """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(divisor == 0, np.nan, np.true_divide(dividend, divisor))[()]
+
+
+def calc_cum_nav(log_returns):
+    """ 由对数收益率沿最后一维计算累计净值，在最前面补上初始净值 1 """
+    cum = np.zeros(log_returns.shape[:-1] + (log_returns.shape[-1] + 1,))
+    np.cumsum(log_returns, axis=-1, out=cum[..., 1:])
+    return np.exp(cum, out=cum)
+
+
+def calc_drawdown(cum_nav, peak=None):
+    """ 相对历史最高净值的回撤序列，取值不大于 0 """
+    if peak is None:
+        peak = np.maximum.accumulate(cum_nav, axis=-1)
+    return cum_nav / peak - 1
+
+
 def deprecate_property(func):
 
     @property
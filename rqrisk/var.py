@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# 版权所有 2021 深圳米筐科技有限公司（下称“米筐科技”）
+#
+# 除非遵守当前许可，否则不得使用本软件。
+#
+#     * 非商业用途（非商业用途指个人出于非商业目的使用本软件，或者高校、研究所等非营利机构出于教育、科研等目的使用本软件）：
+#         遵守 Apache License 2.0（下称“Apache 2.0 许可”），
+#         您可以在以下位置获得 Apache 2.0 许可的副本：http://www.apache.org/licenses/LICENSE-2.0。
+#         除非法律有要求或以书面形式达成协议，否则本软件分发时需保持当前许可“原样”不变，且不得附加任何条件。
+#
+#     * 商业用途（商业用途指个人出于任何商业目的使用本软件，或者法人或其他组织出于任何目的使用本软件）：
+#         未经米筐科技授权，任何个人不得出于任何商业目的使用本软件（包括但不限于向第三方提供、销售、出租、出借、转让本软件、
+#         本软件的衍生产品、引用或借鉴了本软件功能或源代码的产品或服务），任何法人或其他组织不得出于任何目的使用本软件，
+#         否则米筐科技有权追究相应的知识产权侵权责任。
+#         在此前提下，对本软件的使用同样需要遵守 Apache 2.0 许可，Apache 2.0 许可与本许可冲突之处，以本许可为准。
+#         详细的授权流程，请联系 public@ricequant.com 获取。
+
+
+from __future__ import division
+
+import numpy as np
+
+# VaR 与 CVaR 与 Risk.param_var 的约定一致：先在对数收益率上求分位数 q（或尾部均值），再给出 exp(-q) - 1，损失为正。
+# alpha 可以是数组，结果的 shape 为收益率去掉最后一维（时间）后再接上 alpha 的 shape
+PARAMETRIC = "parametric"
+HISTORICAL = "historical"
+CORNISH_FISHER = "cornish_fisher"
+METHODS = (PARAMETRIC, HISTORICAL, CORNISH_FISHER)
+
+# Cornish-Fisher CVaR 对分位数积分所用的 Gauss-Legendre 节点数
+_QUADRATURE_POINTS = 64
+
+
+def value_at_risk(returns, alpha=0.05, method=PARAMETRIC):
+    """
+    :param returns: 收益率，最后一维为时间，二维时每行为一个组合
+    :param alpha: 尾部概率，可以是数组，一次给出所有水平的结果
+    :param method: "parametric" 对数正态；"historical" 经验分位数（线性插值，与 np.quantile 一致）；
+        "cornish_fisher" 以偏度、峰度修正的正态分位数
+    """
+    return var_from_log_returns(np.log1p(np.asarray(returns, dtype=float)), alpha, method)
+
+
+def conditional_value_at_risk(returns, alpha=0.05, method=PARAMETRIC):
+    """ 超过 VaR 的尾部的平均损失（expected shortfall），参数同 value_at_risk """
+    return cvar_from_log_returns(np.log1p(np.asarray(returns, dtype=float)), alpha, method)
+
+
+def var_from_log_returns(log_returns, alpha, method=PARAMETRIC):
+    alpha = _check_alpha(alpha)
+    if method == HISTORICAL:
+        quantile, _ = _historical(log_returns, alpha, shortfall=False)
+    else:
+        mean, std, z = _location_scale(log_returns, alpha, method)
+        quantile = mean + std * z
+    return np.expm1(-quantile)[()]
+
+
+def cvar_from_log_returns(log_returns, alpha, method=PARAMETRIC):
+    alpha = _check_alpha(alpha)
+    if method == HISTORICAL:
+        _, shortfall = _historical(log_returns, alpha, shortfall=True)
+    elif method == PARAMETRIC:
+        mean, std, z = _location_scale(log_returns, alpha, method)
+        # 正态分布的尾部均值 mean - std * pdf(z) / alpha
+        shortfall = mean - std * np.exp(-np.square(z) / 2) / np.sqrt(2 * np.pi) / alpha
+    else:
+        # 对修正后的分位数在 (0, alpha) 上积分
+        nodes, weights = np.polynomial.legendre.leggauss(_QUADRATURE_POINTS)
+        p = alpha[..., np.newaxis] * (nodes + 1) / 2
+        mean, std, z = _location_scale(log_returns, p, method)
+        shortfall = mean[..., 0] + std[..., 0] * (z * weights).sum(axis=-1) / 2
+    return np.expm1(-shortfall)[()]
+
+
+def parametric_var_from_moments(mean, std, alpha):
+    """ 由对数收益率的均值与总体标准差计算参数法 VaR，std 为 0 时为 nan """
+    from scipy.special import ndtri
+
+    alpha = _check_alpha(alpha)
+    mean, std = _expand(np.asarray(mean, dtype=float), alpha), _expand(np.asarray(std, dtype=float), alpha)
+    with np.errstate(invalid="ignore"):
+        std = np.where(std > 0, std, np.nan)
+    return np.expm1(-(mean + std * ndtri(alpha)))[()]
+
+
+def _check_alpha(alpha):
+    alpha = np.asarray(alpha, dtype=float)
+    if np.any((alpha <= 0) | (alpha >= 1)):
+        raise ValueError("alpha should be in (0, 1), got {}".format(alpha))
+    return alpha
+
+
+def _expand(value, alpha):
+    # 在最后补上 alpha 的维度，以便与 alpha 广播
+    return value.reshape(value.shape + (1,) * alpha.ndim)
+
+
+def _location_scale(log_returns, alpha, method):
+    """ 返回 (均值, 总体标准差, 标准化分位数)，均值与标准差已按 alpha 的维度展开 """
+    from scipy.special import ndtri
+
+    if method not in METHODS:
+        raise ValueError("method cannot be {}, possible values: {}".format(method, ", ".join(METHODS)))
+    log_returns = np.asarray(log_returns, dtype=float)
+    z = ndtri(alpha)
+    if log_returns.shape[-1] == 0:
+        empty = np.full(log_returns.shape[:-1] + (1,) * alpha.ndim, np.nan)
+        return empty, empty, z
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = log_returns.mean(axis=-1, keepdims=True)
+        centered = log_returns - mean
+        m2 = np.square(centered).mean(axis=-1)
+        std = np.sqrt(m2)
+        if method == CORNISH_FISHER:
+            skew = _expand(np.power(centered, 3).mean(axis=-1) / (m2 * std), alpha)
+            kurt = _expand(np.square(np.square(centered)).mean(axis=-1) / np.square(m2) - 3, alpha)
+            z = (
+                z + (np.square(z) - 1) * skew / 6 + (np.power(z, 3) - 3 * z) * kurt / 24
+                - (2 * np.power(z, 3) - 5 * z) * np.square(skew) / 36
+            )
+        std = np.where(std > 0, std, np.nan)
+    return _expand(mean[..., 0], alpha), _expand(std, alpha), z
+
+
+def _historical(log_returns, alpha, shortfall):
+    """
+    经验分位数（线性插值）与最小的 ceil(alpha * n) 个值的均值，
+    对所有 alpha 需要的位置只做一次 np.partition，不做完整排序
+    """
+    log_returns = np.asarray(log_returns, dtype=float)
+    n = log_returns.shape[-1]
+    if n == 0:
+        empty = np.full(log_returns.shape[:-1] + alpha.shape, np.nan)
+        return empty, empty
+    position = (n - 1) * alpha
+    lower = np.floor(position).astype(int)
+    upper = np.minimum(lower + 1, n - 1)
+    tail = np.maximum(np.ceil(alpha * n).astype(int), 1)
+    kth = [lower.ravel(), upper.ravel()]
+    if shortfall:
+        kth.append(tail.ravel() - 1)
+    partitioned = np.partition(log_returns, np.unique(np.concatenate(kth)), axis=-1)
+
+    low = partitioned[..., lower]
+    quantile = low + (position - lower) * (partitioned[..., upper] - low)
+    if not shortfall:
+        return quantile, None
+    # partition 之后每个 kth 位置之前的元素都不大于该位置的值，前缀和即为最小的若干个值之和
+    prefix = np.cumsum(partitioned[..., :tail.max()], axis=-1)
+    return quantile, prefix[..., tail - 1] / tail
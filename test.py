@@ -1,6 +1,10 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
+import json
+import warnings
+
 from numpy.testing import assert_almost_equal
 import pandas as pd
 import numpy as np
@@ -321,3 +325,858 @@ def test_excess_index():
     _assert(simple_benchmark, zero_benchmark, 0.0936852726843609, 0.09368527268436089, 11.274002099240212)
 
 
+def test_risk_batch():
+    """ 测试批量计算与 Risk 逐行一致 """
+    rng = np.random.RandomState(42)
+
+    def _assert(returns, benchmark, risk_free_rate, period):
+        batch = rqrisk.RiskBatch(returns, benchmark, risk_free_rate, period).all()
+        for i in range(len(returns)):
+            b = benchmark if benchmark.ndim == 1 else benchmark[i]
+            for k, v in rqrisk.Risk(returns[i], b, risk_free_rate, period).all().items():
+                assert_almost_equal(batch[k][i], v, err_msg=k)
+
+    benchmark = volatile_benchmark.values.copy()
+    benchmark[3] = 0
+    returns = rng.normal(0.001, 0.02, (4, len(benchmark)))
+    _assert(returns, benchmark, 0.02, DAILY)
+    _assert(returns, np.vstack([benchmark, zero_benchmark.values, simple_benchmark.values, benchmark]), 0.052, WEEKLY)
+    _assert(returns[:, :1], benchmark[:1], 0, DAILY)
+
+
+def test_selective_all():
+    """ 测试按名称计算部分指标，且只计算声明的依赖 """
+    rng = np.random.RandomState(3)
+    returns = rng.normal(0.001, 0.02, (2, 50))
+    benchmark = rng.normal(0.0005, 0.015, 50)
+    benchmark[10] = 0
+    names = ["sharpe", "max_drawdown", "calmar", "alpha", "win_rate"]
+    for cls, args in [
+        (rqrisk.Risk, (returns[0], benchmark, 0.02)),
+        (rqrisk.RiskBatch, (returns, benchmark, 0.02)),
+        (rqrisk.BlendRisk, (returns, [[0.3, 0.7], [1, 0]], benchmark, 0.02)),
+        (rqrisk.MultiBenchmarkRisk, (returns[0], np.vstack([benchmark, returns[1]]), 0.02)),
+    ]:
+        full = cls(*args).all()
+        assert list(full) == rqrisk.utils.indicator_names(cls)
+        subset = cls(*args).all(names)
+        assert list(subset) == names
+        for k in names:
+            assert_almost_equal(subset[k], full[k], err_msg=k)
+
+        graph = cls.dependency_graph()
+        for name in full:
+            plan = cls.evaluation_plan([name])
+            assert plan[-1] == name
+            for i, node in enumerate(plan):
+                assert set(graph.get(node, ())) & set(graph) <= set(plan[:i])
+            # 计算某个指标时用到的指标与中间结果都应在声明的依赖中
+            instance = cls(*args)
+            getattr(instance, name)
+            assert set(instance.__dict__) & set(graph) <= set(plan), name
+
+        try:
+            cls(*args).all(["sharpe", "no_such_indicator"])
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("unknown indicator should raise ValueError")
+
+
+def test_indicator_profiler():
+    """ 测试指标计算的计时与缓存命中统计 """
+    rng = np.random.RandomState(5)
+    returns = rng.normal(0.001, 0.02, 40)
+    benchmark = rng.normal(0.0005, 0.015, 40)
+    expected = rqrisk.Risk(returns, benchmark, 0.02).all()
+
+    with rqrisk.IndicatorProfiler() as profiler:
+        risk = rqrisk.Risk(returns, benchmark, 0.02)
+        result = risk.all()
+        assert risk.calmar == result["calmar"]
+        streaming = rqrisk.StreamingRisk(0.02)
+        streaming.extend(returns[:-1], benchmark[:-1])
+        streaming.sharpe
+        streaming.update(returns[-1], benchmark[-1])
+        assert_almost_equal(streaming.sharpe, expected["sharpe"])
+    for k, v in expected.items():
+        assert_almost_equal(result[k], v, err_msg=k)
+
+    summary = profiler.summary()
+    assert summary["Risk.calmar"]["calls"] == 1
+    assert summary["Risk.calmar"]["hits"] == 1
+    assert summary["Risk.max_drawdown"]["hits"] >= 1
+    assert summary["Risk.sharpe"]["max_period_count"] == 40
+    assert summary["StreamingRisk.sharpe"]["calls"] == 2
+    for stats in summary.values():
+        assert 0 <= stats["self_time"] <= stats["time"] + 1e-9
+
+    # 退出后不再记录
+    rqrisk.Risk(returns, benchmark, 0.02).all()
+    assert profiler.summary()["Risk.calmar"]["calls"] == 1
+    assert set(json.loads(profiler.export())) == set(summary)
+
+
+def test_evaluate_many(monkeypatch, tmp_path):
+    """ 测试多进程批量计算与 RiskBatch 一致，出错的组合结果为 nan """
+    from rqrisk import parallel
+
+    rng = np.random.RandomState(11)
+    returns = rng.normal(0.001, 0.02, (23, 30))
+    benchmark = rng.normal(0.0005, 0.015, 30)
+    benchmark[4] = 0
+    expected = rqrisk.RiskBatch(returns, benchmark, 0.02).all()
+    for result in [
+        parallel.evaluate_many(returns, benchmark, 0.02, chunk_size=5, max_workers=2),
+        parallel.evaluate_many(returns, np.tile(benchmark, (23, 1)), 0.02, chunk_size=7, max_workers=1),
+    ]:
+        assert list(result) == list(expected)
+        for k, v in expected.items():
+            assert_almost_equal(result[k], v, err_msg=k)
+
+    # memmap 的行切片：工作进程应按切片自身的位置打开文件
+    large = rng.normal(0.001, 0.02, (300, 30))
+    path = str(tmp_path / "returns.npy")
+    np.save(path, large)
+    mapped = np.load(path, mmap_mode="r")
+    raw = np.memmap(str(tmp_path / "returns.dat"), dtype=float, mode="w+", shape=large.shape)
+    raw[...] = large
+    raw.flush()
+    for view, rows in [(mapped[170:], large[170:]), (raw[10:40], large[10:40]), (mapped, large)]:
+        result = parallel.evaluate_many(view, benchmark, 0.02, names=["sharpe"], chunk_size=5, max_workers=2)
+        assert_almost_equal(result["sharpe"], rqrisk.RiskBatch(rows, benchmark, 0.02).sharpe)
+
+    class _FailingBatch(rqrisk.RiskBatch):
+        def __init__(self, *args, **kwargs):
+            raise RuntimeError
+
+    class _FailingRisk(rqrisk.Risk):
+        def __init__(self, daily_returns, *args, **kwargs):
+            if daily_returns[0] == returns[3, 0]:
+                raise RuntimeError
+            super(_FailingRisk, self).__init__(daily_returns, *args, **kwargs)
+
+    monkeypatch.setattr(parallel, "RiskBatch", _FailingBatch)
+    monkeypatch.setattr(parallel, "Risk", _FailingRisk)
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        result = parallel.evaluate_many(returns, benchmark, 0.02, names=["sharpe", "beta"], chunk_size=4, max_workers=1)
+    assert any("1 of 23" in str(w.message) for w in caught)
+    assert np.isnan(result["sharpe"][3]) and np.isnan(result["beta"][3])
+    mask = np.arange(23) != 3
+    assert_almost_equal(result["sharpe"][mask], expected["sharpe"][mask])
+    assert_almost_equal(result["beta"][mask], expected["beta"][mask])
+
+
+def test_evaluate_chunked(tmp_path):
+    """ 测试分块读取文件计算与 RiskBatch 一致 """
+    rng = np.random.RandomState(13)
+    returns = rng.normal(0.001, 0.02, (60, 9))
+    benchmark = rng.normal(0.0005, 0.015, 60)
+    benchmark[7] = 0
+    expected = rqrisk.RiskBatch(returns.T, benchmark, 0.02, WEEKLY).all()
+    np.save(str(tmp_path / "returns.npy"), returns)
+    returns.tofile(str(tmp_path / "returns.dat"))
+    sources = [str(tmp_path / "returns.npy"), rqrisk.open_returns(str(tmp_path / "returns.dat"), shape=returns.shape)]
+    try:
+        import pyarrow  # noqa
+    except ImportError:
+        pass
+    else:
+        pd.DataFrame(returns, columns=["s{}".format(i) for i in range(9)]).to_parquet(str(tmp_path / "returns.parquet"))
+        sources.append(str(tmp_path / "returns.parquet"))
+
+    for source in sources:
+        for by, chunk_size in [("columns", 4), ("time", 7), ("time", None)]:
+            result = rqrisk.evaluate_chunked(source, benchmark, 0.02, WEEKLY, by=by, chunk_size=chunk_size)
+            for k, v in expected.items():
+                assert_almost_equal(result[k], v, err_msg="{} {} {}".format(source, by, k))
+
+
+def test_var_cvar():
+    """ 测试多个水平的 VaR / CVaR 与逐个计算一致 """
+    import scipy.stats
+
+    rng = np.random.RandomState(17)
+    returns = rng.standard_t(4, (3, 400)) * 0.01
+    benchmark = rng.normal(0.0005, 0.015, 400)
+    alphas = np.array([0.01, 0.025, 0.05, 0.1])
+    batch = rqrisk.RiskBatch(returns, benchmark, 0.02)
+    for i, row in enumerate(returns):
+        risk = rqrisk.Risk(row, benchmark, 0.02)
+        log_returns = np.log1p(row)
+        mean, std = log_returns.mean(), log_returns.std()
+        skew, kurt = scipy.stats.skew(log_returns), scipy.stats.kurtosis(log_returns)
+        z = scipy.stats.norm.ppf(alphas)
+        z_cf = z + (z ** 2 - 1) * skew / 6 + (z ** 3 - 3 * z) * kurt / 24 - (2 * z ** 3 - 5 * z) * skew ** 2 / 36
+        tail = [np.sort(log_returns)[:int(np.ceil(a * 400))].mean() for a in alphas]
+        expected = {
+            ("var", "parametric"): np.expm1(-scipy.stats.norm(mean, std).ppf(alphas)),
+            ("var", "historical"): np.expm1(-np.quantile(log_returns, alphas)),
+            ("var", "cornish_fisher"): np.expm1(-(mean + std * z_cf)),
+            ("cvar", "parametric"): np.expm1(-(mean - std * scipy.stats.norm.pdf(z) / alphas)),
+            ("cvar", "historical"): np.expm1(-np.array(tail)),
+        }
+        for (func, method), value in expected.items():
+            assert_almost_equal(getattr(risk, func if func == "cvar" else "value_at_risk")(alphas, method), value)
+            assert_almost_equal(
+                getattr(batch, func if func == "cvar" else "value_at_risk")(alphas, method)[i], value)
+            assert_almost_equal(getattr(risk, func if func == "cvar" else "value_at_risk")(0.05, method), value[2])
+        assert_almost_equal(risk.param_var(alphas), expected[("var", "parametric")])
+        cf_cvar = risk.cvar(alphas, "cornish_fisher")
+        assert np.all(cf_cvar > risk.value_at_risk(alphas, "cornish_fisher"))
+    assert np.isnan(rqrisk.Risk(np.zeros(5), np.zeros(5), 0).var)
+
+
+def test_drawdown_episodes():
+    """ 测试回撤区间与逐段遍历的结果一致 """
+    rng = np.random.RandomState(19)
+    returns = rng.normal(0.001, 0.02, 120)
+    benchmark = rng.normal(0.0005, 0.015, 120)
+    risk = rqrisk.Risk(returns, benchmark, 0.02)
+
+    def _expected(cum_nav):
+        peak = np.maximum.accumulate(cum_nav)
+        drawdown = cum_nav / peak - 1
+        episodes, i = [], 0
+        while i < len(drawdown):
+            if drawdown[i] < 0:
+                j = i
+                while j < len(drawdown) and drawdown[j] < 0:
+                    j += 1
+                recovery = j if j < len(drawdown) else -1
+                episodes.append((i - 1, i + int(np.argmin(drawdown[i:j])), recovery,
+                                 -drawdown[i:j].min(), (j if j < len(drawdown) else j - 1) - (i - 1)))
+                i = j
+            else:
+                i += 1
+        return episodes
+
+    for episodes, cum_nav, max_drawdown in [
+        (risk.drawdown_episodes, np.cumprod(np.append(1, 1 + returns)), risk.max_drawdown),
+        (risk.excess_drawdown_episodes, np.cumprod(np.append(1, 1 + returns - benchmark)), risk.excess_max_drawdown),
+        (risk.geometric_excess_drawdown_episodes,
+         np.cumprod(np.append(1, 1 + returns)) / np.cumprod(np.append(1, 1 + benchmark)),
+         risk.geometric_excess_drawdown),
+    ]:
+        expected = _expected(cum_nav)
+        result = episodes()
+        assert len(result.start) == len(expected) > 3
+        for field, values in zip(result, zip(*expected)):
+            assert_almost_equal(field, values)
+        assert_almost_equal(result.depth.max(), max_drawdown)
+        assert result.longest_duration == max(e[4] for e in expected)
+        top = episodes(top=3)
+        assert_almost_equal(top.depth, sorted(e[3] for e in expected)[::-1][:3])
+        order = np.argsort([-e[3] for e in expected], kind="stable")[:3]
+        assert list(top.start) == [expected[i][0] for i in order]
+    assert len(rqrisk.Risk(np.full(5, 0.01), np.zeros(5), 0).drawdown_episodes().start) == 0
+
+
+def test_sub_periods():
+    """ 测试分段指标与对每段单独构造 Risk 一致 """
+    from rqrisk.periods import calendar_labels, SUB_PERIOD_INDICATORS
+
+    rng = np.random.RandomState(23)
+    dates = pd.bdate_range("2020-12-30", periods=300)
+    returns = rng.normal(0.0005, 0.02, (2, 300))
+    benchmark = rng.normal(0.0002, 0.015, 300)
+    returns[0, 2] = 0
+    for freq in ["M", "Q", "Y"]:
+        labels = calendar_labels(dates, freq)
+        keys, result = rqrisk.Risk(returns[0], benchmark, 0.02).sub_periods(labels)
+        batch_keys, batch_result = rqrisk.RiskBatch(returns, benchmark, 0.02).sub_periods(labels)
+        assert list(result) == list(SUB_PERIOD_INDICATORS)
+        assert list(keys) == list(batch_keys) == sorted(set(labels))
+        for i, key in enumerate(keys):
+            mask = labels == key
+            assert result["period_count"][i] == mask.sum()
+            for j in range(2):
+                risk = rqrisk.Risk(returns[j, mask], benchmark[mask], 0.02)
+                for k in SUB_PERIOD_INDICATORS[1:]:
+                    if j == 0:
+                        assert_almost_equal(result[k][i], getattr(risk, k), err_msg="{} {}".format(key, k))
+                    assert_almost_equal(batch_result[k][j, i], getattr(risk, k), err_msg="{} {}".format(key, k))
+
+    keys, result = rqrisk.Risk(returns[1], benchmark, 0.052, WEEKLY).sub_periods(boundaries=[0, 1, 2, 150])
+    for i, (start, stop) in enumerate([(0, 1), (1, 2), (2, 150), (150, 300)]):
+        risk = rqrisk.Risk(returns[1, start:stop], benchmark[start:stop], 0.052, WEEKLY)
+        for k in SUB_PERIOD_INDICATORS[1:]:
+            assert_almost_equal(result[k][i], getattr(risk, k), err_msg="{} {}".format(start, k))
+
+    # 长短悬殊的分段：内存与期数成正比，而不是段数 × 最长段的长度
+    import tracemalloc
+    long_returns = np.random.RandomState(43).normal(0.0005, 0.02, (5, 20000))
+    long_benchmark = np.random.RandomState(44).normal(0.0003, 0.015, 20000)
+    boundaries = list(range(100)) + [5000]
+    tracemalloc.start()
+    _, result = rqrisk.RiskBatch(long_returns, long_benchmark, 0.02).sub_periods(boundaries=boundaries)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert peak < 20 * long_returns.nbytes
+    for j, start, stop in [(0, 0, 1), (98, 98, 99), (99, 99, 5000), (100, 5000, 20000)]:
+        expected = rqrisk.Risk(long_returns[2, start:stop], long_benchmark[start:stop], 0.02).max_drawdown
+        assert_almost_equal(result["max_drawdown"][2, j], expected)
+
+    for labels in [["a", "b", "a"], None]:
+        try:
+            rqrisk.Risk(returns[0, :3], benchmark[:3], 0).sub_periods(labels, [1, 2] if labels is None else None)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("invalid buckets should raise ValueError")
+
+
+def test_multi_benchmark_risk():
+    """ 测试多基准的结果与对每个基准分别构造 Risk 一致 """
+    rng = np.random.RandomState(29)
+    returns = rng.normal(0.001, 0.02, 80)
+    benchmarks = rng.normal(0.0005, 0.015, (4, 80))
+    benchmarks[1, ::7] = 0
+    benchmarks[2] = returns * 0.5
+    multi = rqrisk.MultiBenchmarkRisk(returns, benchmarks, 0.02, WEEKLY, benchmark_names=["a", "b", "c", "d"])
+    result = multi.all()
+    by_benchmark = multi.by_benchmark()
+    assert list(by_benchmark) == ["a", "b", "c", "d"]
+    for i, name in enumerate(by_benchmark):
+        for k, v in rqrisk.Risk(returns, benchmarks[i], 0.02, WEEKLY).all().items():
+            assert_almost_equal(result[k][i], v, err_msg=k)
+            assert_almost_equal(by_benchmark[name][k], v, err_msg=k)
+    try:
+        rqrisk.MultiBenchmarkRisk(returns, benchmarks, 0.02, benchmark_names=["a"])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("benchmark_names should match the benchmarks")
+
+
+def test_risk_cache(tmp_path):
+    """ 测试结果缓存的命中、键与按大小淘汰 """
+    rng = np.random.RandomState(31)
+    returns = rng.normal(0.001, 0.02, 50)
+    benchmark = rng.normal(0.0005, 0.015, 50)
+    cache = rqrisk.RiskCache(str(tmp_path / "risk.sqlite"))
+    expected = rqrisk.Risk(returns, benchmark, 0.02).all()
+    for _ in range(2):
+        result = cache.all(returns, benchmark, 0.02)
+        assert list(result) == list(expected)
+        for k, v in expected.items():
+            assert_almost_equal(result[k], v, err_msg=k)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.key(list(returns), pd.Series(benchmark), 0.02) == cache.key(returns, benchmark, 0.02)
+    assert cache.key(returns, benchmark, 0.02) != cache.key(returns, benchmark, 0.03)
+    assert cache.key(returns, benchmark, 0.02) != cache.key(returns, benchmark, 0.02, trading_days_a_year=244)
+    assert cache.all(returns, benchmark, 0.02, WEEKLY, names=["sharpe"]) == {
+        "sharpe": rqrisk.Risk(returns, benchmark, 0.02, WEEKLY).sharpe
+    }
+
+    small = rqrisk.RiskCache(str(tmp_path / "small.sqlite"), max_bytes=cache.size * 3)
+    for i in range(6):
+        small.all(returns + i * 0.001, benchmark, 0.02)
+    assert len(small) == 3 and small.size <= small.max_bytes
+    # 最近访问的保留，最早的被淘汰
+    small.all(returns + 3 * 0.001, benchmark, 0.02)
+    small.all(returns + 6 * 0.001, benchmark, 0.02)
+    small.all(returns + 3 * 0.001, benchmark, 0.02)
+    assert small.hits == 2
+
+
+def test_bootstrap():
+    """ 测试重采样下标与置信区间 """
+    from rqrisk.bootstrap import bootstrap, resample_indices
+
+    rng = np.random.default_rng(0)
+    for method in ["iid", "block", "stationary"]:
+        indices = resample_indices(rng, 50, 20, method, block_size=5)
+        assert indices.shape == (20, 50) and indices.min() >= 0 and indices.max() < 50
+    indices = resample_indices(rng, 50, 20, "block", block_size=5)
+    assert np.all((np.diff(indices, axis=1) % 50)[:, [0, 1, 2, 3, 5, 6, 7, 8]] == 1)
+
+    random_state = np.random.RandomState(37)
+    returns = random_state.normal(0.001, 0.02, 120)
+    benchmark = random_state.normal(0.0005, 0.015, 120)
+    result = bootstrap(returns, benchmark, 0.02, n_resamples=300, seed=7, chunk_size=64)
+    assert result == bootstrap(returns, benchmark, 0.02, n_resamples=300, seed=7, chunk_size=64)
+    # 分块方式只影响内存，不影响结果
+    for chunk_size in [1, 17, None]:
+        other = bootstrap(returns, benchmark, 0.02, n_resamples=300, seed=7, chunk_size=chunk_size)
+        for k, v in result.items():
+            assert_almost_equal(other[k], v, err_msg=k)
+    risk = rqrisk.Risk(returns, benchmark, 0.02)
+
+    # 与逐个重采样构造 Risk 一致
+    indices = resample_indices(np.random.default_rng(7), 120, 64, "stationary")
+    sharpe = [rqrisk.Risk(returns[i], benchmark[i], 0.02).sharpe for i in indices]
+    batch = rqrisk.RiskBatch(returns[indices], benchmark[indices], 0.02).sharpe
+    assert_almost_equal(batch, sharpe)
+
+    for k in ["sharpe", "alpha", "information_ratio", "max_drawdown"]:
+        interval = result[k]
+        assert_almost_equal(interval.estimate, getattr(risk, k))
+        assert interval.low < interval.high and interval.standard_error > 0
+
+
+def test_cross_statistics(tmp_path):
+    """ 测试两两之间的协方差、相关系数与 beta 与 Risk 一致，分块结果与一次计算一致 """
+    rng = np.random.RandomState(41)
+    returns = rng.normal(0.001, 0.02, (12, 40))
+    returns[5] = 0
+    cross = rqrisk.CrossStatistics(returns)
+    covariance, correlation, beta = cross.covariance(), cross.correlation(), cross.beta()
+    assert_almost_equal(covariance, np.cov(returns))
+    for i in range(12):
+        for j in range(12):
+            risk = rqrisk.Risk(returns[i], returns[j], 0)
+            assert_almost_equal(correlation[i, j], risk.correlation)
+            assert_almost_equal(beta[i, j], risk.beta)
+
+    out = np.lib.format.open_memmap(str(tmp_path / "beta.npy"), mode="w+", shape=(12, 12))
+    for block_size in [1, 5, 12, 20]:
+        assert_almost_equal(cross.covariance(block_size=block_size), covariance)
+        assert_almost_equal(cross.correlation(block_size=block_size), correlation)
+        assert_almost_equal(cross.beta(out=out, block_size=block_size), beta)
+    assert rqrisk.CrossStatistics.block_size_for(24 * 100, 1000) == 10
+
+    # 分块计算时临时内存不超过 block_size_for 的预算
+    import tracemalloc
+    returns = rng.normal(0.001, 0.02, (300, 20))
+    cross = rqrisk.CrossStatistics(returns)
+    out = np.empty((300, 300))
+    max_bytes = 1 << 20
+    block_size = rqrisk.CrossStatistics.block_size_for(max_bytes, 300)
+    for kind in ["covariance", "correlation", "beta"]:
+        expected = getattr(cross, kind)()
+        tracemalloc.start()
+        getattr(cross, kind)(out=out, block_size=block_size)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert peak <= max_bytes, kind
+        assert_almost_equal(out, expected)
+
+
+def test_blend_risk():
+    """ 测试多组权重组合的结果与对每组组合收益率构造 Risk 一致 """
+    rng = np.random.RandomState(43)
+    components = rng.normal(0.001, 0.02, (4, 60))
+    benchmark = rng.normal(0.0005, 0.015, 60)
+    benchmark[::9] = 0
+    weights = np.vstack([rng.dirichlet(np.ones(4), 5), [0, 1, 0, 0], [0.5, -0.5, 0.2, 0.8]])
+    blend = rqrisk.BlendRisk(components, weights, benchmark, 0.02, WEEKLY)
+    result = blend.all()
+    for i, w in enumerate(weights):
+        for k, v in rqrisk.Risk(w @ components, benchmark, 0.02, WEEKLY).all().items():
+            assert_almost_equal(result[k][i], v, err_msg=k)
+
+    # 只需要矩的指标不计算组合收益率
+    blend = rqrisk.BlendRisk(components, weights, benchmark, 0.02, WEEKLY)
+    blend.all(["volatility", "beta", "correlation", "tracking_error", "sharpe", "excess_sharpe"])
+    assert "_portfolio" not in blend.__dict__
+
+    # 紧跟基准的组合：跟踪误差不因大数相减而失去精度
+    close = benchmark + rng.normal(0, 1e-9, (4, 60))
+    blend = rqrisk.BlendRisk(close, weights, benchmark, 0.02, WEEKLY)
+    for i, w in enumerate(weights):
+        expected = np.std(w @ close - benchmark, ddof=1)
+        assert abs(blend.tracking_error[i] / expected - 1) < 1e-6
+
+
+def test_top_k():
+    """ 测试排名前 k 的组合与完整计算后排序的结果一致 """
+    rng = np.random.RandomState(47)
+    returns = rng.normal(0.0005, 0.02, (200, 60))
+    returns[10:15] = returns[3]
+    benchmark = rng.normal(0.0002, 0.015, 60)
+    full = rqrisk.RiskBatch(returns, benchmark, 0.02).all()
+
+    result = rqrisk.top_k(returns, benchmark, 0.02, 10, chunk_size=33)
+    assert list(result.index) == list(np.argsort(-full["sharpe"], kind="stable")[:10])
+    for k, v in full.items():
+        assert_almost_equal(result.report[k], v[result.index], err_msg=k)
+
+    # 多个排序键、并列与过滤
+    result = rqrisk.top_k(
+        returns, np.tile(benchmark, (200, 1)), 0.02, 20, by=["win_rate", "max_drawdown"], ascending=[False, True],
+        filters={"max_drawdown": (None, 0.25), "period_count": (60, None)}, names=["sharpe", "win_rate"]
+    )
+    index = np.flatnonzero(full["max_drawdown"] <= 0.25)
+    expected = index[np.lexsort((index, full["max_drawdown"][index], -full["win_rate"][index]))][:20]
+    assert list(result.index) == list(expected)
+    assert list(result.report) == ["sharpe", "win_rate"]
+    assert len(rqrisk.top_k(returns, benchmark, 0.02, 5, filters={"period_count": (61, None)}).index) == 0
+
+    # 以 nan 补齐的较短历史按有效期计算与过滤
+    padded = returns.copy()
+    lengths = rng.randint(20, 61, 200)
+    for i, n in enumerate(lengths):
+        padded[i, :60 - n] = np.nan
+    result = rqrisk.top_k(padded, benchmark, 0.02, 15, filters={"period_count": (40, None)}, names=["sharpe"])
+    sharpe = np.array([rqrisk.Risk(padded[i], benchmark, 0.02, nan_policy="omit").sharpe for i in range(200)])
+    index = np.flatnonzero(lengths >= 40)
+    expected = index[np.lexsort((index, -sharpe[index]))][:15]
+    assert list(result.index) == list(expected)
+    assert_almost_equal(result.report["sharpe"], sharpe[expected])
+    assert list(result.report) == ["sharpe"]
+
+    # 共享基准中的 nan 使所有组合按同样的有效期计算
+    shared = benchmark.copy()
+    shared[[5, 17]] = np.nan
+    padded[3, 40:] = np.nan
+    result = rqrisk.top_k(padded, shared, 0.02, 200, by="sortino", names=["sortino", "max_drawdown", "alpha"])
+    for i, j in enumerate(result.index):
+        risk = rqrisk.Risk(padded[j], shared, 0.02, nan_policy="omit")
+        for k, v in result.report.items():
+            assert_almost_equal(v[i], getattr(risk, k), err_msg="{} {}".format(j, k))
+
+
+def test_async_risk(monkeypatch):
+    """ 测试异步计算的结果、相同输入的去重与取消 """
+    import asyncio
+    import threading
+    from rqrisk import aio
+
+    rng = np.random.RandomState(53)
+    returns = [rng.normal(0.0005, 0.02, 120) for _ in range(3)]
+    benchmark = rng.normal(0.0002, 0.015, 120)
+    calls = []
+    release = threading.Event()
+    evaluate = aio._evaluate
+
+    def _evaluate(*args):
+        calls.append(args)
+        release.wait(5)
+        return evaluate(*args)
+
+    monkeypatch.setattr(aio, "_evaluate", _evaluate)
+
+    async def main():
+        async with rqrisk.AsyncRisk(max_concurrency=1) as evaluator:
+            first = asyncio.ensure_future(evaluator.compute(returns[0], benchmark, 0.02))
+            same = asyncio.ensure_future(evaluator.compute(list(returns[0]), benchmark, 0.02))
+            queued = asyncio.ensure_future(evaluator.compute(returns[1], benchmark, 0.02))
+            await asyncio.sleep(0.05)
+            # 受并发数限制，第二组输入仍在排队，取消后不再计算
+            queued.cancel()
+            release.set()
+            results = await asyncio.gather(first, same)
+            assert results[0] is results[1]
+            assert queued.cancelled()
+            gathered = await evaluator.gather([
+                (returns[2], benchmark, 0.02), {"daily_returns": returns[2], "benchmark_daily_returns": benchmark,
+                                                "risk_free_rate": 0.02, "names": ["sharpe"]}
+            ])
+            return results[0], gathered
+
+    result, gathered = asyncio.run(main())
+    assert len(calls) == 3
+    assert_almost_equal(result["sharpe"], rqrisk.Risk(returns[0], benchmark, 0.02).sharpe)
+    assert_almost_equal(gathered[0]["max_drawdown"], rqrisk.Risk(returns[2], benchmark, 0.02).max_drawdown)
+    assert list(gathered[1]) == ["sharpe"]
+    try:
+        rqrisk.AsyncRisk(executor="fork")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("executor should be validated")
+
+
+def test_input_adapter():
+    """ 测试各类输入按位置转换为 float64 数组，能不复制时不复制 """
+    import array
+    from rqrisk.inputs import as_array
+
+    rng = np.random.RandomState(59)
+    returns = rng.normal(0.0005, 0.02, 80)
+    benchmark = rng.normal(0.0002, 0.015, 80)
+    expected = rqrisk.Risk(returns, benchmark, 0.02).all()
+
+    index = pd.date_range("2020-01-01", periods=80)
+    # 基准的 index 与组合不同，计算仍按位置进行
+    shifted = pd.Series(benchmark, index=index + pd.Timedelta(days=1))
+    series = rqrisk.Risk(pd.Series(returns, index=index), shifted, 0.02)
+    assert series.index is index
+    for inputs in [
+        series, rqrisk.Risk(list(returns), list(benchmark), 0.02),
+        rqrisk.Risk(array.array("d", returns), array.array("d", benchmark), 0.02)
+    ]:
+        for k, v in inputs.all().items():
+            assert_almost_equal(v, expected[k], err_msg=k)
+
+    assert np.shares_memory(as_array(returns), returns)
+    assert np.shares_memory(as_array(pd.Series(returns)), returns)
+    values = array.array("d", returns)
+    assert np.shares_memory(as_array(values), np.frombuffer(values))
+    assert as_array(returns.astype(np.float32)).dtype == np.float64
+    assert_almost_equal(as_array(pd.Series([0.1, None, 0.2], dtype="Float64")), [0.1, np.nan, 0.2])
+
+
+def test_from_dated():
+    """ 测试按日期对齐组合与基准，以及由日期推断 period """
+    rng = np.random.RandomState(61)
+    dates = pd.bdate_range("2019-01-01", "2021-12-31")
+    portfolio_dates = dates[rng.rand(len(dates)) > 0.1]
+    benchmark_dates = dates[rng.rand(len(dates)) > 0.1]
+    returns = rng.normal(0.0005, 0.02, (3, len(portfolio_dates)))
+    benchmark = rng.normal(0.0002, 0.015, len(benchmark_dates))
+    portfolio_series = pd.Series(returns[0], index=portfolio_dates)
+    benchmark_series = pd.Series(benchmark, index=benchmark_dates)
+
+    inner = pd.concat([portfolio_series, benchmark_series], axis=1, join="inner")
+    outer = pd.concat([portfolio_series, benchmark_series], axis=1).fillna(0)
+    common = inner.index
+    nav = [(1 + s).cumprod().reindex(common).values for s in (portfolio_series, benchmark_series)]
+    compound = np.column_stack([np.concatenate(([s[common[0]]], v[1:] / v[:-1] - 1))
+                                for s, v in zip((portfolio_series, benchmark_series), nav)])
+    for fill, expected in [("drop", inner), ("zero", outer), ("compound", compound)]:
+        expected = np.asarray(expected)
+        risk = rqrisk.Risk.from_dated(portfolio_dates, returns[0], benchmark_dates, benchmark, 0.02, fill=fill)
+        span = (risk.index[-1] - risk.index[0]).astype(int)
+        assert risk._annual_factor == int(round((len(expected) - 1) * 365.25 / span))
+        aligned = rqrisk.Risk(expected[:, 0], expected[:, 1], 0.02, DAILY, risk._annual_factor).all()
+        for k, v in risk.all().items():
+            assert_almost_equal(v, aligned[k], err_msg=k)
+
+    # 组合的日期乱序时先排序，多个组合共用日期
+    order = rng.permutation(len(portfolio_dates))
+    batch = rqrisk.RiskBatch.from_dated(portfolio_dates[order], returns[:, order], benchmark_dates, benchmark, 0.02,
+                                        fill="compound", period=WEEKLY)
+    for i in range(3):
+        single = rqrisk.Risk.from_dated(
+            portfolio_dates, returns[i], benchmark_dates, benchmark, 0.02, "compound", WEEKLY)
+        for k, v in single.all().items():
+            assert_almost_equal(batch.all()[k][i], v, err_msg=k)
+    assert (batch.index == single.index).all()
+
+    from rqrisk.alignment import infer_period
+    assert infer_period(pd.date_range("2020-01-01", periods=60)) == (NATURAL_DAILY, None)
+    assert infer_period(pd.date_range("2020-01-01", periods=60, freq="W")) == (WEEKLY, None)
+    assert infer_period(pd.date_range("2020-01-01", periods=60, freq="M")) == (MONTHLY, None)
+    try:
+        rqrisk.Risk.from_dated(portfolio_dates, returns[0], benchmark_dates, benchmark, 0.02, fill="ffill")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("unknown fill policy should raise ValueError")
+
+
+def test_nan_policy():
+    """ 测试 nan_policy="omit" 与先剔除缺失再计算一致 """
+    from rqrisk.risk import PORTFOLIO_INDICATORS
+
+    rng = np.random.RandomState(67)
+    returns = rng.normal(0.0005, 0.02, 300)
+    benchmark = rng.normal(0.0002, 0.015, 300)
+    benchmark[::15] = 0
+    returns[rng.rand(300) < 0.1] = np.nan
+    benchmark[rng.rand(300) < 0.05] = np.nan
+    valid = ~np.isnan(returns) & ~np.isnan(benchmark)
+    index = pd.date_range("2020-01-01", periods=300)
+
+    risk = rqrisk.Risk(pd.Series(returns, index=index), benchmark, 0.02, nan_policy="omit")
+    assert risk.period_count == valid.sum() and risk.missing_count == 300 - valid.sum()
+    assert (risk.index == index[valid]).all()
+    expected = rqrisk.Risk(returns[valid], benchmark[valid], 0.02).all()
+    for k, v in risk.all().items():
+        assert_almost_equal(v, expected[k], err_msg=k)
+    assert set(risk.period_counts().values()) == {valid.sum()}
+
+    # 按原始的期给出的标签与按剔除后的期给出的一致；回撤的位置按原始的期给出，与缺失的期收益率记为 0 一致
+    from rqrisk.periods import calendar_labels
+    keys, result = risk.sub_periods(calendar_labels(index, "M"))
+    expected_keys, expected = risk.sub_periods(calendar_labels(risk.index, "M"))
+    assert list(keys) == list(expected_keys)
+    for k, v in expected.items():
+        assert_almost_equal(result[k], v, err_msg=k)
+    filled = rqrisk.Risk(np.where(valid, returns, 0.), np.where(valid, benchmark, 0.), 0.02)
+    for field, expected_field in zip(risk.drawdown_episodes(), filled.drawdown_episodes()):
+        assert_almost_equal(field, expected_field)
+    assert_almost_equal(risk.drawdown_episodes(top=3).start, filled.drawdown_episodes(top=3).start)
+
+    # from_dated 与缓存的键区分 nan_policy
+    dated = rqrisk.Risk.from_dated(index, returns, index, benchmark, 0.02, period=DAILY, nan_policy="omit")
+    assert (dated.index == index[valid]).all() and dated.period_count == valid.sum()
+    assert_almost_equal(dated.sharpe, risk.sharpe)
+    cache = rqrisk.RiskCache(":memory:")
+    assert cache.key(returns, benchmark, 0.02) != cache.key(returns, benchmark, 0.02, nan_policy="omit")
+    assert_almost_equal(cache.all(returns, benchmark, 0.02, nan_policy="omit")["sharpe"], risk.sharpe)
+    assert np.isnan(cache.all(returns, benchmark, 0.02)["sharpe"])
+
+    # 基准全部缺失时只按组合剔除，依赖基准的指标为 nan
+    risk = rqrisk.Risk(returns, np.full(300, np.nan), 0.02, nan_policy="omit")
+    own = ~np.isnan(returns)
+    expected = rqrisk.Risk(returns[own], benchmark[own], 0.02).all()
+    counts = risk.period_counts()
+    for k, v in risk.all().items():
+        if k in PORTFOLIO_INDICATORS:
+            assert_almost_equal(v, expected[k], err_msg=k)
+            assert counts[k] == own.sum()
+        else:
+            assert np.isnan(v), k
+            assert counts[k] == 0
+
+    # 没有缺失时不复制
+    clean = rng.normal(0.0005, 0.02, 50)
+    assert rqrisk.Risk(clean, clean, 0.02, nan_policy="omit")._portfolio is clean
+    try:
+        rqrisk.Risk(clean, clean, 0.02, nan_policy="raise")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("unknown nan_policy should raise ValueError")
+
+
+def test_calc_moments():
+    """ 测试融合的矩计算与逐项计算一致，覆盖单个组合、批量与基准矩阵的广播 """
+    from rqrisk.moments import calc_moments
+
+    rng = np.random.RandomState(71)
+    for shape, benchmark_shape in [((60,), (60,)), ((5, 60), (60,)), ((1, 60), (3, 60)), ((4, 60), (4, 60))]:
+        returns = rng.normal(0.0005, 0.02, shape)
+        benchmark = rng.normal(0.0002, 0.015, benchmark_shape)
+        moments = calc_moments(returns, benchmark)
+        p = returns - returns.mean(axis=-1, keepdims=True)
+        b = benchmark - benchmark.mean(axis=-1, keepdims=True)
+        assert_almost_equal(moments.portfolio_ss, (p * p).sum(axis=-1))
+        assert_almost_equal(moments.benchmark_ss, (b * b).sum(axis=-1))
+        assert_almost_equal(moments.cross_ss, (p * b).sum(axis=-1))
+        assert_almost_equal(moments.active_ss, (returns - benchmark).var(axis=-1) * 60)
+        assert_almost_equal(moments.downside_ss, np.square(np.minimum(p, 0)).sum(axis=-1))
+        assert (moments.win_count == (returns > 0).sum(axis=-1)).all()
+        assert (moments.excess_win_count == (returns > benchmark).sum(axis=-1)).all()
+
+    # 组合与基准相同时超额收益率的离差平方和严格为 0
+    returns = rng.normal(0.0005, 0.02, 60)
+    assert calc_moments(returns, returns.copy()).active_ss == 0
+
+
+def test_streaming_risk():
+    """ 测试增量计算与 Risk 一致 """
+    rng = np.random.RandomState(7)
+    returns = rng.normal(0.0005, 0.02, 60)
+    benchmark = rng.normal(0.0002, 0.015, 60)
+    benchmark[[5, 40]] = 0
+
+    def _assert(streaming, end):
+        for k, v in rqrisk.Risk(returns[:end], benchmark[:end], 0.02).all().items():
+            assert_almost_equal(streaming.all()[k], v, err_msg=k)
+
+    s = rqrisk.StreamingRisk(0.02, keep_history=True)
+    for i in range(len(returns)):
+        s.update(returns[i], benchmark[i])
+        if i in (0, 9, 59):
+            _assert(s, i + 1)
+
+    # 分段计算后合并
+    left = rqrisk.StreamingRisk(0.02, keep_history=True).extend(returns[:23], benchmark[:23])
+    right = rqrisk.StreamingRisk(0.02, keep_history=True).extend(returns[23:], benchmark[23:])
+    _assert(left.merge(right), len(returns))
+
+    # 默认不保留收益率，下行风险无法计算，其他指标仍然精确
+    left = rqrisk.StreamingRisk(0.02).extend(returns[:23], benchmark[:23])
+    right = rqrisk.StreamingRisk(0.02).extend(returns[23:], benchmark[23:])
+    assert left._history is None
+    merged = left.merge(right)
+    assert np.isnan(merged.downside_risk)
+    r = rqrisk.Risk(returns, benchmark, 0.02)
+    for k in ("sharpe", "beta", "alpha_t_value", "max_drawdown", "excess_max_drawdown", "tracking_error", "var"):
+        assert_almost_equal(getattr(merged, k), getattr(r, k), err_msg=k)
+
+    # 再读一遍各段收益率，提供下行离差平方和
+    merged.set_downside_ss(merged.partial_downside_ss(returns[:23]) + merged.partial_downside_ss(returns[23:]))
+    for k in ("downside_risk", "annual_downside_risk", "sortino"):
+        assert_almost_equal(getattr(merged, k), getattr(r, k), err_msg=k)
+    merged.update(0.01, 0.)
+    assert np.isnan(merged.sortino)
+
+
+def test_rolling_risk():
+    """ 测试滚动窗口与扩展窗口的指标序列与 Risk 一致 """
+    rng = np.random.RandomState(3)
+    returns = rng.normal(0.0005, 0.02, 40)
+    benchmark = rng.normal(0.0002, 0.015, 40)
+
+    def _assert(window):
+        series = rqrisk.RollingRisk(returns, benchmark, 0.02, window=window).all()
+        for end in range(1, len(returns) + 1):
+            start = 0 if window is None else end - window
+            for k, v in series.items():
+                if start < 0:
+                    assert np.isnan(v[end - 1])
+                elif k == "information_ratio" and end - start == 2:
+                    # 两期时回归残差恒为 0，Risk 的结果只取决于浮点误差
+                    continue
+                else:
+                    desired = getattr(rqrisk.Risk(returns[start:end], benchmark[start:end], 0.02), k)
+                    assert_almost_equal(v[end - 1], desired, err_msg="{} {}".format(k, end))
+
+    _assert(None)
+    _assert(1)
+    _assert(10)
+
+    # 下行风险的窗口跨越多层分块，含数据全部相同的窗口
+    returns = np.r_[np.full(30, 0.01), rng.normal(0.0005, 0.02, 300)]
+    benchmark = rng.normal(0.0002, 0.015, 330)
+    for window in [None, 7, 64]:
+        series = rqrisk.RollingRisk(returns, benchmark, 0.02, window=window)
+        for end in range(window or 1, len(returns) + 1):
+            risk = rqrisk.Risk(returns[end - (window or end):end], benchmark[end - (window or end):end], 0.02)
+            assert_almost_equal(series.downside_risk[end - 1], risk.downside_risk, err_msg=str(end))
+            if risk.downside_risk > 1e-10:
+                # 数据全部相同时 Risk 的下行风险只剩舍入误差，sortino 无意义
+                assert_almost_equal(series.sortino[end - 1], risk.sortino, err_msg=str(end))
+
+
+def test_alpha_t_p_value():
+    """ 测试截距项 t 值、p 值与 statsmodels 的 OLS 一致 """
+    try:
+        from statsmodels.formula.api import ols
+    except ImportError:
+        return
+
+    def _assert(returns, benchmark):
+        result = ols("p ~ b", data={"p": returns, "b": benchmark}).fit()
+        r = _r(returns, benchmark, 0)
+        assert_almost_equal(r.alpha_t_value, result.tvalues["Intercept"])
+        assert_almost_equal(r.alpha_p_value, result.pvalues["Intercept"])
+        batch = rqrisk.RiskBatch(np.vstack([returns, returns]), benchmark, 0)
+        assert_almost_equal(batch.alpha_t_value, [result.tvalues["Intercept"]] * 2)
+
+    benchmark = volatile_benchmark.values.copy()
+    benchmark[2] = 0
+    _assert(volatile_returns.values, benchmark)
+    _assert(negative_returns.values, benchmark)
+    _assert(volatile_returns.values, zero_benchmark.values.astype(float))
+
+    # 默认的 propagate 下，ols 只在组合与基准均有效的期上回归
+    returns = volatile_returns.values.copy()
+    returns[3] = np.nan
+    benchmark[5] = np.nan
+    result = ols("p ~ b", data={"p": returns, "b": benchmark}).fit()
+    r = _r(returns, benchmark, 0)
+    assert np.isfinite(r.alpha_t_value)
+    assert_almost_equal(r.alpha_t_value, result.tvalues["Intercept"])
+    assert_almost_equal(r.alpha_p_value, result.pvalues["Intercept"])
+    assert np.isnan(r.beta)
+
+    # 其余各类对同样的输入给出相同的结果
+    expected = [result.tvalues["Intercept"], result.pvalues["Intercept"]]
+    streaming = rqrisk.StreamingRisk(0)
+    for p, b in zip(returns, benchmark):
+        streaming.update(p, b)
+    merged = rqrisk.StreamingRisk(0).extend(returns[:4], benchmark[:4]).extend(returns[4:], benchmark[4:])
+    batch = rqrisk.RiskBatch(np.vstack([returns, volatile_returns.values]), benchmark, 0)
+    multi = rqrisk.MultiBenchmarkRisk(returns, np.vstack([benchmark, benchmark]), 0)
+    blend = rqrisk.BlendRisk(returns[np.newaxis], [[1.]], benchmark, 0)
+    for risk, i in [(streaming, ()), (merged, ()), (batch, 0), (multi, 1), (blend, 0)]:
+        assert_almost_equal([risk.alpha_t_value[i], risk.alpha_p_value[i]], expected, err_msg=type(risk).__name__)
+    full = ols("p ~ b", data={"p": volatile_returns.values, "b": benchmark}).fit()
+    assert_almost_equal(batch.alpha_t_value[1], full.tvalues["Intercept"])
+
+
+def test_lazy_import():
+    """ 测试 import rqrisk 时不导入 scipy、statsmodels 等较重的依赖 """
+    import subprocess
+    import sys
+
+    code = "import sys, rqrisk; print(','.join(m for m in ('scipy', 'statsmodels', 'pandas') if m in sys.modules))"
+    output = subprocess.check_output([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert output.decode().strip() == ""